@@ -0,0 +1,304 @@
+import os
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+import data_loader
+import harvest_store
+
+# --- 1. CONFIGURATION ---
+
+# Single-file database holding the ingested workbooks. It is rebuilt from
+# scratch whenever a source changes, so it can always be deleted safely.
+DB_FILE = os.path.join(data_loader.CACHE_DIR, "analytics.sqlite")
+
+# Read-only connections shared by every Streamlit session in the process
+POOL_SIZE = int(os.getenv("ANALYTICS_POOL_SIZE", "8"))
+POOL_TIMEOUT = 10
+
+# Query results kept in memory; the dashboard issues a few dozen distinct
+# queries, each a small aggregate
+MAX_RESULTS = int(os.getenv("ANALYTICS_MAX_RESULTS", "256"))
+
+# Bump when the schema changes so existing files are re-ingested
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE cost (method TEXT NOT NULL, category TEXT NOT NULL, cost_rm REAL NOT NULL);
+CREATE TABLE harvest (
+    farm TEXT NOT NULL,
+    plot TEXT NOT NULL,
+    crop TEXT NOT NULL,
+    method TEXT NOT NULL,
+    grade TEXT NOT NULL,
+    month TEXT NOT NULL,
+    period INTEGER NOT NULL,
+    kg REAL NOT NULL
+);
+"""
+
+# Built after the bulk insert, which is much faster than maintaining them row by row
+INDEXES = """
+CREATE INDEX harvest_farm_month ON harvest (farm, month);
+CREATE INDEX harvest_plot_period ON harvest (farm, plot, period);
+CREATE INDEX harvest_period_method ON harvest (period, method, month, kg);
+CREATE INDEX harvest_method_grade ON harvest (method, crop, grade, kg);
+"""
+
+# --- 2. INGESTION ---
+
+def source_version():
+    """
+    Identifies the data the database must reflect: both workbooks (or the
+    long harvest file) and the schema.
+    """
+    plot_data = data_loader.file_version(data_loader.PLOT_DATA_FILE)[:16]
+    return f"{SCHEMA_VERSION}-{plot_data}-{harvest_store.version()}"
+
+def _stored_version(path):
+    try:
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    except sqlite3.Error:
+        return None
+    try:
+        row = connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row[0] if row else None
+    except sqlite3.Error:
+        return None
+    finally:
+        connection.close()
+
+def _cost_rows():
+    cost_df = data_loader.get_cost_df()
+    cost_df = cost_df.rename(columns={cost_df.columns[0]: 'Farming Method'})
+    cost_df['Farming Method'] = cost_df['Farming Method'].ffill()
+    cost_df = cost_df[['Farming Method', 'Category', 'Cost (RM)']].dropna()
+    return list(cost_df.itertuples(index=False, name=None))
+
+def ingest(version, path=DB_FILE):
+    """
+    Loads both workbooks into a fresh database file and swaps it into place,
+    so readers never see a half-written file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    store = harvest_store.load().reset_index()
+    store['month'] = store['month'].dt.strftime('%Y-%m-%d').astype(object)
+
+    connection = sqlite3.connect(tmp_path)
+    try:
+        # The file is discarded if anything fails, so skip the journal
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        connection.executescript(SCHEMA)
+        connection.executemany("INSERT INTO cost VALUES (?, ?, ?)", _cost_rows())
+        # Plain lists: iterating pandas' Arrow-backed columns row by row is slow
+        columns = ["farm", "plot", "crop", "method", "grade", "month", "period", "kg"]
+        connection.executemany(
+            "INSERT INTO harvest VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            zip(*(store[column].tolist() for column in columns)),
+        )
+        connection.execute("INSERT INTO meta VALUES ('version', ?)", (version,))
+        connection.commit()
+        connection.executescript(INDEXES)
+        connection.execute("ANALYZE")
+    finally:
+        connection.close()
+    os.replace(tmp_path, path)
+
+    # The database now serves every harvest query; drop the in-memory copy
+    harvest_store.clear_cache()
+
+# --- 3. CONNECTION POOL ---
+
+class ConnectionPool:
+    """
+    A fixed number of read-only connections to one database file, handed
+    out to one thread at a time. Sessions block (up to POOL_TIMEOUT) when
+    all connections are in use.
+    """
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self.closed = False
+
+    def _connect(self):
+        connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        connection.execute("PRAGMA query_only = ON")
+        return connection
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return self._connect()
+        try:
+            return self._idle.get(timeout=POOL_TIMEOUT)
+        except queue.Empty:
+            raise TimeoutError(f"No analytics connection became free within {POOL_TIMEOUT}s.")
+
+    def release(self, connection):
+        if self.closed:
+            connection.close()
+        else:
+            self._idle.put(connection)
+
+    def close(self):
+        """
+        Closes idle connections; busy ones are closed when released.
+        """
+        self.closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+# Streamlit re-executes dashboard.py on every interaction but keeps imported
+# modules alive, so one pool serves every rerun and browser session.
+_pool = None
+_pool_version = None
+_ingest_lock = threading.Lock()
+
+# The database is immutable between ingests, so query results are kept per
+# version, least recently used first. They are small aggregates and are
+# shared, so treat them as read-only.
+_results = OrderedDict()
+_results_lock = threading.Lock()
+
+def _current_pool():
+    """
+    Returns (pool, version) for a database that matches the current
+    sources, re-ingesting first if any has changed. The pair is read
+    together so a concurrent re-ingest cannot mix them up.
+    """
+    global _pool, _pool_version
+    version = source_version()
+    pool, pool_version = _pool, _pool_version
+    if pool is not None and pool_version == version:
+        return pool, version
+
+    with _ingest_lock:
+        if _pool is None or _pool_version != version:
+            if _stored_version(DB_FILE) != version:
+                print(f"Ingesting workbooks into {DB_FILE}...")
+                ingest(version)
+            if _pool is not None:
+                _pool.close()
+            with _results_lock:
+                _results.clear()
+            _pool, _pool_version = ConnectionPool(DB_FILE), version
+        return _pool, _pool_version
+
+@data_loader.on_reload
+def refresh():
+    """
+    Re-ingests now if the sources changed, rather than on the next query.
+    """
+    _current_pool()
+
+def query(sql, params=()):
+    """
+    Runs a read-only query and returns a DataFrame, cached until the data changes.
+    """
+    pool, version = _current_pool()
+    key = (version, sql, tuple(params))
+    with _results_lock:
+        result = _results.get(key)
+        if result is not None:
+            _results.move_to_end(key)
+            return result
+
+    # Run outside the lock so sessions do not queue behind one another's
+    # queries; two sessions missing at once both run it, which is harmless
+    conn = pool.acquire()
+    try:
+        result = pd.read_sql_query(sql, conn, params=params)
+    finally:
+        pool.release(conn)
+
+    with _results_lock:
+        _results[key] = result
+        _results.move_to_end(key)
+        while len(_results) > MAX_RESULTS:
+            _results.popitem(last=False)
+    return result
+
+# --- 4. QUERIES ---
+
+def cost_breakdown():
+    """
+    Monthly cost per farming method and category, as in the cost chart.
+    """
+    return query(
+        'SELECT method AS "Farming Method", category AS "Category", cost_rm AS "Cost (RM)" FROM cost ORDER BY rowid'
+    )
+
+def grade_totals(periods=None):
+    """
+    Total kg per method (rows) and (crop, grade) (columns), optionally over
+    each plot's last `periods` recorded months. Same layout as
+    harvest_store.grade_totals().
+    """
+    if periods is None:
+        totals = query("SELECT method, crop, grade, SUM(kg) AS kg FROM harvest GROUP BY method, crop, grade")
+    else:
+        totals = query(
+            """
+            WITH latest AS (SELECT farm, plot, MAX(period) AS last FROM harvest GROUP BY farm, plot)
+            SELECT h.method, h.crop, h.grade, SUM(h.kg) AS kg
+            FROM harvest AS h JOIN latest AS l ON h.farm = l.farm AND h.plot = l.plot
+            WHERE h.period > l.last - ?
+            GROUP BY h.method, h.crop, h.grade
+            """,
+            (periods,),
+        )
+    columns = pd.MultiIndex.from_product([harvest_store.CROPS, harvest_store.GRADES], names=["crop", "grade"])
+    return (
+        totals.pivot_table(index="method", columns=["crop", "grade"], values="kg", aggfunc="sum")
+              .reindex(index=list(harvest_store.METHODS), columns=columns, fill_value=0.0)
+              .fillna(0.0)
+    )
+
+def method_totals():
+    """
+    Total kg per method.
+    """
+    return grade_totals().sum(axis=1)
+
+def revenue(prices):
+    """
+    Revenue per method, with prices given per (crop, grade).
+    """
+    grades = grade_totals()
+    return sum(grades[key] * price for key, price in prices.items())
+
+def monthly_totals():
+    """
+    Total kg per period (rows) and method (columns), with the conventional
+    plots' calendar month as a "month" column. Same layout as
+    harvest_store.monthly_totals().
+    """
+    rows = query("SELECT period, method, SUM(kg) AS kg, MIN(month) AS month FROM harvest GROUP BY period, method")
+    totals = rows.pivot(index="period", columns="method", values="kg")
+    months = rows.pivot(index="period", columns="method", values="month")
+    label = harvest_store.METHODS[0] if harvest_store.METHODS[0] in months else months.columns[0]
+    return totals.assign(month=pd.to_datetime(months[label]))
+
+if __name__ == "__main__":
+    _current_pool()
+    print(f"{DB_FILE} is up to date ({os.path.getsize(DB_FILE) / 1e6:.1f} MB).")
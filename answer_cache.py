@@ -0,0 +1,164 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+from rag_pipeline import read_index_version
+
+# --- 1. QUESTION NORMALISATION ---
+
+def normalize_question(question):
+    """
+    Lower-cases a question and strips punctuation and repeated whitespace, so
+    "What is Neem oil?" and "what is neem oil" share a cache entry.
+    """
+    question = re.sub(r"[^\w\s-]", " ", question.lower())
+    return " ".join(question.split())
+
+# --- 2. THE CACHE ---
+
+class AnswerCache:
+    """
+    Caches answers to questions sent to /ask.
+
+    Lookups go through two paths: an exact match on the normalised question,
+    then a semantic match that compares the query embedding against cached
+    questions and returns the closest answer if its cosine similarity reaches
+    similarity_threshold. Entries expire after ttl seconds, the least recently
+    used entries are evicted beyond max_entries, and everything is dropped
+    when process_documents.py rebuilds the vector store.
+    """
+
+    def __init__(self, max_entries=512, ttl=3600, similarity_threshold=0.95, index_version=read_index_version):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._index_version = index_version
+        self._version = index_version()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Unit-normalised embeddings of the entries, rebuilt lazily
+        self._matrix = None
+        self._matrix_keys = []
+        self.stats = {
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    # --- Maintenance ---
+
+    def _check_index_version(self):
+        version = self._index_version()
+        if version != self._version:
+            self._version = version
+            if self._entries:
+                self.stats["invalidations"] += 1
+            self._entries.clear()
+            self._matrix = None
+
+    def _expire(self, now):
+        expired = [key for key, entry in self._entries.items() if now - entry["created_at"] > self.ttl]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self.stats["expirations"] += len(expired)
+            self._matrix = None
+
+    def _semantic_matrix(self):
+        if self._matrix is None:
+            self._matrix_keys = [key for key, entry in self._entries.items() if entry["embedding"] is not None]
+            if self._matrix_keys:
+                self._matrix = np.vstack([self._entries[key]["embedding"] for key in self._matrix_keys])
+            else:
+                self._matrix = np.empty((0, 0), dtype=np.float32)
+        return self._matrix
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    # --- Lookups ---
+
+    def get_exact(self, question):
+        """
+        Returns a cached result for the normalised question, or None.
+        """
+        key = normalize_question(question)
+        with self._lock:
+            self._check_index_version()
+            self._expire(time.time())
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.stats["exact_hits"] += 1
+            return entry["result"]
+
+    def get_semantic(self, embedding):
+        """
+        Returns the cached result whose question embedding is most similar to
+        this one, if the similarity passes the threshold. Counts a miss otherwise.
+        """
+        query = _unit(embedding)
+        with self._lock:
+            self._check_index_version()
+            self._expire(time.time())
+            matrix = self._semantic_matrix()
+            if matrix.size and matrix.shape[1] == query.shape[0]:
+                similarities = matrix @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    key = self._matrix_keys[best]
+                    self._entries.move_to_end(key)
+                    self.stats["semantic_hits"] += 1
+                    return self._entries[key]["result"]
+            self.stats["misses"] += 1
+            return None
+
+    def count_miss(self):
+        """
+        Records a miss for lookups that could not try the semantic path.
+        """
+        with self._lock:
+            self.stats["misses"] += 1
+
+    def put(self, question, result, embedding=None):
+        key = normalize_question(question)
+        with self._lock:
+            self._check_index_version()
+            self._entries[key] = {
+                "result": result,
+                "embedding": _unit(embedding) if embedding is not None else None,
+                "created_at": time.time(),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+            self._matrix = None
+
+    def snapshot(self):
+        """
+        Returns the hit/miss counters and current size for the stats endpoint.
+        """
+        with self._lock:
+            lookups = self.stats["exact_hits"] + self.stats["semantic_hits"] + self.stats["misses"]
+            hits = self.stats["exact_hits"] + self.stats["semantic_hits"]
+            return dict(
+                self.stats,
+                size=len(self._entries),
+                max_entries=self.max_entries,
+                hit_rate=round(hits / lookups, 4) if lookups else 0.0,
+                index_version=self._version,
+            )
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
@@ -0,0 +1,70 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+
+import harvest_store
+
+# --- 1. SYNTHETIC HARVESTS ---
+
+def make_long(farms, plots, months, seed):
+    """
+    Random long-format harvest records: every plot of every farm, one crop
+    and method per plot, both grades, `months` consecutive months.
+    """
+    rng = np.random.default_rng(seed)
+    plot_count = farms * plots
+    rows = plot_count * months * len(harvest_store.GRADES)
+
+    plot_id = np.repeat(np.arange(plot_count), months * len(harvest_store.GRADES))
+    month_index = np.tile(np.repeat(np.arange(months), len(harvest_store.GRADES)), plot_count)
+    plot_methods = rng.integers(0, len(harvest_store.METHODS), plot_count)
+    plot_crops = rng.integers(0, len(harvest_store.CROPS), plot_count)
+
+    return pd.DataFrame({
+        "farm": pd.Categorical.from_codes(plot_id // plots, [f"Farm {i + 1}" for i in range(farms)]),
+        "plot": pd.Categorical.from_codes(plot_id % plots, [f"Plot {i + 1}" for i in range(plots)]),
+        "crop": np.array(harvest_store.CROPS)[plot_crops[plot_id]],
+        "method": np.array(harvest_store.METHODS)[plot_methods[plot_id]],
+        "grade": np.tile(np.array(harvest_store.GRADES), rows // len(harvest_store.GRADES)),
+        "month": pd.Timestamp("2015-01-01") + pd.to_timedelta(month_index * 31, unit="D"),
+        "kg": rng.gamma(2.0, 1500.0, rows),
+    })
+
+# --- 2. BENCHMARK ---
+
+def timed(label, func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    print(f"{label:<36}{(time.perf_counter() - start) * 1000:>12.1f}")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the harvest store's normalisation and aggregations.")
+    parser.add_argument("--farms", type=int, default=500)
+    parser.add_argument("--plots", type=int, default=8, help="Plots per farm.")
+    parser.add_argument("--months", type=int, default=120, help="Months of records per plot.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    raw = make_long(args.farms, args.plots, args.months, args.seed)
+    print(f"{len(raw):,} rows ({args.farms} farms x {args.plots} plots x {args.months} months x 2 grades)\n")
+    print(f"{'Step':<36}{'ms':>12}")
+
+    store = timed("normalise", harvest_store.normalise, raw)
+    prices = {("nipis", "A"): 8.21, ("nipis", "B"): 7.14, ("kasturi", "A"): 7.57, ("kasturi", "B"): 6.85}
+    timed("method_totals", harvest_store.method_totals, store)
+    timed("method_totals by farm", harvest_store.method_totals, store, by=("farm",))
+    timed("revenue", harvest_store.revenue, store, prices)
+    timed("grade_totals (last 6 months)", harvest_store.grade_totals, store, periods=6)
+    timed("monthly_totals", harvest_store.monthly_totals, store)
+    timed("one farm (index lookup)", lambda: store.loc["Farm 1"])
+
+    # The store's figures must match a plain groupby on the raw records
+    expected = raw.groupby("method")["kg"].sum()
+    got = harvest_store.method_totals(store)
+    np.testing.assert_allclose(got[expected.index].to_numpy(), expected.to_numpy(), rtol=1e-9)
+    print("\nTotals agree with a groupby on the raw records.")
+
+if __name__ == "__main__":
+    main()
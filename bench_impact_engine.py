@@ -0,0 +1,92 @@
+import argparse
+import statistics
+import time
+import numpy as np
+
+from impact_engine import conventional_impact, parse_grades, regenerative_impact
+
+# --- 1. THE ORIGINAL PER-SCENARIO LOOP ---
+
+def loop_ep_conv(chemical_data):
+    """
+    The dashboard's original calc_ep_conv: one dict at a time, re-parsing
+    each "N-P-K" string and applying the inline factors.
+    """
+    N_applied, P_applied = 0, 0
+    for chem in chemical_data:
+        N_perc, P205_perc, K_perc = chem["unit_class"].split("-")
+        total_mass = chem["units"] * chem["unit_weight"]
+        N_applied += float(N_perc) / 100 * total_mass
+        P_applied += (float(P205_perc) / 100 * 62) / 142 * total_mass
+    N_used = N_applied * 12
+    P_used = P_applied * 12
+    EP_N = N_used * 1.33 * 0.158
+    EP_P = P_used * 0.05 * 0.100
+    CFP = 3.7 * N_used + 3.1 * P_used
+    return EP_N, EP_P, CFP
+
+def loop_ep_regen(units, unit_weight):
+    N_used = 0.05 * units * unit_weight * 12
+    P_used = 0.005 * units * unit_weight * 12
+    return N_used * 1.33 * 0.158, P_used * 0.05 * 0.100, units * unit_weight * -1.83 * 12
+
+# --- 2. SCENARIOS ---
+
+GRADES = np.array(["15-15-15", "5-5-5", "10-5-12", "16-16-8", "12-12-17"])
+
+def make_scenarios(count, products, seed):
+    """
+    Random fertiliser programmes: units, kg/unit and a grade (as an index
+    into GRADES) per product.
+    """
+    rng = np.random.default_rng(seed)
+    units = rng.integers(0, 10, size=(count, products)).astype(float)
+    unit_weight = rng.choice([1.5, 2.0, 25.0, 50.0], size=(count, products))
+    grade_index = rng.integers(0, len(GRADES), size=(count, products))
+    regen_units = rng.uniform(1000, 10000, size=count)
+    return units, unit_weight, grade_index, regen_units
+
+def as_dicts(units, unit_weight, grade_index):
+    return [
+        [{"units": u, "unit_weight": w, "unit_class": GRADES[g]} for u, w, g in zip(*row)]
+        for row in zip(units.tolist(), unit_weight.tolist(), grade_index.tolist())
+    ]
+
+# --- 3. BENCHMARK ---
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the per-scenario impact loop against the vectorised engine.")
+    parser.add_argument("--scenarios", type=int, default=100_000, help="Number of fertiliser programmes.")
+    parser.add_argument("--products", type=int, default=4, help="Products per programme.")
+    parser.add_argument("--repeats", type=int, default=5, help="Number of timed runs of the engine.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    units, unit_weight, grade_index, regen_units = make_scenarios(args.scenarios, args.products, args.seed)
+    scenarios = as_dicts(units, unit_weight, grade_index)
+
+    start = time.perf_counter()
+    expected = np.array([loop_ep_conv(chems) for chems in scenarios])
+    expected_regen = np.array([loop_ep_regen(u, 0.001) for u in regen_units.tolist()])
+    loop_ms = (time.perf_counter() - start) * 1000
+
+    timings = []
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        # Each distinct grade is parsed once; scenarios index into the table
+        grades = parse_grades(GRADES)[grade_index]
+        conv = conventional_impact(units, unit_weight, grades)
+        regen = regenerative_impact(regen_units, 0.001)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    np.testing.assert_allclose(np.column_stack(conv), expected, rtol=1e-12)
+    np.testing.assert_allclose(np.column_stack(regen), expected_regen, rtol=1e-12)
+    print(f"Both implementations agree on {args.scenarios:,} scenarios.")
+
+    print(f"\n{'Strategy':<28}{'ms':>12}")
+    print(f"{'per-scenario loop':<28}{loop_ms:>12.1f}")
+    print(f"{'vectorised engine (median)':<28}{statistics.median(timings):>12.1f}")
+    print(f"\nSpeed-up: {loop_ms / statistics.median(timings):.0f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from langchain.text_splitter import CharacterTextSplitter, RecursiveCharacterTextSplitter
+from langchain_community.vectorstores import Chroma
+from langchain_community.vectorstores.utils import filter_complex_metadata
+
+import lexical_index
+import process_documents
+from embedding_backends import make_embeddings
+from rag_pipeline import PERSIST_DIRECTORY, RETRIEVAL_MODE, RETRIEVER_K, RAGPipeline
+
+# --- 1. CONFIGURATION ---
+
+# One JSON object per line: {"question", "source" (file name), "pages"
+# (0-based page numbers, optional), "answer" (text the context should contain)}
+QUESTIONS_FILE = "retrieval_questions.jsonl"
+
+# Splitter name -> factory(chunk_size, chunk_overlap)
+SPLITTERS = {
+    "recursive": lambda size, overlap: RecursiveCharacterTextSplitter(chunk_size=size, chunk_overlap=overlap),
+    # PDF pages rarely contain blank lines, so split on single line breaks
+    "character": lambda size, overlap: CharacterTextSplitter(separator="\n", chunk_size=size, chunk_overlap=overlap),
+}
+
+# Chroma's usage telemetry would add network calls to the timed queries
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+# --- 2. QUESTION SET ---
+
+def load_questions(path=QUESTIONS_FILE):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def _targets(question):
+    """
+    The (source, page) pairs a question should retrieve; page None means any page.
+    """
+    pages = question.get("pages") or [None]
+    return [(question["source"], page) for page in pages]
+
+def _matches(doc, target):
+    source, page = target
+    if os.path.basename(str(doc.metadata.get("source", ""))) != source:
+        return False
+    return page is None or doc.metadata.get("page") == page
+
+def _normalise(text):
+    return re.sub(r"\s+", " ", text).lower()
+
+def score(question, docs):
+    """
+    Returns (recall, reciprocal rank, context hit) for one ranked result list.
+    """
+    targets = _targets(question)
+    recall = sum(any(_matches(doc, target) for doc in docs) for target in targets) / len(targets)
+    reciprocal_rank = 0.0
+    for rank, doc in enumerate(docs, start=1):
+        if any(_matches(doc, target) for target in targets):
+            reciprocal_rank = 1.0 / rank
+            break
+    # An LLM-free proxy for answer relevance: could the answer be read off the context?
+    context = _normalise(" ".join(doc.page_content for doc in docs))
+    hit = float(_normalise(question["answer"]) in context) if question.get("answer") else None
+    return recall, reciprocal_rank, hit
+
+# --- 3. INDEXES ---
+
+def build_index(docs, splitter, embeddings, persist_directory, batch_size=process_documents.EMBED_BATCH_SIZE):
+    """
+    Chunks and embeds the documents into a new Chroma store, the same way
+    process_documents.py does. Returns the number of chunks.
+    """
+    chunks = filter_complex_metadata(splitter.split_documents(docs))
+    ids = process_documents.chunk_ids(chunks)
+    # Single-threaded HNSW inserts, so the graph (and the results) repeat run to run
+    db = Chroma(persist_directory=persist_directory, embedding_function=embeddings,
+                collection_metadata={"hnsw:num_threads": 1})
+    # Not process_documents.add_chunks(): its checkpoints live inside chroma_db
+    for start in range(0, len(chunks), batch_size):
+        batch = chunks[start:start + batch_size]
+        texts = [chunk.page_content for chunk in batch]
+        db._collection.upsert(
+            ids=ids[start:start + batch_size],
+            embeddings=embeddings.embed_documents(texts),
+            documents=texts,
+            metadatas=[chunk.metadata for chunk in batch],
+        )
+    lexical_index.build(ids, [chunk.page_content for chunk in chunks], persist_directory)
+    return len(chunks)
+
+def directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, filename))
+        for root, _, filenames in os.walk(path) for filename in filenames
+    )
+
+# --- 4. BENCHMARK ---
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+def evaluate(persist_directory, questions, k, mode, repeats, embedding_backend, llm_backend, answer, embedding_cache):
+    """
+    Runs every question through a RAGPipeline over the given index and
+    returns the quality metrics and retrieval (embed + search) latencies.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        pipeline = RAGPipeline(persist_directory, k=k, embedding_backend=embedding_backend, llm_backend=llm_backend,
+                               retrieval_mode=mode, embedding_cache=embedding_cache)
+    pipeline.retrieve(questions[0]["question"])  # warm-up
+
+    scores, latencies, answer_latencies = [], [], []
+    for question in questions:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            docs = pipeline.retrieve(question["question"])
+            latencies.append((time.perf_counter() - start) * 1000)
+        scores.append(score(question, docs))
+        if answer:
+            start = time.perf_counter()
+            pipeline.ask(question["question"])
+            answer_latencies.append((time.perf_counter() - start) * 1000)
+
+    hits = [hit for _, _, hit in scores if hit is not None]
+    # Questions answered by the BM25-only fast path instead of fused retrieval
+    lexical = lexical_index.load(persist_directory) if mode == "hybrid" else None
+    keyword = sum(lexical.is_keyword_query(question["question"]) for question in questions) if lexical else 0
+    return {
+        "mode": mode,
+        "k": k,
+        "recall": statistics.mean(recall for recall, _, _ in scores),
+        "mrr": statistics.mean(rr for _, rr, _ in scores),
+        "context_hit": statistics.mean(hits) if hits else None,
+        "keyword_queries": keyword,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "answer_p50_ms": percentile(answer_latencies, 50) if answer else None,
+    }
+
+def _ints(value):
+    return [int(part) for part in value.split(",") if part.strip()]
+
+def print_row(row, answer):
+    current = (
+        row["splitter"] == "recursive" and row["chunk_size"] == process_documents.CHUNK_SIZE
+        and row["chunk_overlap"] == process_documents.CHUNK_OVERLAP and row["k"] == RETRIEVER_K
+        and row["mode"] == RETRIEVAL_MODE
+    )
+    hit = "-" if row["context_hit"] is None else f"{row['context_hit']:.2f}"
+    line = (
+        f"{row['splitter'] + (' *' if current else ''):<12}{str(row['chunk_size']):>6}{str(row['chunk_overlap']):>9}"
+        f"{row['chunks']:>8}{row['index_mb']:>10.2f}{row['mode']:>8}{row['k']:>4}"
+        f"{row['recall']:>10.2f}{row['mrr']:>7.2f}{hit:>9}{row['keyword_queries']:>5}{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}"
+    )
+    if answer:
+        line += f"{row['answer_p50_ms']:>11.1f}"
+    print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure retrieval quality and latency across chunking and k settings.")
+    parser.add_argument("--questions", default=QUESTIONS_FILE, help="JSONL question set with expected sources/pages.")
+    parser.add_argument("--chunk-sizes", type=_ints, default=[500, process_documents.CHUNK_SIZE, 2000])
+    parser.add_argument("--overlaps", type=_ints, default=[100, process_documents.CHUNK_OVERLAP])
+    parser.add_argument("--splitters", default=",".join(SPLITTERS), help=f"Comma-separated: {', '.join(SPLITTERS)}.")
+    parser.add_argument("--k", type=_ints, default=[1, RETRIEVER_K, 5], help="Comma-separated retriever k values.")
+    parser.add_argument("--modes", default="dense,hybrid", help="Comma-separated retrieval modes: dense, hybrid.")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed retrievals per question.")
+    parser.add_argument("--embedding-backend", choices=["google", "fake"], default="fake",
+                        help="Embedding backend; 'fake' runs offline and deterministically.")
+    parser.add_argument("--llm-backend", choices=["google", "stub"], default="stub",
+                        help="LLM used by --answer; 'stub' runs offline.")
+    parser.add_argument("--embedding-cache", action="store_true",
+                        help="Query through the persistent embedding cache (off by default so every query is embedded).")
+    parser.add_argument("--answer", action="store_true", help="Also time full answers through the pipeline.")
+    parser.add_argument("--existing", action="store_true",
+                        help=f"Also evaluate '{PERSIST_DIRECTORY}' as built (it must use the same embedding backend).")
+    parser.add_argument("--json", dest="json_path", default=None, help="Write the result rows to this file.")
+    args = parser.parse_args()
+
+    questions = load_questions(args.questions)
+    splitters = [name.strip() for name in args.splitters.split(",") if name.strip()]
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    embeddings = make_embeddings(args.embedding_backend, cache=False)
+    docs = process_documents.load_documents(process_documents.SOURCE_DOCUMENTS_DIR)
+    print(f"\n{len(questions)} questions over {len(docs)} pages, {args.embedding_backend} embeddings, "
+          f"{args.repeats} timed retrievals per question\n")
+
+    header = (
+        f"{'splitter':<12}{'size':>6}{'overlap':>9}{'chunks':>8}{'index MB':>10}{'mode':>8}{'k':>4}"
+        f"{'recall@k':>10}{'MRR':>7}{'ctx hit':>9}{'kw':>5}{'p50 ms':>9}{'p95 ms':>9}"
+    )
+    print(header + (f"{'answer p50':>11}" if args.answer else ""))
+
+    rows = []
+    if args.existing and not os.path.exists(os.path.join(PERSIST_DIRECTORY, "chroma.sqlite3")):
+        # Opening it would create an empty database in its place
+        print(f"(skipping '{PERSIST_DIRECTORY}': no index has been built there yet)")
+    elif args.existing:
+        base = {"splitter": "chroma_db", "chunk_size": "-", "chunk_overlap": "-",
+                "chunks": 0, "index_mb": directory_size(PERSIST_DIRECTORY) / 1e6}
+        for mode in modes:
+            for k in args.k:
+                row = {**base, **evaluate(PERSIST_DIRECTORY, questions, k, mode, args.repeats, args.embedding_backend,
+                                          args.llm_backend, args.answer, args.embedding_cache)}
+                rows.append(row)
+                print_row(row, args.answer)
+
+    for splitter_name in splitters:
+        for chunk_size in args.chunk_sizes:
+            for chunk_overlap in args.overlaps:
+                if chunk_overlap >= chunk_size:
+                    continue
+                persist_directory = tempfile.mkdtemp(prefix="bench_retrieval-")
+                try:
+                    splitter = SPLITTERS[splitter_name](chunk_size, chunk_overlap)
+                    chunks = build_index(docs, splitter, embeddings, persist_directory)
+                    base = {"splitter": splitter_name, "chunk_size": chunk_size, "chunk_overlap": chunk_overlap,
+                            "chunks": chunks, "index_mb": directory_size(persist_directory) / 1e6}
+                    for mode in modes:
+                        for k in args.k:
+                            row = {**base, **evaluate(persist_directory, questions, k, mode, args.repeats,
+                                                      args.embedding_backend, args.llm_backend, args.answer,
+                                                      args.embedding_cache)}
+                            rows.append(row)
+                            print_row(row, args.answer)
+                finally:
+                    shutil.rmtree(persist_directory, ignore_errors=True)
+
+    print(f"\n* current settings (process_documents.py, RETRIEVER_K, RETRIEVAL_MODE); kw = questions answered by BM25 alone")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+        print(f"Results written to {args.json_path}")
+
+if __name__ == "__main__":
+    # Chroma inserts each batch in set order, which follows the per-process
+    # string hash seed; pin it so repeated runs build the same HNSW graph
+    if os.environ.get("PYTHONHASHSEED") is None:
+        os.execve(sys.executable, [sys.executable, *sys.argv], {**os.environ, "PYTHONHASHSEED": "0"})
+    main()
@@ -0,0 +1,84 @@
+import argparse
+import statistics
+import time
+import pandas as pd
+
+from data_loader import PLANT_HARVEST_FILE, PLOT_DATA_FILE, WORKBOOK_REGIONS
+from workbook_reader import read_regions
+
+# --- 1. THE TWO LOADING STRATEGIES ---
+
+def load_seven_calls():
+    """
+    The original dashboard approach: one pd.read_excel call per frame, each
+    re-opening and re-inflating the workbook.
+    """
+    frames = {}
+    frames["cost_df"] = pd.read_excel(PLOT_DATA_FILE, sheet_name='Cost')
+
+    yield_nipis_df = pd.read_excel(PLOT_DATA_FILE, sheet_name='Yield', skiprows=2, nrows=2, usecols="A,C:D", header=None)
+    yield_nipis_df.columns = ['Farming Method', 'Grade A (kg)', 'Grade B (kg)']
+    frames["yield_nipis_df"] = yield_nipis_df
+
+    yield_kasturi_df = pd.read_excel(PLOT_DATA_FILE, sheet_name='Yield', skiprows=7, nrows=2, usecols="A,C:D", header=None)
+    yield_kasturi_df.columns = ['Farming Method', 'Grade A (kg)', 'Grade B (kg)']
+    frames["yield_kasturi_df"] = yield_kasturi_df
+
+    disaggregation_df = pd.read_excel(PLOT_DATA_FILE, sheet_name='Yield', skiprows=13, nrows=2, usecols="A:C", header=None, index_col=0)
+    disaggregation_df.columns = ['Conventional Farming', 'Regenerative Farming']
+    disaggregation_df.index.name = None
+    frames["disaggregation_df"] = disaggregation_df
+
+    frames["ep_df"] = pd.read_excel(PLOT_DATA_FILE, sheet_name='EP', index_col=0)
+    frames["soil_health_df"] = pd.read_excel(PLOT_DATA_FILE, sheet_name='SoilHealth', index_col=0)
+    frames["plant_harvest_df"] = pd.read_excel(PLANT_HARVEST_FILE, sheet_name='Plant Harvest (Cleaned)', header=1)
+    return frames
+
+def load_regions():
+    """
+    The region-based reader: one read-only pass per workbook.
+    """
+    frames = {}
+    for path, regions in WORKBOOK_REGIONS.items():
+        frames.update(read_regions(path, regions))
+    return frames
+
+# --- 2. BENCHMARK ---
+
+def time_it(func, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+def check_equivalent():
+    """
+    Verifies both strategies produce identical frames before timing them.
+    """
+    expected = load_seven_calls()
+    actual = load_regions()
+    for name, df in expected.items():
+        pd.testing.assert_frame_equal(actual[name], df)
+    print(f"Both readers produce identical frames ({len(expected)} frames).")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the seven-call Excel loading against the single-pass region reader.")
+    parser.add_argument("--repeats", type=int, default=20, help="Number of timed runs per strategy.")
+    args = parser.parse_args()
+
+    check_equivalent()
+
+    print(f"\n{'Strategy':<28}{'median (ms)':>14}{'min (ms)':>12}{'max (ms)':>12}")
+    results = {}
+    for label, func in [("seven pd.read_excel calls", load_seven_calls), ("single-pass regions", load_regions)]:
+        timings = time_it(func, args.repeats)
+        results[label] = statistics.median(timings)
+        print(f"{label:<28}{statistics.median(timings):>14.1f}{min(timings):>12.1f}{max(timings):>12.1f}")
+
+    speedup = results["seven pd.read_excel calls"] / results["single-pass regions"]
+    print(f"\nSpeed-up: {speedup:.1f}x")
+
+if __name__ == "__main__":
+    main()
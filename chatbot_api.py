@@ -1,98 +1,473 @@
 # chatbot_api.py
+import asyncio
+import contextlib
+import json
 import os
-from dotenv import load_dotenv
-from flask import Flask, request, jsonify
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
-from langchain_community.vectorstores import Chroma
-from langchain.chains import RetrievalQA
-from langchain.prompts import PromptTemplate
-from langchain_community.vectorstores.utils import filter_complex_metadata
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
 
-# --- 1. SET UP YOUR ENVIRONMENT ---
+import lexical_index
+import rag_client
+import tracing
+from answer_cache import AnswerCache, normalize_question
+from rag_pipeline import PERSIST_DIRECTORY
 
-load_dotenv()
-api_key = os.getenv("GOOGLE_API_KEY")
-if not api_key:
-    raise ValueError("GOOGLE_API_KEY not found. Please set it in your environment or a .env file.")
+# --- 1. ANSWER CACHE ---
 
-PERSIST_DIRECTORY = "chroma_db"
+# Repeated and near-identical questions are answered from memory instead of
+# paying for another embedding round-trip and Gemini generation.
+answer_cache = AnswerCache(
+    max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512")),
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+    similarity_threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+)
 
-# --- 2. DEFINE THE PROMPT TEMPLATE ---
+# --- 2. RAG SERVICE CONNECTION ---
 
-prompt_template = """
-You are an AI assistant for answering questions about a set of documents.
-You are given the following extracted parts of a long document and a question. Provide a conversational answer.
-Use the context below to answer the question.
-If you don't know the answer, just say "I'm sorry, I cannot find that information in the provided documents." Don't try to make up an answer.
+# The RAG components are owned by rag_service.py; this API forwards questions
+# to that long-lived worker instead of building its own pipeline at import time.
+# It runs on an async server, so a question waiting on retrieval or generation
+# holds a coroutine rather than a thread and one process serves many at once.
+_rag = {"client": None}
 
-CONTEXT:
-{context}
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    _rag["client"] = rag_client.AsyncRAGClient()
+    try:
+        yield
+    finally:
+        await _rag["client"].aclose()
 
-QUESTION:
-{question}
+async def _lookup(question):
+    """
+    Checks the answer cache. Returns (cached_result, cache_kind, embedding);
+    cached_result is None on a miss, and embedding is reused for generation.
+    """
+    with tracing.span("cache_lookup"):
+        cached = answer_cache.get_exact(question)
+    if cached is not None:
+        return cached, "exact", None
 
-ANSWER:
-"""
-PROMPT = PromptTemplate(
-    template=prompt_template, input_variables=["context", "question"]
-)
+    # Keyword queries are answered from the lexical index alone, so fetching
+    # an embedding just for the semantic lookup would be the only remote call
+    if lexical_index.is_keyword_query(question, PERSIST_DIRECTORY):
+        answer_cache.count_miss()
+        return None, None, None
+
+    # The query embedding drives the semantic lookup and, on a miss, is
+    # passed on so the RAG service does not embed the question again.
+    try:
+        with tracing.span("embed"):
+            embedding = await embed_batcher.submit(question)
+    except rag_client.RAGServiceError:
+        embedding = None
+
+    if embedding is not None:
+        with tracing.span("cache_lookup"):
+            cached = answer_cache.get_semantic(embedding)
+        if cached is not None:
+            return cached, "semantic", embedding
+    else:
+        answer_cache.count_miss()
+    return None, None, embedding
+
+async def _question(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    return data.get("question") if isinstance(data, dict) else None
+
+async def _wants_timings(request):
+    """
+    True if the caller asked for a timing breakdown, with ?timings=1 or
+    "timings": true in the body.
+    """
+    if request.query_params.get("timings", "").lower() in ("1", "true", "yes"):
+        return True
+    try:
+        data = await request.json()
+    except ValueError:
+        return False
+    return isinstance(data, dict) and bool(data.get("timings"))
+
+def _ndjson(event):
+    return json.dumps(event) + "\n"
+
+# --- 3. MICRO-BATCHING ---
+
+# Questions arriving within this many milliseconds of each other are embedded
+# (and, on a cache miss, retrieved and answered) in one request to the RAG
+# service. Bursts pay one embedding call instead of one per question.
+BATCH_WINDOW = float(os.getenv("BATCH_WINDOW_MS", "5")) / 1000
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "16"))
 
-# --- 3. INITIALIZE THE RAG COMPONENTS (Global Instance) ---
-
-print("Initializing RAG chain...")
-try:
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
-    db = Chroma(
-        persist_directory=PERSIST_DIRECTORY,
-        embedding_function=embeddings
-    )
-    retriever = db.as_retriever(search_kwargs={"k": 3})
-    llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0.2)
-    chain_type_kwargs = {"prompt": PROMPT}
-    qa_chain = RetrievalQA.from_chain_type(
-        llm=llm,
-        chain_type="stuff",
-        retriever=retriever,
-        chain_type_kwargs=chain_type_kwargs,
-        return_source_documents=True
-    )
-    print("RAG chain initialized successfully.")
-except Exception as e:
-    print(f"Error initializing RAG chain: {e}")
-    qa_chain = None
-
-# --- 4. CREATE THE FLASK API ---
-
-app = Flask(__name__)
-
-@app.route('/ask', methods=['POST'])
-def ask_question():
+class MicroBatcher:
+    """
+    Collects items submitted close together and hands them to an async
+    handler as one list. A batch is sent window seconds after its first item,
+    or as soon as it holds max_size items. The handler returns one result per
+    item; a result that is an exception is raised to that item's caller only.
+    """
+
+    def __init__(self, handler, window=BATCH_WINDOW, max_size=BATCH_MAX_SIZE):
+        self.handler = handler
+        self.window = window
+        self.max_size = max_size
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+        self.stats = {"batches": 0, "items": 0, "largest": 0}
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            # The loop only keeps weak references to tasks
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        self.stats["batches"] += 1
+        self.stats["items"] += len(batch)
+        self.stats["largest"] = max(self.stats["largest"], len(batch))
+        try:
+            results = await self.handler([item for item, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, future), result in zip(batch, results):
+            # Callers that gave up (client disconnected) have cancelled their future
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def snapshot(self):
+        batches = self.stats["batches"]
+        return dict(self.stats, average=round(self.stats["items"] / batches, 2) if batches else None)
+
+async def _embed_many(texts):
+    # Identical texts in a batch are embedded once
+    unique = list(dict.fromkeys(texts))
+    embeddings = dict(zip(unique, await _rag["client"].embed_batch(unique)))
+    return [embeddings[text] for text in texts]
+
+async def _ask_many(items):
+    return await _rag["client"].ask_batch(items)
+
+async def _retrieve_many(items):
+    return await _rag["client"].retrieve_batch(items)
+
+embed_batcher = MicroBatcher(_embed_many)
+ask_batcher = MicroBatcher(_ask_many)
+# Streamed answers are generated one by one, but their retrieval is batched
+retrieve_batcher = MicroBatcher(_retrieve_many)
+
+# Identical questions (after normalisation) that arrive while one is still
+# being answered wait for that answer instead of generating their own.
+_in_flight = {}
+coalesced = {"count": 0}
+
+async def _answer(question):
+    """
+    Answers a question for /ask from the cache or the RAG service. Returns
+    the response body.
+    """
+    cached, kind, embedding = await _lookup(question)
+    if cached is not None:
+        return dict(cached, cached=kind)
+
+    with tracing.span("rag_service"):
+        result = await ask_batcher.submit((question, embedding))
+    # The service's own stages (batch-wide), e.g. rag_service.generate
+    trace = tracing.current()
+    if trace is not None:
+        trace.add(result.get("timings"), prefix="rag_service.")
+    response = {
+        "answer": result["answer"],
+        "sources": result["sources"]
+    }
+    answer_cache.put(question, response, embedding=embedding)
+    return response
+
+async def _answer_coalesced(question):
+    key = normalize_question(question)
+    task = _in_flight.get(key)
+    if task is None:
+        # A task rather than the first caller's coroutine, so the answer is
+        # still delivered to the others if that caller disconnects
+        task = asyncio.ensure_future(_answer(question))
+        _in_flight[key] = task
+        task.add_done_callback(lambda _: _in_flight.pop(key, None))
+        return await asyncio.shield(task)
+    coalesced["count"] += 1
+    with tracing.span("coalesced_wait"):
+        return await asyncio.shield(task)
+
+class SharedStream:
+    """
+    The events of one upstream answer stream, kept so that every request
+    for the same question can replay them from the start, however late it
+    joins. failure is raised to subscribers if the stream broke before its
+    first event, so they can still reply with a status code.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.failure = None
+        self.finished = False
+        self._changed = asyncio.Condition()
+
+    async def publish(self, event):
+        async with self._changed:
+            self.events.append(event)
+            self._changed.notify_all()
+
+    async def close(self, failure=None):
+        async with self._changed:
+            self.failure = failure
+            self.finished = True
+            self._changed.notify_all()
+
+    async def subscribe(self):
+        index = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: index < len(self.events) or self.finished)
+                if index == len(self.events):
+                    if self.failure is not None:
+                        raise self.failure
+                    return
+                event = self.events[index]
+            index += 1
+            yield event
+
+# Identical questions streamed at the same time share one upstream stream
+_streams_in_flight = {}
+
+def _add_timings(timings, extra):
+    timings = dict(timings or {})
+    for stage, ms in (extra or {}).items():
+        if stage != "total":
+            timings[stage] = round(timings.get(stage, 0.0) + ms, 2)
+    return timings
+
+async def _stream_answer(question, embedding, shared):
+    """
+    Retrieves the context for a question in a batch with other streamed
+    questions, then streams its answer from the RAG service into shared.
+    """
+    try:
+        with tracing.span("retrieve"):
+            retrieved = await retrieve_batcher.submit((question, embedding))
+        # Always asked for, so slow-request traces include the service's stages
+        upstream = _rag["client"].stream(question, timings=True,
+                                         context=retrieved["context"], sources=retrieved["sources"])
+        try:
+            sources, tokens = [], []
+            async for event in upstream:
+                if event["type"] == "sources":
+                    sources = event["sources"]
+                elif event["type"] == "token":
+                    tokens.append(event["text"])
+                elif event["type"] == "done":
+                    # Only complete answers are cached
+                    answer_cache.put(question, {"answer": "".join(tokens), "sources": sources}, embedding=embedding)
+                    # The batch-wide retrieval stages, e.g. rag_service.vector_search
+                    event = dict(event, timings=_add_timings(event.get("timings"), retrieved.get("timings")))
+                await shared.publish(event)
+                if event["type"] in ("done", "error"):
+                    return
+            await shared.publish({"type": "error", "error": "The RAG service closed the stream early."})
+        finally:
+            await upstream.aclose()
+    except Exception as e:
+        if not shared.events:
+            await shared.close(e)
+            return
+        # The status line is already out; end the body with an error line
+        await shared.publish({"type": "error", "error": str(e)})
+    finally:
+        await shared.close(shared.failure)
+
+# --- 4. ENDPOINTS ---
+
+async def health(request):
+    """
+    Reports whether this API and the RAG service behind it are up.
+    """
+    service = await _rag["client"].health()
+    return JSONResponse({
+        "status": "ok",
+        "rag_service": service if service is not None else {"status": "unreachable"},
+    })
+
+async def stats(request):
+    """
+    Reports answer cache hit/miss counters and how requests were batched.
+    """
+    return JSONResponse({
+        "answer_cache": answer_cache.snapshot(),
+        "batching": {
+            "embed": embed_batcher.snapshot(),
+            "ask": ask_batcher.snapshot(),
+            "retrieve": retrieve_batcher.snapshot(),
+            "coalesced": coalesced["count"],
+        },
+    })
+
+async def metrics(request):
+    """
+    Per-stage latency histograms, request counters and the in-flight gauge,
+    in the Prometheus text format.
+    """
+    return Response(tracing.render(), media_type=tracing.METRICS_CONTENT_TYPE)
+
+async def ask_question(request):
     """
     API endpoint to receive a question and return an answer from the chatbot.
+    With ?timings=1 (or "timings": true) the response includes the time spent
+    in each stage, in milliseconds.
     """
-    if not qa_chain:
-        return jsonify({"error": "Chatbot is not ready."}), 503
+    question = await _question(request)
+    if not question:
+        return JSONResponse({"error": "No question provided."}, status_code=400)
 
-    data = request.get_json()
-    question = data.get("question")
+    with tracing.request("ask") as trace:
+        try:
+            response = await _answer_coalesced(question)
+        except rag_client.RAGServiceError as e:
+            trace.error = str(e)
+            # 503 covers both "service down" and "service still warming up"
+            return JSONResponse({"error": str(e)}, status_code=e.status_code or 503)
+        except Exception as e:
+            trace.error = str(e)
+            return JSONResponse({"error": str(e)}, status_code=500)
+        if await _wants_timings(request):
+            response = dict(response, timings=trace.timings())
+        return JSONResponse(response)
 
+async def ask_question_stream(request):
+    """
+    Streaming variant of /ask. Responds with JSON lines:
+        {"type": "sources", "sources": [...]}   as soon as retrieval is done
+        {"type": "token", "text": "..."}        as the answer is generated
+        {"type": "done", "cached": ...}         at the end
+    or a {"type": "error", "error": "..."} line if generation fails midway.
+    Cache hits are sent as a single token. Errors before the first line are
+    returned as ordinary JSON with a status code, like /ask. With timings
+    requested as for /ask, the "done" line carries them. Retrieval is batched
+    across concurrent streams, and identical questions streamed at the same
+    time replay one answer from the RAG service.
+    """
+    question = await _question(request)
     if not question:
-        return jsonify({"error": "No question provided."}), 400
+        return JSONResponse({"error": "No question provided."}, status_code=400)
+    timings = await _wants_timings(request)
 
+    # Finished by hand: the stream outlives this handler
+    trace = tracing.Trace("ask_stream")
+    key = normalize_question(question)
     try:
-        result = qa_chain.invoke(question)
-        answer = result["result"]
-        source_docs = [
-            {"source": doc.metadata.get('source', 'N/A'), "page": doc.metadata.get('page', 'N/A')}
-            for doc in result["source_documents"]
-        ]
-        return jsonify({
-            "answer": answer,
-            "sources": source_docs
-        })
+        with tracing.activate(trace):
+            shared = _streams_in_flight.get(key)
+            if shared is None:
+                cached, kind, embedding = await _lookup(question)
+                if cached is not None:
+                    done = {"type": "done", "cached": kind}
+                    if timings:
+                        done["timings"] = trace.timings()
+                    trace.finish()
+                    events = iter([
+                        {"type": "sources", "sources": cached["sources"]},
+                        {"type": "token", "text": cached["answer"]},
+                        done,
+                    ])
+                    return StreamingResponse((_ndjson(event) for event in events), media_type="application/x-ndjson")
+                # Another request may have started the same stream during the lookup
+                shared = _streams_in_flight.get(key)
+            if shared is None:
+                shared = SharedStream()
+                _streams_in_flight[key] = shared
+                # A task rather than this handler, so the other subscribers
+                # still get the answer if this client disconnects
+                task = asyncio.ensure_future(_stream_answer(question, embedding, shared))
+                task.add_done_callback(lambda _: _streams_in_flight.pop(key, None))
+                stage = "rag_service_first_event"
+            else:
+                coalesced["count"] += 1
+                stage = "coalesced_wait"
+            upstream = shared.subscribe()
+            # Wait for the first event before replying so a down or
+            # warming-up service still gets a proper status code
+            with tracing.span(stage):
+                first = await upstream.__anext__()
+    except rag_client.RAGServiceError as e:
+        trace.error = str(e)
+        trace.finish()
+        return JSONResponse({"error": str(e)}, status_code=e.status_code or 503)
+    except StopAsyncIteration:
+        trace.error = "empty stream"
+        trace.finish()
+        return JSONResponse({"error": "The RAG service returned an empty stream."}, status_code=502)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        trace.error = str(e)
+        trace.finish()
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+    async def relay():
+        event = first
+        try:
+            while True:
+                if event["type"] == "done":
+                    trace.add(event.get("timings"), prefix="rag_service.")
+                    event = {"type": "done", "cached": None}
+                    if timings:
+                        event["timings"] = trace.timings()
+                elif event["type"] == "error":
+                    trace.error = event.get("error")
+                yield _ndjson(event)
+                if event["type"] in ("done", "error"):
+                    break
+                event = await upstream.__anext__()
+        except StopAsyncIteration:
+            trace.error = "stream closed early"
+            yield _ndjson({"type": "error", "error": "The RAG service closed the stream early."})
+        finally:
+            trace.finish()
+            await upstream.aclose()
+
+    return StreamingResponse(relay(), media_type="application/x-ndjson")
+
+# --- 5. CREATE THE APP ---
+
+app = Starlette(
+    routes=[
+        Route('/health', health, methods=['GET']),
+        Route('/stats', stats, methods=['GET']),
+        Route('/metrics', metrics, methods=['GET']),
+        Route('/ask', ask_question, methods=['POST']),
+        Route('/ask/stream', ask_question_stream, methods=['POST']),
+    ],
+    lifespan=lifespan,
+)
 
 if __name__ == '__main__':
-    # Run the Flask app on localhost, port 5000
-    app.run(debug=True, host='127.0.0.1', port=5000)
+    # Run the API on localhost, port 5000
+    uvicorn.run(app, host='127.0.0.1', port=5000)
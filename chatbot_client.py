@@ -0,0 +1,254 @@
+import bisect
+import json
+import os
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- 1. CONFIGURATION ---
+
+# Where chatbot_api.py listens. The dashboard is its only HTTP client.
+CHATBOT_API_URL = os.getenv("CHATBOT_API_URL", "http://127.0.0.1:5000")
+
+# Connecting should be near-instant on localhost. The read timeout applies
+# between streamed lines, so it bounds a stalled answer, not a long one.
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 60
+
+# Retries only cover failures before any answer text has been shown
+MAX_RETRIES = 2
+RETRY_BASE_DELAY = 0.25
+
+# Consecutive failures before the breaker opens, and how long it stays open
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_RESET_TIMEOUT = 15
+
+# Upper bounds (ms) of the latency histogram buckets; the last one is open
+LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+class ChatbotAPIError(Exception):
+    """
+    Raised when the chatbot API is unreachable or returns an error.
+    status_code is None when the API could not be reached at all.
+    """
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+class CircuitOpenError(ChatbotAPIError):
+    """
+    Raised without contacting the API while the circuit breaker is open.
+    """
+
+# --- 2. CIRCUIT BREAKER ---
+
+class CircuitBreaker:
+    """
+    Fails fast after repeated failures instead of letting every rerun wait
+    for the connect timeout.
+
+    closed: requests go through. After failure_threshold consecutive
+    failures it opens. open: requests are rejected until reset_timeout has
+    passed, then one trial request is let through (half-open) and its
+    outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        with self._lock:
+            if self.state != "closed":
+                remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+                if remaining > 0:
+                    raise CircuitOpenError(
+                        f"The chatbot API is unavailable. Retrying in {remaining:.0f}s."
+                    )
+                # Let one trial through; if it never reports back, another
+                # is allowed after a further reset_timeout
+                self.state = "half_open"
+                self.opened_at = time.monotonic()
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+# --- 3. LATENCY HISTOGRAMS ---
+
+class LatencyHistogram:
+    """
+    Fixed-bucket histogram of request latencies in milliseconds.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, ms):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+            self.total += 1
+            self.sum_ms += ms
+
+    def quantile(self, q):
+        """
+        Returns the upper bound of the bucket holding the q-th quantile,
+        or None if nothing has been observed (or it falls in the open bucket).
+        """
+        with self._lock:
+            if not self.total:
+                return None
+            rank = q * self.total
+            seen = 0
+            for bound, count in zip(self.buckets + [None], self.counts):
+                seen += count
+                if seen >= rank:
+                    return bound
+            return None
+
+    def snapshot(self):
+        labels = [f"≤{bound}" for bound in self.buckets] + [f">{self.buckets[-1]}"]
+        with self._lock:
+            return {
+                "count": self.total,
+                "mean_ms": round(self.sum_ms / self.total, 1) if self.total else None,
+                "buckets": dict(zip(labels, self.counts)),
+            }
+
+# --- 4. CLIENT ---
+
+# Streamlit re-executes dashboard.py on every interaction but keeps imported
+# modules alive, so this session, breaker and histograms persist across
+# reruns and are shared by every browser session in the server process.
+_session = requests.Session()
+_session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=10))
+_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=10))
+
+breaker = CircuitBreaker()
+latency = {
+    "first_token": LatencyHistogram(),
+    "total": LatencyHistogram(),
+}
+counters = {"requests": 0, "retries": 0, "failures": 0, "rejected": 0}
+
+def _open_stream(question):
+    """
+    POSTs to /ask/stream and returns the response once headers arrive,
+    retrying connection failures and 502/503/504 with jittered backoff.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        if attempt:
+            counters["retries"] += 1
+            time.sleep(RETRY_BASE_DELAY * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+        try:
+            response = _session.post(
+                f"{CHATBOT_API_URL}/ask/stream",
+                json={"question": question},
+                stream=True,
+                timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+            )
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            error = ChatbotAPIError(
+                "Could not connect to the chatbot API. Please ensure the API server is running."
+                if isinstance(e, requests.exceptions.ConnectionError) else "The chatbot API timed out."
+            )
+            continue
+
+        if response.status_code == 200:
+            return response
+        try:
+            message = response.json().get("error", response.text)
+        except ValueError:
+            message = response.text
+        response.close()
+        error = ChatbotAPIError(message, status_code=response.status_code)
+        if response.status_code not in (502, 503, 504):
+            raise error
+    raise error
+
+def stream(question):
+    """
+    Asks the chatbot API a question. Returns a generator of the streamed
+    events as dicts ({"type": "sources" | "token" | "done" | "error", ...}).
+
+    Raises CircuitOpenError without a request while the API is known to be
+    down, and ChatbotAPIError if it cannot be reached or rejects the question.
+    """
+    try:
+        breaker.before_request()
+    except CircuitOpenError:
+        counters["rejected"] += 1
+        raise
+
+    counters["requests"] += 1
+    start = time.perf_counter()
+    try:
+        response = _open_stream(question)
+    except ChatbotAPIError as e:
+        # A rejected question (4xx) says nothing about the API's health
+        if e.status_code is None or e.status_code >= 500:
+            counters["failures"] += 1
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        raise
+    return _events(response, start)
+
+def _events(response, start):
+    first_token = True
+    try:
+        for line in response.iter_lines():
+            if not line:
+                continue
+            event = json.loads(line)
+            if event["type"] == "token" and first_token:
+                latency["first_token"].observe((time.perf_counter() - start) * 1000)
+                first_token = False
+            elif event["type"] == "done":
+                latency["total"].observe((time.perf_counter() - start) * 1000)
+                breaker.record_success()
+            elif event["type"] == "error":
+                counters["failures"] += 1
+                breaker.record_failure()
+            yield event
+    except requests.exceptions.RequestException:
+        counters["failures"] += 1
+        breaker.record_failure()
+        raise ChatbotAPIError("The connection to the chatbot API was lost.")
+    finally:
+        response.close()
+
+def diagnostics():
+    """
+    Returns breaker state, counters and latency histograms for display.
+    """
+    return {
+        "url": CHATBOT_API_URL,
+        "breaker": breaker.state,
+        "consecutive_failures": breaker.failures,
+        "counters": dict(counters),
+        "p50_first_token_ms": latency["first_token"].quantile(0.5),
+        "p95_first_token_ms": latency["first_token"].quantile(0.95),
+        "p50_total_ms": latency["total"].quantile(0.5),
+        "p95_total_ms": latency["total"].quantile(0.95),
+        "latency": {name: histogram.snapshot() for name, histogram in latency.items()},
+    }
@@ -0,0 +1,172 @@
+import os
+import re
+
+# --- 1. CONFIGURATION ---
+
+# Upper bound on the context handed to the LLM, in (estimated) tokens
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1000"))
+
+# Counting Gemini tokens exactly needs an API call, so prompts are estimated
+# at about four characters per token, which is close for English prose
+CHARS_PER_TOKEN = 4
+
+# Two chunks of the same page are joined when the end of one repeats at
+# least this many characters of the start of the other (the splitter's
+# chunk_overlap makes neighbouring chunks share up to 200)
+MIN_OVERLAP_CHARS = 30
+
+# Chunks whose word 3-grams overlap at least this much (Jaccard) with a
+# higher-ranked chunk are dropped as near-duplicates
+NEAR_DUPLICATE_THRESHOLD = 0.8
+
+# A chunk that does not fit the remaining budget is cut down to fit if at
+# least this many tokens are left; otherwise packing stops
+MIN_PARTIAL_TOKENS = 50
+
+# --- 2. TOKENS ---
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def _truncate(text, max_tokens):
+    """
+    Cuts text to about max_tokens, at a sentence end if one is near, else
+    at a word boundary.
+    """
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    sentence_end = max(cut.rfind(". "), cut.rfind(".\n"))
+    if sentence_end >= limit // 2:
+        return cut[:sentence_end + 1]
+    space = cut.rfind(" ")
+    return cut[:space] if space > 0 else cut
+
+# --- 3. MERGING AND DEDUPLICATION ---
+
+def _overlap(first, second):
+    """
+    Length of the longest end of `first` that `second` starts with, if it is
+    at least MIN_OVERLAP_CHARS long; otherwise 0.
+    """
+    probe = second[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+    start = max(0, len(first) - len(second))
+    while True:
+        position = first.find(probe, start)
+        if position < 0:
+            return 0
+        length = len(first) - position
+        if second.startswith(first[position:]):
+            return length
+        start = position + 1
+
+def _join(first, second):
+    """
+    Returns first and second as one text if one contains the other or they
+    overlap at the seam (in either order), else None.
+    """
+    if second in first:
+        return first
+    if first in second:
+        return second
+    overlap = _overlap(first, second)
+    if overlap:
+        return first + second[overlap:]
+    overlap = _overlap(second, first)
+    if overlap:
+        return second + first[overlap:]
+    return None
+
+def merge_overlapping(docs):
+    """
+    Joins chunks of the same source and page that overlap or contain one
+    another. Returns (rank, document) pairs, rank being the position of the
+    best-ranked chunk that went into each document.
+    """
+    merged = []  # [rank, source, page, text, metadata]
+    for rank, doc in enumerate(docs):
+        source, page = doc.metadata.get("source"), doc.metadata.get("page")
+        text = doc.page_content
+        # A merged chunk can bridge two earlier ones, so keep joining until nothing changes
+        joined = True
+        while joined:
+            joined = False
+            for entry in merged:
+                if entry[1] == source and entry[2] == page:
+                    combined = _join(entry[3], text)
+                    if combined is not None:
+                        merged.remove(entry)
+                        rank, text = min(rank, entry[0]), combined
+                        joined = True
+                        break
+        merged.append([rank, source, page, text, doc.metadata])
+    merged.sort(key=lambda entry: entry[0])
+    return [(rank, type(docs[rank])(page_content=text, metadata=metadata)) for rank, _, _, text, metadata in merged]
+
+def _shingles(text):
+    words = re.findall(r"\w+", text.lower())
+    return {tuple(words[i:i + 3]) for i in range(max(1, len(words) - 2))}
+
+def drop_near_duplicates(docs, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """
+    Keeps documents in order, skipping any too similar to one already kept.
+    """
+    kept, kept_shingles = [], []
+    for doc in docs:
+        shingles = _shingles(doc.page_content)
+        if any(len(shingles & other) / len(shingles | other) >= threshold for other in kept_shingles):
+            continue
+        kept.append(doc)
+        kept_shingles.append(shingles)
+    return kept
+
+# --- 4. ASSEMBLY ---
+
+def pack(docs, budget):
+    """
+    Takes documents in order until the token budget is used up, cutting
+    the last one down to fit when enough room is left for it to be useful.
+    Returns (documents, whether one was truncated).
+    """
+    packed, used = [], 0
+    for doc in docs:
+        tokens = estimate_tokens(doc.page_content)
+        if used + tokens <= budget:
+            packed.append(doc)
+            used += tokens
+            continue
+        remaining = budget - used
+        if remaining >= MIN_PARTIAL_TOKENS or not packed:
+            packed.append(type(doc)(page_content=_truncate(doc.page_content, remaining), metadata=doc.metadata))
+            return packed, True
+        break
+    return packed, False
+
+def assemble(docs, budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Turns retrieved chunks (best first) into the documents to put in the
+    prompt: overlapping chunks of a page merged, near-duplicates dropped,
+    and the rest packed into the token budget. Returns (documents, stats).
+    """
+    merged = [doc for _, doc in merge_overlapping(docs)]
+    unique = drop_near_duplicates(merged)
+    packed, truncated = pack(unique, budget)
+    stats = {
+        "chunks_in": len(docs),
+        "merged": len(docs) - len(merged),
+        "duplicates": len(merged) - len(unique),
+        "chunks_out": len(packed),
+        "truncated": truncated,
+        "context_tokens_before": estimate_tokens(join_context(docs)),
+        "context_tokens_after": estimate_tokens(join_context(packed)),
+    }
+    return packed, stats
+
+def join_context(docs):
+    """
+    The context text the "stuff" chain builds: chunks joined by blank lines.
+    """
+    return "\n\n".join(doc.page_content for doc in docs)
@@ -1,13 +1,21 @@
+import startup_profiler
+# Must run before the other imports so their load times are recorded
+startup_profiler.install()
+
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-from streamlit_shadcn_ui import card
 
-from chatbot import get_rag_chain
-import requests
+import analytics_store
+import data_loader
+import data_watcher
+import financial_engine
+import impact_engine
+import kpi_summary
+import render_cache
+
+# Chart libraries (plotly), pandas and the HTTP client are imported inside the
+# functions that use them, so a page only pays for what it renders.
 
-# Assuming your new API server is running on localhost at port 5000
-CHATBOT_API_URL = "http://127.0.0.1:5000/ask"
+# The chatbot API address and connection settings live in chatbot_client.py
 # =================================================================================
 # 1. PAGE CONFIGURATION & STYLING
 # =================================================================================
@@ -78,6 +86,7 @@ st.title("Digital Dashboard: Regenerative vs Conventional Agriculture")
 
 # --- Calculation Functions ---
 
+@render_cache.memoize
 def calculate_sqi(som_value, cec_value, tc_value, tn_value):
     def get_score(metric_name, value):
         """Helper function to find the score for a single metric."""
@@ -123,126 +132,24 @@ def calculate_sqi(som_value, cec_value, tc_value, tn_value):
 
     return sqi, category, scores
 
-def calc_np_conv(unit, unit_weight, unit_class):
-    N_perc, P205_perc, K_perc = unit_class.split("-")
-    total_mass = unit * unit_weight
-    N_perc = float(N_perc)/100
-    P205_perc = float(P205_perc)/100
-    P_perc = (P205_perc*62)/142
-    N_applied = N_perc * total_mass
-    P_applied = P_perc * total_mass
-    return N_applied, P_applied
-
-def calc_np_regen(unit, unit_weight):
-    N_perc = 0.05
-    P_perc = 0.005
-    total_mass = unit * unit_weight
-    N_applied = N_perc * total_mass
-    P_applied = P_perc * total_mass
-    return N_applied, P_applied
-
-def calc_ep_conv(chemical_data):
-    N_applied, P_applied = 0, 0
-    for chem in chemical_data:
-        N, P = calc_np_conv(chem["units"], chem["unit_weight"], chem["unit_class"])
-        N_applied += N
-        P_applied += P
-    N_used = N_applied * 12
-    P_used = P_applied * 12
-    EF_N = 1.33
-    EF_P = 0.05
-    emission_N = N_used * EF_N
-    emission_P = P_used * EF_P
-    midpoint_CF_N = 0.158
-    midpoint_CF_P = 0.100
-    EP_P = emission_P * midpoint_CF_P
-    EP_N = emission_N * midpoint_CF_N
-    CEF_N = 3.7
-    CEF_P = 3.1
-    C_FP_N = CEF_N * N_used
-    C_FP_P = CEF_P * P_used
-    CFP = C_FP_P + C_FP_N
-    return EP_N, EP_P, CFP
-
-def calc_ep_regen(chemical_data):
-    N_applied, P_applied = calc_np_regen(chemical_data[0]["units"], chemical_data[0]["unit_weight"])
-    N_used = N_applied * 12
-    P_used = P_applied * 12
-    EF_N = 1.33
-    EF_P = 0.05
-    emission_N = N_used * EF_N
-    emission_P = P_used * EF_P
-    midpoint_CF_N = 0.158
-    midpoint_CF_P = 0.100
-    EP_P = emission_P * midpoint_CF_P
-    EP_N = emission_N * midpoint_CF_N
-    C_uptake = -1.83
-    CFP = chemical_data[0]["units"] * chemical_data[0]["unit_weight"] * C_uptake * 12
-    return EP_N, EP_P, CFP
-
-
 # --- Data Loading ---
-# Load data from the specific sheets of the Excel file.
+# Frames are served by data_loader, which parses each workbook once and keeps a
+# Parquet copy keyed by the file's content hash, so reruns are memory lookups.
+# Costs and harvest records are queried from analytics_store, a SQLite file
+# ingested from the workbooks, rather than held as frames in every session;
+# the overview reads its rollups from kpi_summary.
 try:
-    # Load cost data
-    cost_df = pd.read_excel('PlotData.xlsx', sheet_name='Cost')
-    
-    # --- Robust Yield Data Loading ---
-    # This method reads the specific columns for Grade A and Grade B harvest weights.
-
-    # For Limau Nipis
-    yield_nipis_df = pd.read_excel(
-        'PlotData.xlsx',
-        sheet_name='Yield',
-        skiprows=2,  # Skip the title and header rows
-        nrows=2,     # Read only the two data rows
-        usecols="A,C:D", # Read the Farming Method, Grade A (kg), and Grade B (kg) columns
-        header=None
-    )
-    yield_nipis_df.columns = [
-        'Farming Method',
-        'Grade A (kg)',
-        'Grade B (kg)'
-    ]
-    
-    # For Limau Kasturi
-    yield_kasturi_df = pd.read_excel(
-        'PlotData.xlsx',
-        sheet_name='Yield',
-        skiprows=7, # Skip all rows above the Kasturi data
-        nrows=2,
-        usecols="A,C:D",
-        header=None
-    )
-    yield_kasturi_df.columns = [
-        'Farming Method',
-        'Grade A (kg)',
-        'Grade B (kg)'
-    ]
-
-    # For Disaggregated Data
-    disaggregation_df = pd.read_excel(
-        'PlotData.xlsx',
-        sheet_name='Yield',
-        skiprows=13, # Updated skiprows to correctly target the data
-        nrows=2,
-        usecols="A:C",
-        header=None,
-        index_col=0
-    )
-    disaggregation_df.columns = [
-        'Conventional Farming',
-        'Regenerative Farming'
-    ]
-
-    # For Eutrophication Potential Data
-    ep_df = pd.read_excel('PlotData.xlsx', sheet_name='EP', index_col=0)
-
-
-    soil_health_df = pd.read_excel('PlotData.xlsx', sheet_name='SoilHealth', index_col=0)
-    
-    # For Plant Harvest Data
-    plant_harvest_df = pd.read_excel('Plant Harvest.xlsx', sheet_name='Plant Harvest (Cleaned)', header=1)
+    # The watcher reloads changed workbooks in the background; this call
+    # covers the first run and a disabled watcher. Both act once per process,
+    # and the frames below are zero-copy views of the shared copies.
+    data_watcher.start()
+    data_loader.reload()
+    yield_nipis_df = data_loader.get_yield_nipis_df()
+    yield_kasturi_df = data_loader.get_yield_kasturi_df()
+    disaggregation_df = data_loader.get_disaggregation_df()
+    ep_df = data_loader.get_ep_df()
+    soil_health_df = data_loader.get_soil_health_df()
+    harvest_summary = kpi_summary.load_summary()
 
 except FileNotFoundError as e:
     st.error(f"Error loading data files. Please make sure '{e.filename}' is in the same directory.")
@@ -252,6 +159,7 @@ except Exception as e:
     st.stop()
 
 
+@startup_profiler.timed
 def render_sqi():
     """
     Renders the Soil Quality Index (SQI) section in a Streamlit app.
@@ -325,141 +233,155 @@ def render_sqi():
     except (KeyError, Exception) as e:
         st.warning(f"Could not calculate SQI. Error: {e}")
 
-def render_cost_comparison():
-    # --- Cost Comparison ---
-    st.subheader("Monthly Cost Comparison")
-    # Extract and process cost data for stacked bar chart
-    try:
-        # Address SettingWithCopyWarning by creating a new dataframe or using recommended assignment
-        cost_processed_df = cost_df.copy()
-        cost_processed_df = cost_processed_df.rename(columns={cost_processed_df.columns[0]: 'Farming Method'})
-        cost_processed_df['Farming Method'] = cost_processed_df['Farming Method'].ffill()
-        cost_chart_df = cost_processed_df[['Farming Method', 'Category', 'Cost (RM)']].dropna()
-
-        color_map = {
-            'Pesticide + Foliar Agrochemicals': "#003866",  # Steel Blue
-            'Fertilizer': "#008F94",                  # Cadet Blue
-            'Soil Regenerative Agent': "#005525",     # Sea Green
-            'Pesticides': "#009E00"                   # Dark Sea Green
-        }
+@render_cache.memoize
+def build_cost_comparison_figure():
+    import plotly.express as px
 
-        fig_cost = px.bar(
-            cost_chart_df,
-            x='Farming Method', 
-            y='Cost (RM)',      
-            color='Category',
-            text_auto='.0f',
-            labels={'Cost (RM)': 'Total Cost (RM)', 'Farming Method': ''},
-            color_discrete_map=color_map
-        )
+    # Cost per method and category, cleaned (ffill/dropna) at ingest time
+    cost_chart_df = analytics_store.cost_breakdown()
+
+    color_map = {
+        'Pesticide + Foliar Agrochemicals': "#003866",  # Steel Blue
+        'Fertilizer': "#008F94",                  # Cadet Blue
+        'Soil Regenerative Agent': "#005525",     # Sea Green
+        'Pesticides': "#009E00"                   # Dark Sea Green
+    }
+
+    fig_cost = px.bar(
+        cost_chart_df,
+        x='Farming Method', 
+        y='Cost (RM)',      
+        color='Category',
+        text_auto='.0f',
+        labels={'Cost (RM)': 'Total Cost (RM)', 'Farming Method': ''},
+        color_discrete_map=color_map
+    )
+    
+    # --- UPDATED: Layout adjusted for cleaner look and legend position ---
+    fig_cost.update_layout(
+        title='Month Cost By Category',
+        xaxis_title=None,
+        yaxis_title='Total Cost (RM)',
+        legend_title_text='Category', # Shortened title for clarity
+        barmode='stack',
+        plot_bgcolor='rgba(0,0,0,0)', # Set plot background to transparent
         
-        # --- UPDATED: Layout adjusted for cleaner look and legend position ---
-        fig_cost.update_layout(
-            title='Month Cost By Category',
-            xaxis_title=None,
-            yaxis_title='Total Cost (RM)',
-            legend_title_text='Category', # Shortened title for clarity
-            barmode='stack',
-            plot_bgcolor='rgba(0,0,0,0)', # Set plot background to transparent
-            
-            # --- NEW: Makes bars thinner by increasing the gap between them ---
-            bargap=0.5,
+        # --- NEW: Makes bars thinner by increasing the gap between them ---
+        bargap=0.5,
 
-            # --- NEW: Hides background grid lines on both axes ---
-            xaxis=dict(categoryorder='total descending', showgrid=False),
-            yaxis=dict(showgrid=False),
+        # --- NEW: Hides background grid lines on both axes ---
+        xaxis=dict(categoryorder='total descending', showgrid=False),
+        yaxis=dict(showgrid=False),
 
-            margin=dict(l=20, r=20, t=50, b=20),
-            height=385,
-            
-            # --- NEW: Moves the legend to the right side of the chart ---
-            legend=dict(
-                orientation="v", # Vertical orientation
-                yanchor="top",
-                y=1,
-                xanchor="left",
-                x=1.02
-            )
+        margin=dict(l=20, r=20, t=50, b=20),
+        height=385,
+        
+        # --- NEW: Moves the legend to the right side of the chart ---
+        legend=dict(
+            orientation="v", # Vertical orientation
+            yanchor="top",
+            y=1,
+            xanchor="left",
+            x=1.02
         )
-        fig_cost.update_traces(textposition='inside')
+    )
+    fig_cost.update_traces(textposition='inside')
+    return fig_cost
 
-        st.plotly_chart(fig_cost, use_container_width=True)
+@startup_profiler.timed
+def render_cost_comparison():
+    # --- Cost Comparison ---
+    st.subheader("Monthly Cost Comparison")
+    try:
+        st.plotly_chart(build_cost_comparison_figure(), use_container_width=True)
 
     except (KeyError, IndexError, Exception) as e:
         st.warning(f"Could not process cost data for the stacked chart. Error: {e}")
     
-def render_ep_reduction():
-    try:
-        # Get EP values
-        ep_n_conv = ep_df.loc['Eutrophication Potential N(kg N eq)', 'Conventional Farming']
-        ep_n_regen = ep_df.loc['Eutrophication Potential N(kg N eq)', 'Regenerative Farming']
-        ep_p_conv = ep_df.loc['Eutrophication Potential P(kg PO4 eq)', 'Conventional Farming']
-        ep_p_regen = ep_df.loc['Eutrophication Potential P(kg PO4 eq)', 'Regenerative Farming']
-        cf_conv = ep_df.loc['Carbon Footprint(kg CO2eq)', 'Conventional Farming']
-        cf_regen = ep_df.loc['Carbon Footprint(kg CO2eq)', 'Regenerative Farming']
-
-        # Calculate percentage reduction
-        cf_reduction = ((cf_conv - cf_regen) / cf_conv) * 100
-        n_reduction = ((ep_n_conv - ep_n_regen) / ep_n_conv) * 100
-        p_reduction = ((ep_p_conv - ep_p_regen) / ep_p_conv) * 100
-        
-        def create_full_impact_viz(label, conv_val, regen_val, reduction_percent, unit):
-            color = '#1E90FF' if reduction_percent > 0 else '#FF4136'
-            html = f"""
-            <div style="text-align: center;">
-                <div style="font-weight: bold; font-size: 1.4em; margin-bottom: 10px;">{label}</div>
-                <div style="
-                    border: 8px solid {color};
-                    border-radius: 50%; width: 160px; height: 160px;
-                    display: flex; flex-direction: column; align-items: center; justify-content: center;
-                    margin: 0 auto 10px auto;
-                ">
-                    <span style="font-size: 1.5em; font-weight: bold; color: {color};">{reduction_percent:.1f}%</span>
-                    <span style="font-size: 0.9em; font-weight: bold; color: {color};">Reduction</span>
-                </div>
-                <div style="display: flex; align-items: center; justify-content: center;">
-                    <div style="text-align: center; margin-right: 5px;">
-                        <div style="
-                            border: 5px solid #A9A9A9;
-                            border-radius: 50%; width: 90px; height: 90px;
-                            display: flex; flex-direction: column; align-items: center; justify-content: center;
-                        ">
-                            <span style="font-size: 1em; font-weight: bold;">{conv_val:.3f}</span>
-                            <span style="font-size: 0.7em;">{unit}</span>
-                        </div>
-                        <div style="font-size: 0.8em; font-weight: bold;">Conventional</div>
+@render_cache.memoize
+def build_ep_reduction_html():
+    # Get EP values
+    ep_n_conv = ep_df.loc['Eutrophication Potential N(kg N eq)', 'Conventional Farming']
+    ep_n_regen = ep_df.loc['Eutrophication Potential N(kg N eq)', 'Regenerative Farming']
+    ep_p_conv = ep_df.loc['Eutrophication Potential P(kg PO4 eq)', 'Conventional Farming']
+    ep_p_regen = ep_df.loc['Eutrophication Potential P(kg PO4 eq)', 'Regenerative Farming']
+    cf_conv = ep_df.loc['Carbon Footprint(kg CO2eq)', 'Conventional Farming']
+    cf_regen = ep_df.loc['Carbon Footprint(kg CO2eq)', 'Regenerative Farming']
+
+    # Calculate percentage reduction
+    cf_reduction = ((cf_conv - cf_regen) / cf_conv) * 100
+    n_reduction = ((ep_n_conv - ep_n_regen) / ep_n_conv) * 100
+    p_reduction = ((ep_p_conv - ep_p_regen) / ep_p_conv) * 100
+    
+    def create_full_impact_viz(label, conv_val, regen_val, reduction_percent, unit):
+        color = '#1E90FF' if reduction_percent > 0 else '#FF4136'
+        html = f"""
+        <div style="text-align: center;">
+            <div style="font-weight: bold; font-size: 1.4em; margin-bottom: 10px;">{label}</div>
+            <div style="
+                border: 8px solid {color};
+                border-radius: 50%; width: 160px; height: 160px;
+                display: flex; flex-direction: column; align-items: center; justify-content: center;
+                margin: 0 auto 10px auto;
+            ">
+                <span style="font-size: 1.5em; font-weight: bold; color: {color};">{reduction_percent:.1f}%</span>
+                <span style="font-size: 0.9em; font-weight: bold; color: {color};">Reduction</span>
+            </div>
+            <div style="display: flex; align-items: center; justify-content: center;">
+                <div style="text-align: center; margin-right: 5px;">
+                    <div style="
+                        border: 5px solid #A9A9A9;
+                        border-radius: 50%; width: 90px; height: 90px;
+                        display: flex; flex-direction: column; align-items: center; justify-content: center;
+                    ">
+                        <span style="font-size: 1em; font-weight: bold;">{conv_val:.3f}</span>
+                        <span style="font-size: 0.7em;">{unit}</span>
                     </div>
-                    <div style="font-size: 2em; color: #A9A9A9; margin: 0 5px;">&#8594;</div>
-                    <div style="text-align: center; margin-left: 5px;">
-                        <div style="
-                            border: 5px solid {color};
-                            border-radius: 50%; width: 90px; height: 90px;
-                            display: flex; flex-direction: column; align-items: center; justify-content: center;
-                        ">
-                            <span style="font-size: 1em; font-weight: bold; color: {color};">{regen_val:.3f}</span>
-                            <span style="font-size: 0.7em; color: {color};">{unit}</span>
-                        </div>
-                        <div style="font-size: 0.8em; font-weight: bold; color: {color};">Regenerative</div>
+                    <div style="font-size: 0.8em; font-weight: bold;">Conventional</div>
+                </div>
+                <div style="font-size: 2em; color: #A9A9A9; margin: 0 5px;">&#8594;</div>
+                <div style="text-align: center; margin-left: 5px;">
+                    <div style="
+                        border: 5px solid {color};
+                        border-radius: 50%; width: 90px; height: 90px;
+                        display: flex; flex-direction: column; align-items: center; justify-content: center;
+                    ">
+                        <span style="font-size: 1em; font-weight: bold; color: {color};">{regen_val:.3f}</span>
+                        <span style="font-size: 0.7em; color: {color};">{unit}</span>
                     </div>
+                    <div style="font-size: 0.8em; font-weight: bold; color: {color};">Regenerative</div>
                 </div>
             </div>
-            """
-            return html
+        </div>
+        """
+        return html
+
+    return (
+        create_full_impact_viz("Carbon Footprint", cf_conv, cf_regen, cf_reduction, "kg CO2eq"),
+        create_full_impact_viz("Nitrogen Eutrophication", ep_n_conv, ep_n_regen, n_reduction, "kg N eq"),
+        create_full_impact_viz("Phosphorus Eutrophication", ep_p_conv, ep_p_regen, p_reduction, "kg PO4 eq"),
+    )
+
+@startup_profiler.timed
+def render_ep_reduction():
+    try:
+        cf_html, n_html, p_html = build_ep_reduction_html()
 
         # Create three columns for side-by-side layout
         col1, col2, col3 = st.columns(3)
 
         # Place each visualisation into a separate column
         with col1:
-            st.markdown(create_full_impact_viz("Carbon Footprint", cf_conv, cf_regen, cf_reduction, "kg CO2eq"), unsafe_allow_html=True)
+            st.markdown(cf_html, unsafe_allow_html=True)
         with col2:
-            st.markdown(create_full_impact_viz("Nitrogen Eutrophication", ep_n_conv, ep_n_regen, n_reduction, "kg N eq"), unsafe_allow_html=True)
+            st.markdown(n_html, unsafe_allow_html=True)
         with col3:
-            st.markdown(create_full_impact_viz("Phosphorus Eutrophication", ep_p_conv, ep_p_regen, p_reduction, "kg PO4 eq"), unsafe_allow_html=True)
+            st.markdown(p_html, unsafe_allow_html=True)
 
     except (KeyError, Exception) as e:
         st.warning(f"Could not display environmental impact. Error: {e}")
 
+@startup_profiler.timed
 def render_epcf_sim():
     # --- Environmental Simulation ---
     st.subheader("Environmental Simulation")
@@ -493,8 +415,8 @@ def render_epcf_sim():
             sim_regen_chemicals = [{"units": regen_units, "unit_weight": regen_weight}]
 
         # --- Simulation Calculation ---
-        sim_ep_n_conv, sim_ep_p_conv, sim_cfp_conv = calc_ep_conv(sim_conv_chemicals)
-        sim_ep_n_regen, sim_ep_p_regen, sim_cfp_regen = calc_ep_regen(sim_regen_chemicals)
+        sim_ep_n_conv, sim_ep_p_conv, sim_cfp_conv = impact_engine.calc_ep_conv(sim_conv_chemicals)
+        sim_ep_n_regen, sim_ep_p_regen, sim_cfp_regen = impact_engine.calc_ep_regen(sim_regen_chemicals)
         
         # --- Visualization ---
         st.markdown("---")
@@ -565,10 +487,143 @@ def render_epcf_sim():
         with sim_col3:
             st.markdown(create_sim_viz_horizontal("Phosphorus Eutrophication", sim_ep_p_conv, sim_ep_p_regen, sim_p_reduction, "kg PO4 eq"), unsafe_allow_html=True)
 
+        render_epcf_uncertainty(sim_conv_chemicals, regen_units, regen_weight)
 
     except (KeyError, IndexError, Exception) as e:
         st.warning(f"Could not perform environmental simulation. Error: {e}")
 
+@render_cache.memoize
+def build_uncertainty_panels(sim_conv_chemicals, regen_units, regen_weight, draws, seed):
+    """Returns one (figure, reduction HTML) pair per metric."""
+    import plotly.graph_objects as go
+
+    bands = impact_engine.monte_carlo(
+        impact_engine.chemicals_to_arrays(sim_conv_chemicals),
+        (regen_units, regen_weight),
+        draws=draws,
+        seed=seed,
+    )
+
+    metrics = [
+        ("cfp", "Carbon Footprint", "kg CO2eq"),
+        ("ep_n", "Nitrogen Eutrophication", "kg N eq"),
+        ("ep_p", "Phosphorus Eutrophication", "kg PO4 eq"),
+    ]
+    panels = []
+    for key, label, unit in metrics:
+        fig = go.Figure()
+        for series, name, color in [("conventional", "Conventional", "#A9A9A9"), ("regenerative", "Regenerative", "#2ECC40")]:
+            band = bands[key][series]
+            # 5-95% as a light bar, 25-75% as a dark bar, the median as a tick
+            fig.add_trace(go.Bar(y=[name], x=[band[95] - band[5]], base=[band[5]], orientation="h",
+                                 marker_color=color, opacity=0.35, width=0.6, hoverinfo="skip", showlegend=False))
+            fig.add_trace(go.Bar(y=[name], x=[band[75] - band[25]], base=[band[25]], orientation="h",
+                                 marker_color=color, width=0.6, hoverinfo="skip", showlegend=False))
+            fig.add_trace(go.Scatter(y=[name], x=[band[50]], mode="markers", marker=dict(symbol="line-ns-open", size=22, color="black"),
+                                     hovertemplate=f"{name}: median %{{x:.3f}} {unit}<extra></extra>", showlegend=False))
+        fig.update_layout(barmode="overlay", height=200, margin=dict(l=10, r=10, t=40, b=20),
+                          title=dict(text=label, x=0.5, xanchor="center"), xaxis_title=unit)
+        reduction = bands[key]["reduction"]
+        html = (
+            f"<div style='text-align: center;'>Reduction: <b>{reduction[50]:.1f}%</b> "
+            f"(90% interval {reduction[5]:.1f}% to {reduction[95]:.1f}%)</div>"
+        )
+        panels.append((fig, html))
+    return panels
+
+@startup_profiler.timed
+def render_epcf_uncertainty(sim_conv_chemicals, regen_units, regen_weight):
+    """Monte Carlo percentile bands for the Environmental Simulation."""
+    st.markdown("---")
+    if not st.toggle("Monte Carlo uncertainty mode", key="epcf_mc",
+                     help="Samples the emission and characterisation factors from their uncertainty ranges."):
+        return
+
+    c1, c2 = st.columns(2)
+    draws = c1.select_slider("Draws", options=[10_000, 100_000, 250_000, 500_000, 1_000_000], value=100_000, key="epcf_mc_draws")
+    seed = c2.number_input("Seed", value=0, min_value=0, step=1, key="epcf_mc_seed")
+
+    import time
+
+    # Timed here rather than inside the memoised builder, so a cached result
+    # reports the time this rerun actually took
+    start = time.perf_counter()
+    panels = build_uncertainty_panels(sim_conv_chemicals, regen_units, regen_weight, draws, int(seed))
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    for col, (fig, html) in zip(st.columns(3), panels):
+        with col:
+            st.plotly_chart(fig, use_container_width=True)
+            st.markdown(html, unsafe_allow_html=True)
+
+    st.caption(f"{draws:,} draws, seed {int(seed)}, ready in {elapsed_ms:.0f} ms. "
+               "Bars show the 5-95% (light) and 25-75% (dark) ranges; ticks mark the median.")
+
+@render_cache.memoize
+def build_harvest_composition_figures():
+    import plotly.express as px
+
+    # --- Limau Nipis Chart ---
+    # Melt the nipis dataframe to prepare for stacking
+    melted_nipis_df = yield_nipis_df.melt(
+        id_vars=['Farming Method'],
+        value_vars=['Grade A (kg)', 'Grade B (kg)'],
+        var_name='Grade',
+        value_name='Harvest (kg)'
+    )
+
+    fig_harvest_nipis = px.bar(
+        melted_nipis_df,
+        x='Farming Method',
+        y='Harvest (kg)',
+        color='Grade',
+        barmode='stack',
+        title='Limau Nipis',
+        text_auto='.2f',
+        color_discrete_map={
+            'Grade A (kg)': "#004B00",
+            'Grade B (kg)': "#008A00"
+        }
+    )
+    fig_harvest_nipis.update_layout(
+        xaxis_title=None,
+        yaxis_title='Total Harvest (kg)',
+        showlegend=False,  # Hide the chart's default legend
+        height=400,
+        bargap=0.45
+    )
+
+    # --- Limau Kasturi Chart ---
+    # Melt the kasturi dataframe
+    melted_kasturi_df = yield_kasturi_df.melt(
+        id_vars=['Farming Method'],
+        value_vars=['Grade A (kg)', 'Grade B (kg)'],
+        var_name='Grade',
+        value_name='Harvest (kg)'
+    )
+
+    fig_harvest_kasturi = px.bar(
+        melted_kasturi_df,
+        x='Farming Method',
+        y='Harvest (kg)',
+        color='Grade',
+        barmode='stack',
+        title='Limau Kasturi',
+        text_auto='.2f',
+        color_discrete_map={
+            'Grade A (kg)': '#004B00',
+            'Grade B (kg)': '#008A00'
+        }
+    )
+    fig_harvest_kasturi.update_layout(
+        xaxis_title=None,
+        yaxis_title=None,
+        showlegend=False,  # Hide the chart's default legend
+        height=400,
+        bargap=0.45
+    )
+    return fig_harvest_nipis, fig_harvest_kasturi
+
+@startup_profiler.timed
 def render_harvest_composition():
     # --- Harvest Composition ---
     st.subheader("Harvest Composition Comparison")
@@ -582,73 +637,15 @@ def render_harvest_composition():
     """, unsafe_allow_html=True)
     
     try:
+        fig_harvest_nipis, fig_harvest_kasturi = build_harvest_composition_figures()
+
         # Create two columns to place charts side by side
         col1, col2 = st.columns(2)
 
-        # --- Limau Nipis Chart ---
-        # Melt the nipis dataframe to prepare for stacking
-        melted_nipis_df = yield_nipis_df.melt(
-            id_vars=['Farming Method'],
-            value_vars=['Grade A (kg)', 'Grade B (kg)'],
-            var_name='Grade',
-            value_name='Harvest (kg)'
-        )
-
-        fig_harvest_nipis = px.bar(
-            melted_nipis_df,
-            x='Farming Method',
-            y='Harvest (kg)',
-            color='Grade',
-            barmode='stack',
-            title='Limau Nipis',
-            text_auto='.2f',
-            color_discrete_map={
-                'Grade A (kg)': "#004B00",
-                'Grade B (kg)': "#008A00"
-            }
-        )
-        fig_harvest_nipis.update_layout(
-            xaxis_title=None,
-            yaxis_title='Total Harvest (kg)',
-            showlegend=False,  # Hide the chart's default legend
-            height=400,
-            bargap=0.45
-        )
-        
         # Place the first chart in the first column
         with col1:
             st.plotly_chart(fig_harvest_nipis, use_container_width=True)
 
-        # --- Limau Kasturi Chart ---
-        # Melt the kasturi dataframe
-        melted_kasturi_df = yield_kasturi_df.melt(
-            id_vars=['Farming Method'],
-            value_vars=['Grade A (kg)', 'Grade B (kg)'],
-            var_name='Grade',
-            value_name='Harvest (kg)'
-        )
-
-        fig_harvest_kasturi = px.bar(
-            melted_kasturi_df,
-            x='Farming Method',
-            y='Harvest (kg)',
-            color='Grade',
-            barmode='stack',
-            title='Limau Kasturi',
-            text_auto='.2f',
-            color_discrete_map={
-                'Grade A (kg)': '#004B00',
-                'Grade B (kg)': '#008A00'
-            }
-        )
-        fig_harvest_kasturi.update_layout(
-            xaxis_title=None,
-            yaxis_title=None,
-            showlegend=False,  # Hide the chart's default legend
-            height=400,
-            bargap=0.45
-        )
-        
         # Place the second chart in the second column
         with col2:
             st.plotly_chart(fig_harvest_kasturi, use_container_width=True)
@@ -656,98 +653,90 @@ def render_harvest_composition():
     except (IndexError, KeyError, ValueError, Exception) as e:
         st.warning(f"Could not create harvest composition chart. Error: {e}")
 
+@render_cache.memoize
+def build_yield_comparison_html():
+    # Get the yield values
+    nipis_conv = disaggregation_df.loc['Limau Nipis', 'Conventional Farming']
+    nipis_regen = disaggregation_df.loc['Limau Nipis', 'Regenerative Farming']
+    kasturi_conv = disaggregation_df.loc['Limau Kasturi', 'Conventional Farming']
+    kasturi_regen = disaggregation_df.loc['Limau Kasturi', 'Regenerative Farming']
+
+    # Calculate percentage increase
+    nipis_increase = ((nipis_regen - nipis_conv) / nipis_conv) * 100
+    kasturi_increase = ((kasturi_regen - kasturi_conv) / kasturi_conv) * 100
+
+    # --- Custom HTML Visualization Function ---
+    def create_full_impact_viz(label, conv_val, regen_val, reduction_percent, unit):
+        color = '#1E90FF' if reduction_percent > 0 else '#FF4136'
+        html = f"""
+        <div style="text-align: center;">
+            <div style="font-weight: bold; font-size: 1em; margin-bottom: 10px;">{label}</div>
+            <div style="
+                border: 8px solid {color};
+                border-radius: 50%; width: 140px; height: 140px;
+                display: flex; flex-direction: column; align-items: center; justify-content: center;
+                margin: 0 auto 10px auto;
+            ">
+                <span style="font-size: 1.5em; font-weight: bold; color: {color};">{reduction_percent:.1f}%</span>
+                <span style="font-size: 0.9em; font-weight: bold; color: {color};">Increase</span>
+            </div>
+            <div style="display: flex; align-items: center; justify-content: center;">
+                <div style="text-align: center; margin-right: 5px;">
+                    <div style="
+                        border: 5px solid #A9A9A9;
+                        border-radius: 50%; width: 85px; height: 85px;
+                        display: flex; flex-direction: column; align-items: center; justify-content: center;
+                    ">
+                        <span style="font-size: 1em; font-weight: bold;">{conv_val:.1f}</span>
+                        <span style="font-size: 0.7em;">{unit}</span>
+                    </div>
+                    <div style="font-size: 0.8em; font-weight: bold;">Conventional</div>
+                </div>
+                <div style="font-size: 2em; color: #A9A9A9; margin: 0 5px;">&#8594;</div>
+                <div style="text-align: center; margin-left: 5px;">
+                    <div style="
+                        border: 5px solid {color};
+                        border-radius: 50%; width: 85px; height: 85px;
+                        display: flex; flex-direction: column; align-items: center; justify-content: center;
+                    ">
+                        <span style="font-size: 0.8em; font-weight: bold; color: {color};">{regen_val:.1f}</span>
+                        <span style="font-size: 0.7em; color: {color};">{unit}</span>
+                    </div>
+                    <div style="font-size: 0.8em; font-weight: bold; color: {color};">Regenerative</div>
+                </div>
+            </div>
+        </div>
+        """
+        return html
+
+    return (
+        create_full_impact_viz("Limau Nipis", nipis_conv, nipis_regen, nipis_increase, "kg"),
+        create_full_impact_viz("Limau Kasturi", kasturi_conv, kasturi_regen, kasturi_increase, "kg"),
+    )
+
+@startup_profiler.timed
 def render_yield_comparison():
     # --- Disaggregated Yield Comparison ---
     st.markdown(f"""<div style="text-align: center;"><div style="font-weight: bold; font-size: 1.4em;">Yield per site for Regenerative vs Conventional</div></div>""", unsafe_allow_html=True)
 
     try:
-        # Get the yield values
-        nipis_conv = disaggregation_df.loc['Limau Nipis', 'Conventional Farming']
-        nipis_regen = disaggregation_df.loc['Limau Nipis', 'Regenerative Farming']
-        kasturi_conv = disaggregation_df.loc['Limau Kasturi', 'Conventional Farming']
-        kasturi_regen = disaggregation_df.loc['Limau Kasturi', 'Regenerative Farming']
-
-        # Calculate percentage increase
-        nipis_increase = ((nipis_regen - nipis_conv) / nipis_conv) * 100
-        kasturi_increase = ((kasturi_regen - kasturi_conv) / kasturi_conv) * 100
-
-        # --- Custom HTML Visualization Function ---
-        def create_full_impact_viz(label, conv_val, regen_val, reduction_percent, unit):
-            color = '#1E90FF' if reduction_percent > 0 else '#FF4136'
-            html = f"""
-            <div style="text-align: center;">
-                <div style="font-weight: bold; font-size: 1em; margin-bottom: 10px;">{label}</div>
-                <div style="
-                    border: 8px solid {color};
-                    border-radius: 50%; width: 140px; height: 140px;
-                    display: flex; flex-direction: column; align-items: center; justify-content: center;
-                    margin: 0 auto 10px auto;
-                ">
-                    <span style="font-size: 1.5em; font-weight: bold; color: {color};">{reduction_percent:.1f}%</span>
-                    <span style="font-size: 0.9em; font-weight: bold; color: {color};">Increase</span>
-                </div>
-                <div style="display: flex; align-items: center; justify-content: center;">
-                    <div style="text-align: center; margin-right: 5px;">
-                        <div style="
-                            border: 5px solid #A9A9A9;
-                            border-radius: 50%; width: 85px; height: 85px;
-                            display: flex; flex-direction: column; align-items: center; justify-content: center;
-                        ">
-                            <span style="font-size: 1em; font-weight: bold;">{conv_val:.1f}</span>
-                            <span style="font-size: 0.7em;">{unit}</span>
-                        </div>
-                        <div style="font-size: 0.8em; font-weight: bold;">Conventional</div>
-                    </div>
-                    <div style="font-size: 2em; color: #A9A9A9; margin: 0 5px;">&#8594;</div>
-                    <div style="text-align: center; margin-left: 5px;">
-                        <div style="
-                            border: 5px solid {color};
-                            border-radius: 50%; width: 85px; height: 85px;
-                            display: flex; flex-direction: column; align-items: center; justify-content: center;
-                        ">
-                            <span style="font-size: 0.8em; font-weight: bold; color: {color};">{regen_val:.1f}</span>
-                            <span style="font-size: 0.7em; color: {color};">{unit}</span>
-                        </div>
-                        <div style="font-size: 0.8em; font-weight: bold; color: {color};">Regenerative</div>
-                    </div>
-                </div>
-            </div>
-            """
-            return html
-        
+        nipis_html, kasturi_html = build_yield_comparison_html()
+
         # Display as metrics
         sub_col1, sub_col2 = st.columns(2)
         with sub_col1:
-            st.markdown(create_full_impact_viz("Limau Nipis", nipis_conv, nipis_regen, nipis_increase, "kg"), unsafe_allow_html=True)
+            st.markdown(nipis_html, unsafe_allow_html=True)
         with sub_col2:
-            st.markdown(create_full_impact_viz("Limau Kasturi", kasturi_conv, kasturi_regen, kasturi_increase, "kg"), unsafe_allow_html=True)
+            st.markdown(kasturi_html, unsafe_allow_html=True)
 
     except (KeyError, Exception) as e:
         st.warning(f"Could not calculate yield uplift. Error: {e}")
-        
+
+@startup_profiler.timed
 def render_financial_sim():
     # --- Financial Simulation ---
     st.subheader("Financial Simulation")
     try:
-        # --- Calculation Function ---
-        def calculate_rf_margin(data, months, prices, costs):
-            # Get the last x months of data
-            last_x_months_data = data.tail(months)
-
-            # Calculate total harvest
-            total_harvest_A = last_x_months_data['Grade A (kg)'].sum()
-            total_harvest_B = last_x_months_data['Grade B (kg)'].sum()
-
-            # Calculate revenue
-            revenue = (total_harvest_A * prices['A']) + (total_harvest_B * prices['B'])
-            
-            # Calculate total cost
-            total_cost = costs * months
-            
-            # Calculate R/F Margin
-            rf_margin = revenue / total_cost if total_cost > 0 else 0
-            return rf_margin
-
         # --- Inputs for Simulation ---
         with st.expander("Adjust Simulation Parameters"):
             st.write("Use the sliders for quick adjustments or the input boxes for precise values.")
@@ -776,37 +765,24 @@ def render_financial_sim():
                 cost_regen = create_input_slider("Regenerative Farming", 500.0, 1500.0, 710.0, "cr")
 
         # --- Data Preparation ---
-        # Split the main harvest dataframe into four smaller ones
-        nipis_conv_data = plant_harvest_df.iloc[:, 1:3].dropna().rename(columns={'Grade A (kg)': 'Grade A (kg)', 'Grade B (kg)': 'Grade B (kg)'})
-        nipis_regen_data = plant_harvest_df.iloc[:, 5:7].dropna().rename(columns={'Grade A (kg).1': 'Grade A (kg)', 'Grade B (kg).1': 'Grade B (kg)'})
-        kasturi_conv_data = plant_harvest_df.iloc[:, 9:11].dropna().rename(columns={'Grade A (kg).2': 'Grade A (kg)', 'Grade B (kg).2': 'Grade B (kg)'})
-        kasturi_regen_data = plant_harvest_df.iloc[:, 13:15].dropna().rename(columns={'Grade A (kg).3': 'Grade A (kg)', 'Grade B (kg).3': 'Grade B (kg)'})
-        
+        # Harvest totals per method, crop and grade come from one indexed query
+        # per data version; every margin below is then plain arithmetic on them.
+        totals = financial_engine.harvest_totals(analytics_store.grade_totals(months_to_simulate))
+        conv_totals, regen_totals = totals
+
         # --- Historical Calculation ---
-        hist_prices_nipis = {'A': 8.21, 'B': 7.14}
-        hist_prices_kasturi = {'A': 7.57, 'B': 6.85}
+        hist_prices = {'price_nipis_a': 8.21, 'price_nipis_b': 7.14, 'price_kasturi_a': 7.57, 'price_kasturi_b': 6.85}
         hist_costs = {'conv': 888.3, 'regen': 710.0}
-        
-        hist_rev_conv = (calculate_rf_margin(nipis_conv_data, 6, hist_prices_nipis, hist_costs['conv']) * hist_costs['conv'] * 6) + \
-                            (calculate_rf_margin(kasturi_conv_data, 6, hist_prices_kasturi, hist_costs['conv']) * hist_costs['conv'] * 6)
-        hist_margin_conv = hist_rev_conv / (hist_costs['conv'] * 6)
 
-        hist_rev_regen = (calculate_rf_margin(nipis_regen_data, 6, hist_prices_nipis, hist_costs['regen']) * hist_costs['regen'] * 6) + \
-                            (calculate_rf_margin(kasturi_regen_data, 6, hist_prices_kasturi, hist_costs['regen']) * hist_costs['regen'] * 6)
-        hist_margin_regen = hist_rev_regen / (hist_costs['regen'] * 6)
+        hist_margin_conv = float(financial_engine.rf_margin(conv_totals, 6, monthly_cost=hist_costs['conv'], **hist_prices))
+        hist_margin_regen = float(financial_engine.rf_margin(regen_totals, 6, monthly_cost=hist_costs['regen'], **hist_prices))
 
         # --- Simulated Calculation ---
-        sim_prices_nipis = {'A': price_nipis_a, 'B': price_nipis_b}
-        sim_prices_kasturi = {'A': price_kasturi_a, 'B': price_kasturi_b}
+        sim_prices = {'price_nipis_a': price_nipis_a, 'price_nipis_b': price_nipis_b, 'price_kasturi_a': price_kasturi_a, 'price_kasturi_b': price_kasturi_b}
         sim_costs = {'conv': cost_conv, 'regen': cost_regen}
 
-        sim_rev_conv = (calculate_rf_margin(nipis_conv_data, months_to_simulate, sim_prices_nipis, sim_costs['conv']) * sim_costs['conv'] * months_to_simulate) + \
-                        (calculate_rf_margin(kasturi_conv_data, months_to_simulate, sim_prices_kasturi, sim_costs['conv']) * sim_costs['conv'] * months_to_simulate)
-        sim_margin_conv = sim_rev_conv / (sim_costs['conv'] * months_to_simulate)
-
-        sim_rev_regen = (calculate_rf_margin(nipis_regen_data, months_to_simulate, sim_prices_nipis, sim_costs['regen']) * sim_costs['regen'] * months_to_simulate) + \
-                            (calculate_rf_margin(kasturi_regen_data, months_to_simulate, sim_prices_kasturi, sim_costs['regen']) * sim_costs['regen'] * months_to_simulate)
-        sim_margin_regen = sim_rev_regen / (sim_costs['regen'] * months_to_simulate)
+        sim_margin_conv = float(financial_engine.rf_margin(conv_totals, months_to_simulate, monthly_cost=sim_costs['conv'], **sim_prices))
+        sim_margin_regen = float(financial_engine.rf_margin(regen_totals, months_to_simulate, monthly_cost=sim_costs['regen'], **sim_prices))
 
         # --- Visualization ---
         st.markdown("---")
@@ -865,100 +841,209 @@ def render_financial_sim():
         with viz_col2:
             st.markdown(create_margin_change_viz("Regenerative", hist_margin_regen, sim_margin_regen), unsafe_allow_html=True)
 
+        render_financial_sensitivity(totals, months_to_simulate, sim_prices, sim_costs)
+
 
     except (KeyError, IndexError, Exception) as e:
         st.warning(f"Could not perform financial simulation. Error: {e}")
 
-def render_monthly_yield_comparison(plant_harvest_df):
-    """
-    Renders a new widget to compare a specific month's yield against the overall average.
-    """
-    st.subheader("Monthly Yield Comparison")
+# Sweep bounds for the sensitivity analysis, same as the simulation sliders
+SENSITIVITY_RANGES = {
+    'price_nipis_a': (5.0, 15.0),
+    'price_nipis_b': (4.0, 12.0),
+    'price_kasturi_a': (5.0, 15.0),
+    'price_kasturi_b': (4.0, 12.0),
+    'monthly_cost': (500.0, 1500.0),
+}
+
+@render_cache.memoize
+def build_sensitivity_grid(totals, months, base, x_param, y_param, points):
+    import numpy as np
+
+    axes = {name: np.linspace(*SENSITIVITY_RANGES[name], points) for name in (x_param, y_param, 'monthly_cost')}
+    return axes, financial_engine.sensitivity_grid(totals, months, base, axes)
+
+@render_cache.memoize
+def build_sensitivity_heatmap(totals, months, base, x_param, y_param, points, cost_index, method):
+    import plotly.express as px
+    import plotly.graph_objects as go
+
+    labels = financial_engine.PARAMETER_LABELS
+    axes, grid = build_sensitivity_grid(totals, months, base, x_param, y_param, points)
+    cost = axes['monthly_cost'][cost_index]
+    fig = px.imshow(
+        grid[:, :, cost_index].T,
+        x=axes[x_param], y=axes[y_param], origin="lower", aspect="auto",
+        color_continuous_scale="RdYlGn",
+        labels=dict(x=labels[x_param], y=labels[y_param], color="R/F margin"),
+        title=f"{method} R/F margin at RM {cost:,.0f}/month",
+    )
+    fig.add_trace(go.Scatter(
+        x=[base[x_param]], y=[base[y_param]], mode="markers",
+        marker=dict(symbol="x", size=12, color="black"), name="Simulated", showlegend=False,
+    ))
+    fig.update_layout(height=420, margin=dict(l=10, r=10, t=50, b=20))
+    return fig, grid.size
+
+@render_cache.memoize
+def build_tornado_figure(totals, months, base, variation, method):
+    import plotly.graph_objects as go
+
+    labels = financial_engine.PARAMETER_LABELS
+    rows, base_margin = financial_engine.tornado(totals, months, base, variation / 100)
+    rows = rows[::-1]  # Largest swing on top
+    names = [labels[r['parameter']] for r in rows]
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        y=names, x=[r['low_margin'] - base_margin for r in rows], base=base_margin, orientation="h",
+        name=f"-{variation}%", marker_color="#FF4136",
+    ))
+    fig.add_trace(go.Bar(
+        y=names, x=[r['high_margin'] - base_margin for r in rows], base=base_margin, orientation="h",
+        name=f"+{variation}%", marker_color="#2ECC40",
+    ))
+    fig.update_layout(
+        barmode="overlay", height=360, margin=dict(l=10, r=10, t=50, b=20),
+        title=f"{method} R/F margin sensitivity (base {base_margin:.2f})",
+        xaxis_title="R/F margin", legend=dict(orientation="h", y=-0.2),
+    )
+    return fig
 
-    try:
-        # Pre-process the dataframe for easier calculations
-        df = plant_harvest_df.copy()
-        df['Month'] = pd.to_datetime(df['Month'])
-        
-        # Consolidate yield data
-        df['Conv Total Yield'] = df['Grade A (kg)'] + df['Grade B (kg)'] + df['Grade A (kg).2'] + df['Grade B (kg).2']
-        df['Regen Total Yield'] = df['Grade A (kg).1'] + df['Grade B (kg).1'] + df['Grade A (kg).3'] + df['Grade B (kg).3']
-        
-        # Calculate the overall averages
-        avg_conv_yield = df['Conv Total Yield'].mean()
-        avg_regen_yield = df['Regen Total Yield'].mean()
+@startup_profiler.timed
+def render_financial_sensitivity(totals, months, sim_prices, sim_costs):
+    """Heatmap and tornado chart of the R/F margin around the simulated point."""
+    import numpy as np
 
-        # Month Picker
-        months = df['Month'].dt.strftime('%B %Y').tolist()
-        selected_month = st.selectbox("Select a month to compare", months)
+    labels = financial_engine.PARAMETER_LABELS
 
-        
+    st.markdown("---")
+    st.markdown("<h4 style='text-align: center;'>Sensitivity Analysis</h4>", unsafe_allow_html=True)
 
-        # Get the selected month's data
-        selected_date = pd.to_datetime(selected_month)
-        monthly_data = df[df['Month'] == selected_date].iloc[0]
-        monthly_conv_yield = monthly_data['Conv Total Yield']
-        monthly_regen_yield = monthly_data['Regen Total Yield']
+    c1, c2, c3, c4 = st.columns(4)
+    method = c1.radio("Farming method", ["Conventional", "Regenerative"], horizontal=True, key="fin_sens_method")
+    x_param = c2.selectbox("X axis", financial_engine.PRICE_PARAMETERS, index=0, format_func=labels.get, key="fin_sens_x")
+    y_options = [name for name in financial_engine.PRICE_PARAMETERS if name != x_param]
+    y_param = c3.selectbox("Y axis", y_options, index=min(1, len(y_options) - 1), format_func=labels.get, key="fin_sens_y")
+    points = c4.slider("Grid points per axis", 10, 100, 50, step=10, key="fin_sens_points")
 
-        # Calculate difference from average
-        conv_diff_pct = ((monthly_conv_yield - avg_conv_yield) / avg_conv_yield) * 100
-        regen_diff_pct = ((monthly_regen_yield - avg_regen_yield) / avg_regen_yield) * 100
-        
-        # Define colours based on performance
-        conv_color = '#2ECC40' if conv_diff_pct > 0 else '#FF4136'
-        regen_color = '#2ECC40' if regen_diff_pct > 0 else '#FF4136'
+    row = 0 if method == "Conventional" else 1
+    base = dict(sim_prices, monthly_cost=sim_costs['conv' if row == 0 else 'regen'])
 
+    cost_values = np.linspace(*SENSITIVITY_RANGES['monthly_cost'], points)
+    default_cost = cost_values[np.abs(cost_values - base['monthly_cost']).argmin()]
+    cost = st.select_slider(
+        "Monthly cost slice (RM)", options=cost_values.round(1).tolist(),
+        value=round(float(default_cost), 1), key=f"fin_sens_cost_{points}",
+    )
+    cost_index = int(np.abs(cost_values - cost).argmin())
 
-        # Custom HTML to display the results in a card-like format
-        st.markdown(f"""
-        <div style="display: flex; justify-content: space-around; gap: 20px;">
-            <!-- Conventional Card -->
-            <div style="
-                flex: 1;
-                background-color: white;
-                padding: 1.5rem;
-                border-radius: 0.75rem;
-                box-shadow: 0 4px 6px -1px rgb(0 0 0 / 0.1), 0 2px 4px -2px rgb(0 0 0 / 0.1);
-                text-align: center;
-                border: 5px solid {conv_color};
-            ">
-                <h3 style="font-size: 1.5rem; font-weight: 700;">Conventional Farming</h3>
-                <p style="font-size: 1.8rem; font-weight: 700; color: #333;">{monthly_conv_yield:.2f} kg</p>
-                <div style="font-size: 1em; color: {conv_color}; font-weight: bold;">
-                    {conv_diff_pct:.1f}% vs Average
-                </div>
-                <div style="font-size: 0.8em; color: #666; margin-top: 10px;">
-                    Average: {avg_conv_yield:.2f} kg
-                </div>
+    heat_col, tornado_col = st.columns(2)
+    with heat_col:
+        fig, grid_size = build_sensitivity_heatmap(totals[row], months, base, x_param, y_param, points, cost_index, method)
+        st.plotly_chart(fig, use_container_width=True)
+
+    with tornado_col:
+        variation = st.slider("Tornado variation (±%)", 5, 50, 20, step=5, key="fin_sens_variation")
+        st.plotly_chart(build_tornado_figure(totals[row], months, base, variation, method), use_container_width=True)
+
+    st.caption(f"{grid_size:,} grid points evaluated.")
+
+@render_cache.memoize
+def build_monthly_yield_summary():
+    """Per-month and average total yields for the monthly comparison widget."""
+    summary = kpi_summary.load_summary()
+
+    months = [row['month'] for row in summary['monthly']]
+    monthly_yields = {}
+    for row in summary['monthly']:
+        # The first row of a month wins, as with .iloc[0] on the filtered frame
+        monthly_yields.setdefault(row['month'], (row['conventional'], row['regenerative']))
+
+    average = summary['average_monthly_yield']
+    return months, monthly_yields, average['conventional'], average['regenerative']
+
+@render_cache.memoize
+def build_monthly_yield_html(selected_month):
+    months, monthly_yields, avg_conv_yield, avg_regen_yield = build_monthly_yield_summary()
+
+    # Get the selected month's data
+    monthly_conv_yield, monthly_regen_yield = monthly_yields[selected_month]
+
+    # Calculate difference from average
+    conv_diff_pct = ((monthly_conv_yield - avg_conv_yield) / avg_conv_yield) * 100
+    regen_diff_pct = ((monthly_regen_yield - avg_regen_yield) / avg_regen_yield) * 100
+    
+    # Define colours based on performance
+    conv_color = '#2ECC40' if conv_diff_pct > 0 else '#FF4136'
+    regen_color = '#2ECC40' if regen_diff_pct > 0 else '#FF4136'
+
+    # Custom HTML to display the results in a card-like format
+    return f"""
+    <div style="display: flex; justify-content: space-around; gap: 20px;">
+        <!-- Conventional Card -->
+        <div style="
+            flex: 1;
+            background-color: white;
+            padding: 1.5rem;
+            border-radius: 0.75rem;
+            box-shadow: 0 4px 6px -1px rgb(0 0 0 / 0.1), 0 2px 4px -2px rgb(0 0 0 / 0.1);
+            text-align: center;
+            border: 5px solid {conv_color};
+        ">
+            <h3 style="font-size: 1.5rem; font-weight: 700;">Conventional Farming</h3>
+            <p style="font-size: 1.8rem; font-weight: 700; color: #333;">{monthly_conv_yield:.2f} kg</p>
+            <div style="font-size: 1em; color: {conv_color}; font-weight: bold;">
+                {conv_diff_pct:.1f}% vs Average
             </div>
-            <!-- Regenerative Card -->
-            <div style="
-                flex: 1;
-                background-color: white;
-                padding: 1.5rem;
-                border-radius: 0.75rem;
-                box-shadow: 0 4px 6px -1px rgb(0 0 0 / 0.1), 0 2px 4px -2px rgb(0 0 0 / 0.1);
-                text-align: center;
-                border: 5px solid {regen_color};
-            ">
-                <h3 style="font-size: 1.5rem; font-weight: 700;">Regenerative Farming</h3>
-                <p style="font-size: 1.8rem; font-weight: 700; color: #333;">{monthly_regen_yield:.2f} kg</p>
-                <div style="font-size: 1em; color: {regen_color}; font-weight: bold;">
-                    {regen_diff_pct:.1f}% vs Average
-                </div>
-                <div style="font-size: 0.8em; color: #666; margin-top: 10px;">
-                    Average: {avg_regen_yield:.2f} kg
-                </div>
+            <div style="font-size: 0.8em; color: #666; margin-top: 10px;">
+                Average: {avg_conv_yield:.2f} kg
             </div>
         </div>
-        """, unsafe_allow_html=True)
+        <!-- Regenerative Card -->
+        <div style="
+            flex: 1;
+            background-color: white;
+            padding: 1.5rem;
+            border-radius: 0.75rem;
+            box-shadow: 0 4px 6px -1px rgb(0 0 0 / 0.1), 0 2px 4px -2px rgb(0 0 0 / 0.1);
+            text-align: center;
+            border: 5px solid {regen_color};
+        ">
+            <h3 style="font-size: 1.5rem; font-weight: 700;">Regenerative Farming</h3>
+            <p style="font-size: 1.8rem; font-weight: 700; color: #333;">{monthly_regen_yield:.2f} kg</p>
+            <div style="font-size: 1em; color: {regen_color}; font-weight: bold;">
+                {regen_diff_pct:.1f}% vs Average
+            </div>
+            <div style="font-size: 0.8em; color: #666; margin-top: 10px;">
+                Average: {avg_regen_yield:.2f} kg
+            </div>
+        </div>
+    </div>
+    """
+
+@startup_profiler.timed
+def render_monthly_yield_comparison():
+    """
+    Renders a new widget to compare a specific month's yield against the overall average.
+    """
+    st.subheader("Monthly Yield Comparison")
+
+    try:
+        # Month Picker
+        months = build_monthly_yield_summary()[0]
+        selected_month = st.selectbox("Select a month to compare", months)
+
+        st.markdown(build_monthly_yield_html(selected_month), unsafe_allow_html=True)
 
     except Exception as e:
         st.error(f"Error calculating monthly yield comparison: {e}")
 
 
+@startup_profiler.timed
 def render_chatbot_page():
     """Renders the chatbot interface within the Streamlit app."""
+    import chatbot_client
+
     st.markdown("### AI Chatbot")
     st.write("Ask a question about your documents and get a conversational answer.")
     
@@ -981,61 +1066,83 @@ def render_chatbot_page():
             
         # Display assistant response in chat message container
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                try:
-                    # Make a POST request to the API
-                    response = requests.post(CHATBOT_API_URL, json={"question": query})
-                    
-                    if response.status_code == 200:
-                        api_response = response.json()
-                        answer = api_response.get("answer", "No answer found.")
-                        sources = api_response.get("sources", [])
-                        
-                        st.markdown(answer)
-                        
-                        # (Optional) Display source documents from the API response
-                        if sources:
-                            st.markdown("---")
-                            st.markdown("##### Sources")
-                            for doc in sources:
-                                st.markdown(f"- **Source:** {doc.get('source', 'N/A')}, **Page:** {doc.get('page', 'N/A')}")
-                    else:
-                        st.error(f"Error from chatbot API: {response.status_code} - {response.text}")
-                
-                except requests.exceptions.ConnectionError:
-                    st.error("Could not connect to the chatbot API. Please ensure the API server is running.")
-                except Exception as e:
-                    st.error(f"An unexpected error occurred: {e}")
-
-
-cost_conv = 888.3
-cost_regen = 710.0
-cost_reduction_pct = ((cost_conv - cost_regen) / cost_conv) * 100 if cost_conv > 0 else 0
-
-# --- Yield Increase ---
-total_conv_yield = plant_harvest_df.iloc[:, [1,2,9,10]].sum().sum()
-total_regen_yield = plant_harvest_df.iloc[:, [5,6,13,14]].sum().sum()
-yield_increase_pct = ((total_regen_yield - total_conv_yield) / total_conv_yield) * 100 if total_conv_yield > 0 else 0
-
-# --- Revenue Increase ---
-prices = {'nipis_A': 8.21, 'nipis_B': 7.14, 'kasturi_A': 7.57, 'kasturi_B': 6.85}
-total_conv_rev = (plant_harvest_df.iloc[:, 1].sum() * prices['nipis_A'] + 
-                  plant_harvest_df.iloc[:, 2].sum() * prices['nipis_B'] +
-                  plant_harvest_df.iloc[:, 9].sum() * prices['kasturi_A'] +
-                  plant_harvest_df.iloc[:, 10].sum() * prices['kasturi_B'])
-
-total_regen_rev = (plant_harvest_df.iloc[:, 5].sum() * prices['nipis_A'] +
-                   plant_harvest_df.iloc[:, 6].sum() * prices['nipis_B'] +
-                   plant_harvest_df.iloc[:, 13].sum() * prices['kasturi_A'] +
-                   plant_harvest_df.iloc[:, 14].sum() * prices['kasturi_B'])
-revenue_increase_pct = ((total_regen_rev - total_conv_rev) / total_conv_rev) * 100 if total_conv_rev > 0 else 0
-
-# --- Gross Profit Increase ---
-total_conv_cost = cost_conv * 6
-total_regen_cost = cost_regen * 6
-conv_gross_profit = total_conv_rev - total_conv_cost
-regen_gross_profit = total_regen_rev - total_regen_cost
-gp_increase_pct = ((regen_gross_profit - conv_gross_profit) / conv_gross_profit) * 100 if conv_gross_profit > 0 else 0
+            try:
+                # Sources arrive first, then the answer token by token
+                events = chatbot_client.stream(query)
+                sources = []
+
+                def answer_tokens():
+                    for event in events:
+                        if event["type"] == "sources":
+                            sources.extend(event["sources"])
+                        elif event["type"] == "token":
+                            yield event["text"]
+                        elif event["type"] == "error":
+                            raise chatbot_client.ChatbotAPIError(event["error"])
+
+                st.write_stream(answer_tokens())
+
+                # (Optional) Display source documents from the API response
+                if sources:
+                    st.markdown("---")
+                    st.markdown("##### Sources")
+                    for doc in sources:
+                        st.markdown(f"- **Source:** {doc.get('source', 'N/A')}, **Page:** {doc.get('page', 'N/A')}")
+
+            except chatbot_client.CircuitOpenError as e:
+                st.warning(str(e))
+            except chatbot_client.ChatbotAPIError as e:
+                if e.status_code:
+                    st.error(f"Error from chatbot API: {e.status_code} - {e}")
+                else:
+                    st.error(str(e))
+            except Exception as e:
+                st.error(f"An unexpected error occurred: {e}")
+
+    render_chatbot_diagnostics()
+
+
+@startup_profiler.timed
+def render_chatbot_diagnostics():
+    """Shows chatbot API latency histograms and circuit breaker state."""
+    import pandas as pd
+    import chatbot_client
+
+    diagnostics = chatbot_client.diagnostics()
+    with st.expander("Chatbot API diagnostics", expanded=False):
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Circuit breaker", diagnostics["breaker"].replace("_", "-"))
+        col2.metric("Requests", diagnostics["counters"]["requests"])
+        col3.metric("Retries", diagnostics["counters"]["retries"])
+        col4.metric("Failures", diagnostics["counters"]["failures"])
+
+        col1, col2, col3, col4 = st.columns(4)
+        for col, key, label in [
+            (col1, "p50_first_token_ms", "p50 first token"),
+            (col2, "p95_first_token_ms", "p95 first token"),
+            (col3, "p50_total_ms", "p50 total"),
+            (col4, "p95_total_ms", "p95 total"),
+        ]:
+            value = diagnostics[key]
+            col.metric(label, f"≤{value} ms" if value is not None else "–")
+
+        histograms = pd.DataFrame({
+            "Time to first token": diagnostics["latency"]["first_token"]["buckets"],
+            "Total": diagnostics["latency"]["total"]["buckets"],
+        })
+        histograms.index.name = "Latency (ms)"
+        st.bar_chart(histograms, stack=False)
+        st.caption(f"API: {diagnostics['url']} · requests rejected while the breaker was open: {diagnostics['counters']['rejected']}")
+
+
+# --- Headline KPIs ---
+# Read from the precomputed summary artefact (see kpi_summary.py), so the
+# overview's metric cards never touch the harvest frame.
+kpis = harvest_summary['kpis']
+cost_reduction_pct = kpis['cost_reduction_pct']
+yield_increase_pct = kpis['yield_increase_pct']
+revenue_increase_pct = kpis['revenue_increase_pct']
+gp_increase_pct = kpis['gp_increase_pct']
 
 # # --- Header ---
 # st.markdown("""
@@ -1081,7 +1188,7 @@ if page == "Dashboard Overview":
         with cols1[1]:
             render_harvest_composition()
         with cols1[2]:
-            render_monthly_yield_comparison(plant_harvest_df)
+            render_monthly_yield_comparison()
         
         st.markdown("<hr style='margin: 0rem;'>", unsafe_allow_html=True)
     
@@ -1111,4 +1218,9 @@ elif page == "Simulations":
 elif page == "Chatbot":
     st.markdown("### Chatbot")
     st.write("Interact with our AI chatbot for insights and assistance.")
-    render_chatbot_page()
\ No newline at end of file
+    render_chatbot_page()
+
+if startup_profiler.enabled():
+    startup_profiler.render_report(st)
+    st.sidebar.caption("Render cache: " + ", ".join(f"{k} {v}" for k, v in render_cache.stats().items()))
+    startup_profiler.print_report()
@@ -0,0 +1,336 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import pandas as pd
+
+from workbook_reader import Region, read_regions, sheet_fingerprints
+
+# --- 1. CONFIGURATION ---
+
+# Source workbooks read by the dashboard
+PLOT_DATA_FILE = "PlotData.xlsx"
+PLANT_HARVEST_FILE = "Plant Harvest.xlsx"
+
+# Directory holding the columnar (Parquet) copies of the parsed sheets.
+# Each cached frame is named after the source file's content hash, so a
+# modified workbook never serves stale data.
+CACHE_DIR = ".data_cache"
+MANIFEST_FILE = os.path.join(CACHE_DIR, "manifest.json")
+
+# --- 2. REGION SCHEMA ---
+
+# Every frame the dashboard reads, declared by sheet and anchor cell instead of
+# skiprows offsets. Each workbook is opened once and all of its regions are
+# carved from the same in-memory grid (see workbook_reader.py).
+YIELD_COLUMNS = ['Farming Method', 'Grade A (kg)', 'Grade B (kg)']
+
+WORKBOOK_REGIONS = {
+    PLOT_DATA_FILE: [
+        Region("cost_df", sheet="Cost"),
+        Region("yield_nipis_df", sheet="Yield", anchor="A3", nrows=2, usecols="A,C:D",
+               header=False, columns=YIELD_COLUMNS),
+        Region("yield_kasturi_df", sheet="Yield", anchor="A8", nrows=2, usecols="A,C:D",
+               header=False, columns=YIELD_COLUMNS),
+        Region("disaggregation_df", sheet="Yield", anchor="A14", nrows=2, usecols="A:C",
+               header=False, columns=['Conventional Farming', 'Regenerative Farming'], index_col=True),
+        Region("ep_df", sheet="EP", index_col=True),
+        Region("soil_health_df", sheet="SoilHealth", index_col=True),
+    ],
+    PLANT_HARVEST_FILE: [
+        Region("plant_harvest_df", sheet="Plant Harvest (Cleaned)", anchor="A2"),
+    ],
+}
+
+FRAME_NAMES = {
+    path: [region.name for region in regions] for path, regions in WORKBOOK_REGIONS.items()
+}
+
+# --- 3. CACHE KEYS ---
+
+# In-process caches. Streamlit re-executes dashboard.py on every interaction
+# but keeps imported modules alive, so these survive across reruns.
+_manifest = None
+_frames = {}
+
+# Sheet fingerprints of the frames in _frames, so a changed workbook only has
+# the regions on its changed sheets re-read
+_fingerprints = {}
+
+# Guards _manifest: sessions hash different workbooks at the same time, and
+# dumping the dict while another thread adds an entry would fail
+_manifest_lock = threading.Lock()
+
+# One lock per workbook: when a file changes, the first thread to need it
+# parses it and every other session waits for that result
+_load_locks = {path: threading.Lock() for path in WORKBOOK_REGIONS}
+
+def _load_manifest():
+    """
+    Returns the in-memory manifest, reading it on first use. Call with
+    _manifest_lock held.
+    """
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(MANIFEST_FILE, "r", encoding="utf-8") as f:
+                _manifest = json.load(f)
+        except (FileNotFoundError, ValueError):
+            _manifest = {}
+    return _manifest
+
+def _save_manifest(manifest):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # A temp file of its own, so processes sharing CACHE_DIR never write into
+    # each other's half-finished manifest
+    fd, tmp_path = tempfile.mkstemp(prefix="manifest-", suffix=".tmp", dir=CACHE_DIR)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, MANIFEST_FILE)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def file_version(path):
+    """
+    Returns the content hash of a source workbook.
+    The hash is only recomputed when the file's mtime or size changes.
+    """
+    stat = os.stat(path)
+    with _manifest_lock:
+        entry = _load_manifest().get(path)
+    if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+        return entry["sha256"]
+
+    # Hashed outside the lock so other workbooks' lookups do not wait on it
+    sha256 = _hash_file(path)
+    with _manifest_lock:
+        manifest = _load_manifest()
+        manifest[path] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": sha256}
+        try:
+            _save_manifest(dict(manifest))
+        except OSError as e:
+            print(f"Warning: could not write data cache manifest: {e}")
+    return sha256
+
+def _cache_path(path, version, name):
+    stem = os.path.splitext(os.path.basename(path))[0].replace(" ", "_")
+    return os.path.join(CACHE_DIR, f"{stem}-{version[:16]}-{name}.parquet")
+
+# --- 4. LOADING ---
+
+def _read_columnar(path, version, names):
+    """
+    Reads a workbook's frames from the Parquet cache.
+    Returns None if any frame is missing or the Parquet engine is unavailable.
+    """
+    frames = {}
+    for name in names:
+        cache_path = _cache_path(path, version, name)
+        if not os.path.exists(cache_path):
+            return None
+        try:
+            frames[name] = pd.read_parquet(cache_path)
+        except (ImportError, OSError, ValueError):
+            return None
+    return frames
+
+def _write_columnar(path, version, frames):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    for name, df in frames.items():
+        cache_path = _cache_path(path, version, name)
+        tmp_path = cache_path + ".tmp"
+        try:
+            df.to_parquet(tmp_path)
+            os.replace(tmp_path, cache_path)
+        except ImportError:
+            # No Parquet engine installed; the in-memory cache still applies.
+            return
+        except Exception as e:
+            print(f"Warning: could not cache '{name}' from {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+def _remove_stale_columnar(path, version):
+    if not os.path.isdir(CACHE_DIR):
+        return
+    stem = os.path.splitext(os.path.basename(path))[0].replace(" ", "_")
+    current = f"{stem}-{version[:16]}-"
+    for filename in os.listdir(CACHE_DIR):
+        if filename.startswith(f"{stem}-") and filename.endswith(".parquet") and not filename.startswith(current):
+            try:
+                os.remove(os.path.join(CACHE_DIR, filename))
+            except OSError:
+                pass
+
+def _read_changed_regions(path):
+    """
+    Reads a workbook's regions, reusing the in-memory frame of any region
+    whose sheet is unchanged since the previous version.
+    """
+    regions = WORKBOOK_REGIONS[path]
+    try:
+        fingerprints = sheet_fingerprints(path)
+    except Exception:
+        fingerprints = {}
+    previous_fingerprints = _fingerprints.get(path, {})
+    # _frames is shared with loads of other workbooks (under their own locks),
+    # so scan a snapshot: list() copies it without releasing the GIL
+    previous = next((frames for key, frames in list(_frames.items()) if key[0] == path), {})
+
+    reused = {
+        region.name: previous[region.name]
+        for region in regions
+        if region.name in previous
+        and fingerprints.get(region.sheet) is not None
+        and fingerprints.get(region.sheet) == previous_fingerprints.get(region.sheet)
+    }
+    changed = [region for region in regions if region.name not in reused]
+    frames = dict(reused, **read_regions(path, changed)) if changed else reused
+    if reused:
+        print(f"Re-read {len(changed)} of {len(regions)} regions from {path} (sheets changed: "
+              f"{', '.join(sorted({region.sheet for region in changed})) or 'none'}).")
+    return {name: frames[name] for name in FRAME_NAMES[path]}, fingerprints
+
+def load_workbook(path):
+    """
+    Returns a dict of the frames parsed from a source workbook.
+    Lookups are served from memory, then from the Parquet cache, and only
+    fall back to reading the .xlsx file when its content has changed, and
+    then only the sheets that changed.
+    """
+    version = file_version(path)
+    key = (path, version)
+    frames = _frames.get(key)
+    if frames is not None:
+        return frames
+
+    with _load_locks[path]:
+        # Another session may have loaded it while this one waited
+        frames = _frames.get(key)
+        if frames is not None:
+            return frames
+
+        frames = _read_columnar(path, version, FRAME_NAMES[path])
+        if frames is None:
+            frames, fingerprints = _read_changed_regions(path)
+            _write_columnar(path, version, frames)
+            _remove_stale_columnar(path, version)
+        else:
+            try:
+                fingerprints = sheet_fingerprints(path)
+            except Exception:
+                fingerprints = {}
+
+        # Swap in the new version and drop any older one from memory
+        _frames[key] = frames
+        _fingerprints[path] = fingerprints
+        for old_key in [k for k in list(_frames) if k[0] == path and k != key]:
+            _frames.pop(old_key, None)
+    return frames
+
+def data_version():
+    """
+    Returns a short identifier that changes whenever any source workbook changes.
+    """
+    return "-".join(file_version(path)[:8] for path in WORKBOOK_REGIONS)
+
+def clear_cache():
+    """
+    Drops the in-memory frames so the next access re-reads the cache.
+    """
+    global _manifest
+    _frames.clear()
+    with _manifest_lock:
+        _manifest = None
+
+# --- 5. RELOADING ---
+
+# Functions called after reload() swaps in new frames, so modules holding
+# results derived from them (render_cache, kpi_summary, ...) can drop them
+_reload_callbacks = []
+_loaded_version = None
+_reload_lock = threading.Lock()
+
+def on_reload(callback):
+    """
+    Registers callback() to run after the data has been reloaded.
+    """
+    _reload_callbacks.append(callback)
+    return callback
+
+def reload(force=False):
+    """
+    Re-checks the source workbooks and, if any has changed (or force is set),
+    reads the new frames and then notifies the on_reload() callbacks.
+    Sessions keep whatever frames they already hold until their next access.
+    Concurrent calls are serialised, so a change is only acted on once.
+    Returns True if the data changed.
+    """
+    global _loaded_version
+    with _reload_lock:
+        in_use = {key[0] for key in list(_frames)}
+        if force:
+            clear_cache()
+        version = data_version()
+        if version == _loaded_version and not force:
+            return False
+
+        # Re-read the workbooks that were in use; the rest load on first access.
+        # load_workbook() swaps a workbook's frames in as a whole, so a concurrent
+        # reader sees either the old set or the new one.
+        for path in in_use:
+            load_workbook(path)
+        _loaded_version = version
+        for callback in _reload_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Warning: reload callback {callback.__qualname__} failed: {e}")
+        return True
+
+# --- 6. ACCESSORS ---
+
+# Every session shares one copy of each frame. Accessors hand out shallow
+# copies: with pandas' copy-on-write they share the column data (no copy is
+# made) but have their own structure, so a session adding or overwriting a
+# column copies only what it changes and never alters the shared frame.
+
+def get_frame(name) -> pd.DataFrame:
+    for path, names in FRAME_NAMES.items():
+        if name in names:
+            return load_workbook(path)[name].copy(deep=False)
+    raise KeyError(f"Unknown frame '{name}'.")
+
+def get_cost_df() -> pd.DataFrame:
+    return get_frame("cost_df")
+
+def get_yield_nipis_df() -> pd.DataFrame:
+    return get_frame("yield_nipis_df")
+
+def get_yield_kasturi_df() -> pd.DataFrame:
+    return get_frame("yield_kasturi_df")
+
+def get_disaggregation_df() -> pd.DataFrame:
+    return get_frame("disaggregation_df")
+
+def get_ep_df() -> pd.DataFrame:
+    return get_frame("ep_df")
+
+def get_soil_health_df() -> pd.DataFrame:
+    return get_frame("soil_health_df")
+
+def get_plant_harvest_df() -> pd.DataFrame:
+    return get_frame("plant_harvest_df")
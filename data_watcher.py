@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+
+import data_loader
+import harvest_store
+
+# --- 1. CONFIGURATION ---
+
+# Seconds between checks of the source files. Each check is one os.stat per file.
+POLL_INTERVAL = float(os.getenv("DATA_WATCH_INTERVAL", "2"))
+
+# A changed file must keep the same size and mtime for this long before it is
+# read, so a workbook still being saved is never parsed half-written
+SETTLE_TIME = float(os.getenv("DATA_WATCH_SETTLE", "1"))
+
+# Set DATA_WATCH=0 to disable the watcher (e.g. for one-off scripts)
+ENABLED = os.getenv("DATA_WATCH", "1") != "0"
+
+# --- 2. THE WATCHER ---
+
+def watched_paths():
+    paths = list(data_loader.WORKBOOK_REGIONS)
+    if harvest_store.HARVEST_STORE_FILE:
+        paths.append(harvest_store.HARVEST_STORE_FILE)
+    return paths
+
+def _stat(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+class DataWatcher(threading.Thread):
+    """
+    Background thread that polls the source files and, once a changed file
+    has settled, calls data_loader.reload(). That re-reads only the changed
+    sheets and swaps the new version in, so sessions pick it up on their
+    next rerun without each of them re-parsing the workbook.
+    """
+
+    def __init__(self, paths, interval=POLL_INTERVAL, settle_time=SETTLE_TIME):
+        super().__init__(name="data-watcher", daemon=True)
+        self.paths = list(paths)
+        self.interval = interval
+        self.settle_time = settle_time
+        self.reloads = 0
+        self.last_error = None
+        self._stop_event = threading.Event()
+        self._seen = {path: _stat(path) for path in self.paths}
+        # path -> (stat, time first seen) for changes that have not settled yet
+        self._pending = {}
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                # Keep watching; the next change gets another chance
+                self.last_error = str(e)
+                print(f"Warning: data watcher could not reload: {e}")
+
+    def check(self):
+        """
+        Polls every path once. Returns True if a reload was triggered.
+        """
+        now = time.monotonic()
+        settled = []
+        for path in self.paths:
+            current = _stat(path)
+            if current == self._seen[path]:
+                self._pending.pop(path, None)
+                continue
+            pending = self._pending.get(path)
+            if pending is None or pending[0] != current:
+                # New or still changing: restart the settle timer
+                self._pending[path] = (current, now)
+            elif now - pending[1] >= self.settle_time and current is not None:
+                settled.append(path)
+
+        if not settled:
+            return False
+
+        print(f"Data watcher: {', '.join(settled)} changed, reloading.")
+        # The long harvest file is not one of data_loader's workbooks, so its
+        # change is not visible in data_version(); force the callbacks to run
+        data_loader.reload(force=any(path not in data_loader.WORKBOOK_REGIONS for path in settled))
+        for path in settled:
+            self._seen[path] = self._pending.pop(path)[0]
+        self.reloads += 1
+        self.last_error = None
+        return True
+
+# Streamlit re-executes dashboard.py on every interaction but keeps imported
+# modules alive, so this starts one watcher per server process
+_watcher = None
+_start_lock = threading.Lock()
+
+def start():
+    """
+    Starts the process-wide watcher once. Returns it, or None if disabled.
+    """
+    global _watcher
+    if not ENABLED:
+        return None
+    with _start_lock:
+        if _watcher is None or not _watcher.is_alive():
+            _watcher = DataWatcher(watched_paths())
+            _watcher.start()
+    return _watcher
@@ -0,0 +1,97 @@
+import hashlib
+import os
+import re
+import numpy as np
+from dotenv import load_dotenv
+
+import embedding_cache
+
+# --- 1. CONFIGURATION ---
+
+# "google" uses the Gemini embedding API; "fake" is a local, deterministic
+# embedder for offline tests and benchmarks. The same backend must be used to
+# build chroma_db and to query it.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "google")
+GOOGLE_EMBEDDING_MODEL = "models/text-embedding-004"
+FAKE_EMBEDDING_DIM = 768
+
+# --- 2. FAKE EMBEDDER ---
+
+class FakeEmbeddings:
+    """
+    Deterministic bag-of-words embeddings built with the hashing trick.
+
+    Each lower-cased token is hashed to a bucket and a sign, and the resulting
+    vector is L2-normalised. Texts that share words therefore get similar
+    vectors, which is enough to exercise retrieval without network calls.
+    Implements the embed_documents / embed_query interface LangChain expects.
+    """
+
+    model = "fake-hashing"
+
+    def __init__(self, dim=FAKE_EMBEDDING_DIM):
+        self.dim = dim
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in re.findall(r"\w[\w-]*", text.lower()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dim] += 1.0 if (value >> 63) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+    def embed_queries(self, texts):
+        return [self._embed(text) for text in texts]
+
+# --- 3. FACTORY ---
+
+def make_embeddings(backend=None, cache=None):
+    """
+    Returns the embedding model for the configured backend, behind the
+    persistent embedding cache unless cache=False (or EMBEDDING_CACHE=0).
+    """
+    backend = backend or EMBEDDING_BACKEND
+    if backend == "fake":
+        embeddings = FakeEmbeddings()
+    elif backend == "google":
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+        load_dotenv()
+        if not os.getenv("GOOGLE_API_KEY"):
+            raise ValueError("GOOGLE_API_KEY not found. Please set it in your environment or a .env file.")
+        embeddings = GoogleGenerativeAIEmbeddings(model=GOOGLE_EMBEDDING_MODEL)
+    else:
+        raise ValueError(f"Unknown embedding backend '{backend}'. Use 'google' or 'fake'.")
+
+    if cache is None:
+        cache = embedding_cache.ENABLED
+    if cache:
+        return embedding_cache.CachedEmbeddings(embeddings, embedding_cache.open_cache(model_name(embeddings)))
+    return embeddings
+
+def model_name(embeddings):
+    """
+    Returns a stable name for an embedding model, used in cache keys.
+    """
+    return getattr(embeddings, "model", type(embeddings).__name__)
+
+def embed_queries(embeddings, texts):
+    """
+    Embeds several queries in as few model calls as the backend allows.
+    LangChain's interface only batches documents, and some models (Gemini
+    among them) embed queries differently, so this picks the right call.
+    """
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(texts)
+    if type(embeddings).__name__ == "GoogleGenerativeAIEmbeddings":
+        return embeddings.embed_documents(texts, task_type="RETRIEVAL_QUERY")
+    return [embeddings.embed_query(text) for text in texts]
@@ -0,0 +1,263 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import numpy as np
+
+# --- 1. CONFIGURATION ---
+
+# Embeddings survive restarts and re-indexing here. Safe to delete at any time.
+CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", ".embedding_cache")
+
+# Least recently used embeddings beyond this many (per model) are evicted.
+# At 768 dimensions each one takes about 3 KB on disk.
+MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "50000"))
+
+# Set EMBEDDING_CACHE=0 to always call the embedding model
+ENABLED = os.getenv("EMBEDDING_CACHE", "1") != "0"
+
+# Hits only update their last-used time in memory; they are written to the
+# index with the next insert, or once this many have accumulated
+TOUCH_FLUSH_EVERY = 256
+
+KEY_BYTES = 16
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS entries (key BLOB PRIMARY KEY, row INTEGER NOT NULL UNIQUE, last_used REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+CREATE TABLE IF NOT EXISTS free_rows (row INTEGER PRIMARY KEY);
+"""
+
+# --- 2. KEYS ---
+
+def normalize_text(text, kind):
+    """
+    Folds away differences that do not change what a text asks or says.
+    Queries are also lower-cased and stripped of punctuation, as in the
+    answer cache, so "What is Neem oil?" and "what is neem oil" share a key.
+    """
+    text = unicodedata.normalize("NFC", text)
+    if kind == "query":
+        text = re.sub(r"[^\w\s-]", " ", text.lower())
+    return " ".join(text.split())
+
+def cache_key(kind, text):
+    """
+    A fixed-size key for a text. kind is "query" or "document": some models
+    embed the same text differently for each, so they never share an entry.
+    """
+    digest = hashlib.sha256(f"{kind}\x1f{normalize_text(text, kind)}".encode("utf-8"))
+    return digest.digest()[:KEY_BYTES]
+
+# --- 3. THE CACHE ---
+
+class EmbeddingCache:
+    """
+    A persistent, size-bounded cache of one model's embeddings.
+
+    Vectors live in a flat binary file of fixed-size records (a key followed
+    by the float32 components), so a hit is a single positioned read. A
+    SQLite index maps each key to its record and tracks when it was last
+    used; evicted records are reused by later inserts. Each record repeats
+    its key, so a reader that races an eviction in another process sees a
+    mismatch and treats it as a miss instead of returning the wrong vector.
+    """
+
+    def __init__(self, model, directory=CACHE_DIR, max_entries=MAX_ENTRIES):
+        self.model = model
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        slug = re.sub(r"[^\w.-]+", "_", model).strip("_")
+        base = os.path.join(directory, f"{slug}-{hashlib.sha256(model.encode('utf-8')).hexdigest()[:8]}")
+
+        self._lock = threading.Lock()
+        self._touched = {}
+        self._db = sqlite3.connect(base + ".index", timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("PRAGMA synchronous = NORMAL")
+        self._db.executescript(SCHEMA)
+        self._fd = os.open(base + ".f32", os.O_RDWR | os.O_CREAT, 0o644)
+        self.dim = self._meta("dim")
+
+    def _meta(self, key, default=None):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return int(row[0]) if row else default
+
+    def _record_size(self):
+        return KEY_BYTES + 4 * self.dim
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def get_many(self, keys):
+        """
+        Returns one float32 vector, or None on a miss, per key.
+        """
+        results = [None] * len(keys)
+        if not keys:
+            return results
+        with self._lock:
+            if self.dim is None:
+                self.dim = self._meta("dim")
+            if self.dim is not None:
+                rows = {}
+                unique = list(set(keys))
+                for start in range(0, len(unique), 500):
+                    batch = unique[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows.update(self._db.execute(
+                        f"SELECT key, row FROM entries WHERE key IN ({placeholders})", batch
+                    ).fetchall())
+                size = self._record_size()
+                now = time.time()
+                for i, key in enumerate(keys):
+                    row = rows.get(key)
+                    if row is None:
+                        continue
+                    record = os.pread(self._fd, size, row * size)
+                    if len(record) == size and record[:KEY_BYTES] == key:
+                        results[i] = np.frombuffer(record, dtype=np.float32, offset=KEY_BYTES)
+                        self._touched[key] = now
+            found = sum(vector is not None for vector in results)
+            self.hits += found
+            self.misses += len(keys) - found
+            if len(self._touched) >= TOUCH_FLUSH_EVERY:
+                self._db.execute("BEGIN IMMEDIATE")
+                try:
+                    self._flush_touched()
+                    self._db.execute("COMMIT")
+                except Exception:
+                    self._db.execute("ROLLBACK")
+                    raise
+        return results
+
+    def _flush_touched(self):
+        if self._touched:
+            self._db.executemany(
+                "UPDATE entries SET last_used = MAX(last_used, ?) WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def put_many(self, keys, vectors):
+        """
+        Stores vectors under their keys, evicting the least recently used
+        entries beyond max_entries. Vectors of another dimension than the
+        cache's are not stored.
+        """
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._flush_touched()
+                if self.dim is None:
+                    self.dim = self._meta("dim")
+                if self.dim is None and len(vectors):
+                    self.dim = len(vectors[0])
+                    self._db.execute("INSERT INTO meta VALUES ('dim', ?)", (str(self.dim),))
+                next_row = self._meta("next_row", 0)
+                size = self._record_size()
+                now = time.time()
+                for key, vector in zip(keys, vectors):
+                    vector = np.asarray(vector, dtype=np.float32)
+                    if vector.shape != (self.dim,):
+                        continue
+                    if self._db.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone():
+                        continue
+                    free = self._db.execute("SELECT row FROM free_rows LIMIT 1").fetchone()
+                    if free is not None:
+                        row = free[0]
+                        self._db.execute("DELETE FROM free_rows WHERE row = ?", (row,))
+                    else:
+                        row, next_row = next_row, next_row + 1
+                    # The vector is on disk before the entry pointing at it is committed
+                    os.pwrite(self._fd, key + vector.tobytes(), row * size)
+                    self._db.execute("INSERT INTO entries VALUES (?, ?, ?)", (key, row, now))
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('next_row', ?)", (str(next_row),))
+
+                excess = len(self) - self.max_entries
+                if excess > 0:
+                    evicted = self._db.execute(
+                        "SELECT key, row FROM entries ORDER BY last_used LIMIT ?", (excess,)
+                    ).fetchall()
+                    self._db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in evicted])
+                    self._db.executemany("INSERT INTO free_rows VALUES (?)", [(row,) for _, row in evicted])
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "model": self.model,
+                "entries": len(self),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            }
+
+# One cache per model and directory, shared by every thread in the process
+_caches = {}
+_open_lock = threading.Lock()
+
+def open_cache(model, directory=CACHE_DIR):
+    with _open_lock:
+        key = (model, os.path.abspath(directory))
+        if key not in _caches:
+            _caches[key] = EmbeddingCache(model, directory)
+        return _caches[key]
+
+# --- 4. CACHED EMBEDDINGS ---
+
+class CachedEmbeddings:
+    """
+    Puts an EmbeddingCache in front of an embedding model. Implements the
+    same embed_documents / embed_query interface, and only the texts that
+    miss the cache are sent to the model (identical texts in a batch once).
+    """
+
+    def __init__(self, embeddings, cache):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = cache.model
+
+    def embed_documents(self, texts):
+        return self._embed_many("document", texts, self.embeddings.embed_documents)
+
+    def _embed_many(self, kind, texts, embed):
+        keys = [cache_key(kind, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+        missing = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+        if missing:
+            # Rounded to float32 like the stored copies, so a hit returns exactly what the miss did
+            computed = [np.asarray(vector, dtype=np.float32) for vector in embed(list(missing.values()))]
+            self.cache.put_many(list(missing), computed)
+            by_key = dict(zip(missing, computed))
+            vectors = [by_key[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+        return [vector.tolist() for vector in vectors]
+
+    def embed_query(self, text):
+        key = cache_key("query", text)
+        vector = self.cache.get_many([key])[0]
+        if vector is None:
+            vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+            self.cache.put_many([key], [vector])
+        return vector.tolist()
+
+    def embed_queries(self, texts):
+        """
+        Batched embed_query: the queries that miss go to the model in one call.
+        """
+        from embedding_backends import embed_queries
+
+        return self._embed_many("query", texts, lambda missing: embed_queries(self.embeddings, missing))
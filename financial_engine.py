@@ -0,0 +1,106 @@
+import numpy as np
+
+import harvest_store
+
+# --- 1. CONFIGURATION ---
+
+METHODS = harvest_store.METHODS
+
+PRICE_PARAMETERS = ("price_nipis_a", "price_nipis_b", "price_kasturi_a", "price_kasturi_b")
+
+# The (crop, grade) in the harvest store each price applies to
+PRICE_GRADES = {
+    "price_nipis_a": ("nipis", "A"),
+    "price_nipis_b": ("nipis", "B"),
+    "price_kasturi_a": ("kasturi", "A"),
+    "price_kasturi_b": ("kasturi", "B"),
+}
+PARAMETERS = PRICE_PARAMETERS + ("monthly_cost",)
+
+PARAMETER_LABELS = {
+    "price_nipis_a": "Limau Nipis Grade A (RM/kg)",
+    "price_nipis_b": "Limau Nipis Grade B (RM/kg)",
+    "price_kasturi_a": "Limau Kasturi Grade A (RM/kg)",
+    "price_kasturi_b": "Limau Kasturi Grade B (RM/kg)",
+    "monthly_cost": "Monthly cost (RM)",
+}
+
+# --- 2. HARVEST TOTALS ---
+
+def harvest_totals(grades):
+    """
+    Returns a (2, 4) array of harvest totals from a grade_totals() frame
+    (analytics_store or harvest_store): one row per method in METHODS,
+    columns ordered as PRICE_PARAMETERS (Nipis A, Nipis B, Kasturi A,
+    Kasturi B).
+    """
+    columns = [PRICE_GRADES[name] for name in PRICE_PARAMETERS]
+    totals = grades.reindex(index=list(METHODS), columns=columns, fill_value=0.0).to_numpy(dtype=float)
+    totals.setflags(write=False)
+    return totals
+
+# --- 3. MARGIN EVALUATION ---
+
+def rf_margin(totals, months, price_nipis_a, price_nipis_b, price_kasturi_a, price_kasturi_b, monthly_cost):
+    """
+    Revenue/fertiliser margin for one method's row of harvest_totals().
+
+    Every price and cost may be a scalar or an array; they broadcast against
+    each other, so a whole grid of scenarios is a handful of array operations.
+    Returns 0 where the total cost is not positive.
+    """
+    revenue = (
+        price_nipis_a * totals[0]
+        + price_nipis_b * totals[1]
+        + price_kasturi_a * totals[2]
+        + price_kasturi_b * totals[3]
+    )
+    total_cost = np.asarray(monthly_cost, dtype=float) * months
+    safe_cost = np.where(total_cost > 0, total_cost, 1.0)
+    return np.where(total_cost > 0, revenue / safe_cost, 0.0)
+
+def sensitivity_grid(totals, months, base, axes):
+    """
+    Evaluates rf_margin over the Cartesian product of `axes`.
+
+    base maps every name in PARAMETERS to its fixed value; axes maps some of
+    them to 1-D arrays of values to sweep. The result has one dimension per
+    swept parameter, in the order of `axes` (e.g. 50x50x50 for three axes).
+    """
+    params = dict(base)
+    for dim, (name, values) in enumerate(axes.items()):
+        shape = [1] * len(axes)
+        shape[dim] = -1
+        params[name] = np.asarray(values, dtype=float).reshape(shape)
+    margin = rf_margin(totals, months, **params)
+    return np.broadcast_to(margin, tuple(len(values) for values in axes.values()))
+
+def tornado(totals, months, base, variation=0.2):
+    """
+    One-at-a-time sensitivity: moves each parameter to (1 - variation) and
+    (1 + variation) times its base value with the others held at base.
+
+    Returns rows of {"parameter", "low", "high", "low_margin", "high_margin"}
+    sorted by swing, largest first, plus the base margin.
+    """
+    count = len(PARAMETERS)
+    # Row 2i is parameter i at its low value, row 2i + 1 at its high value
+    cases = {name: np.full(2 * count, float(base[name])) for name in PARAMETERS}
+    for i, name in enumerate(PARAMETERS):
+        cases[name][2 * i] *= 1 - variation
+        cases[name][2 * i + 1] *= 1 + variation
+    margins = rf_margin(totals, months, **cases)
+    base_margin = float(rf_margin(totals, months, **base))
+
+    rows = [
+        {
+            "parameter": name,
+            "low": cases[name][2 * i],
+            "high": cases[name][2 * i + 1],
+            "low_margin": float(margins[2 * i]),
+            "high_margin": float(margins[2 * i + 1]),
+        }
+        for i, name in enumerate(PARAMETERS)
+    ]
+    rows.sort(key=lambda row: abs(row["high_margin"] - row["low_margin"]), reverse=True)
+    return rows, base_margin
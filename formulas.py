@@ -1,19 +1,20 @@
+from impact_engine import DEFAULT_COEFFICIENTS, calc_ep_conv, calc_ep_regen, parse_grades
+
+# The emission factors and the EP/CFP calculations live in impact_engine.py,
+# which evaluates whole batches of scenarios at once. These helpers keep the
+# one-product-at-a-time interface.
+
 def calc_np_conv(unit, unit_weight, unit_class):
-    N_perc, P205_perc, K_perc = unit_class.split("-")
+    N_perc, P205_perc, K_perc = parse_grades(unit_class)
     total_mass = unit * unit_weight
-    N_perc = float(N_perc)/100
-    P205_perc = float(P205_perc)/100
-    P_perc = (P205_perc*62)/142
-    N_applied = N_perc * total_mass
-    P_applied = P_perc * total_mass
-    return N_applied, P_applied
+    N_applied = N_perc / 100 * total_mass
+    P_applied = P205_perc / 100 * DEFAULT_COEFFICIENTS.p2o5_to_p * total_mass
+    return float(N_applied), float(P_applied)
 
 def calc_np_regen(unit, unit_weight):
-    N_perc = 0.05
-    P_perc = 0.005
     total_mass = unit * unit_weight
-    N_applied = N_perc * total_mass
-    P_applied = P_perc * total_mass
+    N_applied = DEFAULT_COEFFICIENTS.regen_n * total_mass
+    P_applied = DEFAULT_COEFFICIENTS.regen_p * total_mass
     return N_applied, P_applied
 
 chemical_data = [
@@ -45,46 +46,6 @@ chemical_data = [
 
 # print(chemical_data)
 
-def calc_ep_conv(chemical_data):
-    N_applied, P_applied = 0, 0
-    for chem in chemical_data:
-        N, P = calc_np_conv(chem["units"], chem["unit_weight"], chem["unit_class"])
-        print(N,P)
-        N_applied += N
-        P_applied += P
-    N_used = N_applied * 12
-    P_used = P_applied * 12
-    EF_N = 1.33
-    EF_P = 0.05
-    emission_N = N_used * EF_N
-    emission_P = P_used * EF_P
-    midpoint_CF_N = 0.158
-    midpoint_CF_P = 0.100
-    EP_P = emission_P * midpoint_CF_P
-    EP_N = emission_N * midpoint_CF_N
-    CEF_N = 3.7
-    CEF_P = 3.1
-    C_FP_N = CEF_N * N_used
-    C_FP_P = CEF_P * P_used
-    CFP = C_FP_P + C_FP_N
-    return EP_N, EP_P, CFP
-
-def calc_ep_regen(chemical_data):
-    N_applied, P_applied = calc_np_regen(chemical_data[0]["units"], chemical_data[0]["unit_weight"])
-    N_used = N_applied * 12
-    P_used = P_applied * 12
-    EF_N = 1.33
-    EF_P = 0.05
-    emission_N = N_used * EF_N
-    emission_P = P_used * EF_P
-    midpoint_CF_N = 0.158
-    midpoint_CF_P = 0.100
-    EP_P = emission_P * midpoint_CF_P
-    EP_N = emission_N * midpoint_CF_N
-    C_uptake = -1.83
-    CFP = chemical_data[0]["units"] * chemical_data[0]["unit_weight"] * C_uptake * 12
-    return EP_N, EP_P, CFP
-
 default_conv_chemicals = [
                     {"name": "DEEBAJ", "units": 2, "unit_weight": 25, "unit_class": "15-15-15"},
                     {"name": "Agroharta", "units": 1, "unit_weight": 2, "unit_class": "15-15-15"},
@@ -92,7 +53,8 @@ default_conv_chemicals = [
                     {"name": "Foliar", "units": 1, "unit_weight": 1.5, "unit_class": "10-5-12"}
                 ]
 
-print(calc_ep_conv(default_conv_chemicals))
+if __name__ == "__main__":
+    print(calc_ep_conv(default_conv_chemicals))
 
 
 # # --- Soil Health Metrics ---
@@ -0,0 +1,180 @@
+import os
+import numpy as np
+import pandas as pd
+
+import data_loader
+
+# --- 1. CONFIGURATION ---
+
+# A long-format harvest table (Parquet or CSV with the columns below, one row
+# per farm, plot, crop, method, grade and month). When unset, the store is
+# converted from the wide "Plant Harvest (Cleaned)" sheet.
+HARVEST_STORE_FILE = os.getenv("HARVEST_STORE_FILE")
+
+METHODS = ("conventional", "regenerative")
+CROPS = ("nipis", "kasturi")
+GRADES = ("A", "B")
+
+# farm and month form the (sorted) index; the rest are columns
+INDEX = ["farm", "month"]
+COLUMNS = ["plot", "crop", "method", "grade", "period", "kg"]
+
+# The wide sheet is four blocks of (Month, Grade A, Grade B, spacer), one per
+# plot. Block start column -> (plot, method, crop).
+WIDE_BLOCKS = {
+    0: ("Plot 1", "conventional", "nipis"),
+    4: ("Plot 2", "regenerative", "nipis"),
+    8: ("Plot 3", "conventional", "kasturi"),
+    12: ("Plot 4", "regenerative", "kasturi"),
+}
+DEFAULT_FARM = "Farm 1"
+
+# --- 2. CONVERSION ---
+
+def from_wide(plant_harvest_df, farm=DEFAULT_FARM):
+    """
+    Converts the wide harvest sheet (addressed by column position) into a
+    long store. Rows with no month or no harvest figure are dropped.
+    """
+    parts = []
+    for start, (plot, method, crop) in WIDE_BLOCKS.items():
+        block = plant_harvest_df.iloc[:, start:start + 3]
+        months = pd.to_datetime(block.iloc[:, 0]).to_numpy()
+        for offset, grade in enumerate(GRADES, start=1):
+            parts.append(pd.DataFrame({
+                "farm": farm, "plot": plot, "crop": crop, "method": method, "grade": grade,
+                "month": months, "kg": block.iloc[:, offset].to_numpy(dtype=float),
+            }))
+    return normalise(pd.concat(parts, ignore_index=True))
+
+def _categorical(values, clean=str, categories=None):
+    """
+    Converts a column to a Categorical, cleaning each distinct label once
+    rather than every row. Labels outside `categories` become missing.
+    """
+    values = pd.Categorical(values)
+    cleaned = [clean(label) for label in values.categories]
+    if categories is None:
+        categories = sorted(set(cleaned))
+    position = {label: i for i, label in enumerate(categories)}
+    lookup = np.array([position.get(label, -1) for label in cleaned] + [-1])
+    # A code of -1 (missing) indexes the trailing -1
+    return pd.Categorical.from_codes(lookup[values.codes], categories=list(categories))
+
+def normalise(df):
+    """
+    Brings a long harvest table to the store layout: categorical labels,
+    datetime months, a per-plot period number and a sorted (farm, month) index.
+    """
+    df = df.reset_index()[["farm", "plot", "crop", "method", "grade", "month", "kg"]]
+    df = df.dropna(subset=["month", "kg"])
+
+    df = df.assign(
+        farm=_categorical(df["farm"]),
+        plot=_categorical(df["plot"]),
+        crop=_categorical(df["crop"], lambda label: str(label).lower(), CROPS),
+        method=_categorical(df["method"], lambda label: str(label).lower(), METHODS),
+        grade=_categorical(df["grade"], lambda label: str(label).upper(), GRADES),
+        month=pd.to_datetime(df["month"]).dt.to_period("M").dt.to_timestamp(),
+        kg=df["kg"].astype(float),
+    )
+    # period counts each plot's recorded months from 1, so a conventional and a
+    # regenerative plot harvested in different seasons line up month for month
+    df["period"] = (
+        df.groupby(["farm", "plot"], observed=True)["month"].rank(method="dense").astype(np.int32)
+    )
+    return df.set_index(INDEX).sort_index()[COLUMNS]
+
+def read_long(path):
+    if path.endswith(".parquet"):
+        return normalise(pd.read_parquet(path))
+    return normalise(pd.read_csv(path))
+
+# --- 3. LOADING ---
+
+# In-process copy keyed by the source's version, kept across Streamlit reruns
+_store = {}
+
+def version():
+    """
+    Returns the content hash of the store's source file.
+    """
+    path = HARVEST_STORE_FILE or data_loader.PLANT_HARVEST_FILE
+    return data_loader.file_version(path)[:16]
+
+def load():
+    """
+    Returns the harvest store for the current data, converting the wide
+    sheet (or reading HARVEST_STORE_FILE) once per version.
+    """
+    key = version()
+    if key in _store:
+        return _store[key]
+
+    if HARVEST_STORE_FILE:
+        store = read_long(HARVEST_STORE_FILE)
+    else:
+        store = from_wide(data_loader.get_plant_harvest_df())
+    _store.clear()
+    _store[key] = store
+    return store
+
+@data_loader.on_reload
+def clear_cache():
+    _store.clear()
+
+# --- 4. AGGREGATIONS ---
+
+def last_periods(store, periods):
+    """
+    Keeps each plot's last `periods` recorded months.
+    """
+    latest = store.groupby(["farm", "plot"], observed=True)["period"].transform("max")
+    return store[store["period"] > latest - periods]
+
+def grade_totals(store, periods=None, farms=None):
+    """
+    Total kg per method (rows) and (crop, grade) (columns), optionally over
+    each plot's last `periods` months and a subset of farms.
+    """
+    if farms is not None:
+        store = store[store.index.get_level_values("farm").isin(farms)]
+    if periods is not None:
+        store = last_periods(store, periods)
+    totals = store.groupby(["method", "crop", "grade"], observed=False)["kg"].sum()
+    return totals.unstack(["crop", "grade"]).reindex(index=list(METHODS), fill_value=0.0)
+
+def _per_method(store, column, by):
+    totals = store.groupby([*by, "method"], observed=False)[column].sum()
+    if not by:
+        return totals
+    return totals.unstack("method", fill_value=0.0)
+
+def method_totals(store, by=()):
+    """
+    Total kg per method: a Series, or with `by` (other columns or index
+    levels, e.g. by=("farm",)) a frame with one column per method.
+    """
+    return _per_method(store, "kg", list(by))
+
+def revenue(store, prices, by=()):
+    """
+    Revenue per method, split like method_totals(), with prices given per
+    (crop, grade).
+    """
+    # Map each row to its price through the (crop, grade) category codes
+    lookup = np.zeros((len(CROPS), len(GRADES)))
+    for (crop, grade), value in prices.items():
+        lookup[CROPS.index(crop), GRADES.index(grade)] = value
+    values = store["kg"].to_numpy() * lookup[store["crop"].cat.codes, store["grade"].cat.codes]
+    return _per_method(store.assign(revenue=values), "revenue", list(by))
+
+def monthly_totals(store):
+    """
+    Total kg per period (rows) and method (columns), with the calendar month
+    each period starts on for the conventional plots as a "month" column.
+    """
+    totals = store.groupby(["period", "method"], observed=True)["kg"].sum().unstack("method")
+    months = store.reset_index().groupby(["period", "method"], observed=True)["month"].min().unstack("method")
+    label = METHODS[0] if METHODS[0] in months else months.columns[0]
+    return totals.assign(month=months[label])
@@ -0,0 +1,277 @@
+from dataclasses import dataclass, replace
+from typing import NamedTuple, Optional
+import numpy as np
+
+# --- 1. COEFFICIENT TABLE ---
+
+@dataclass(frozen=True)
+class Coefficients:
+    """
+    Emission and characterisation factors used by the impact calculations.
+
+    Every field may be a float or a NumPy array. Arrays broadcast against the
+    scenario axes, so one call can evaluate many coefficient sets at once.
+
+    ef_n, ef_p:       emission factors applied to the N and P used.
+    cf_n, cf_p:       midpoint eutrophication characterisation factors.
+    cef_n, cef_p:     carbon emission factors (kg CO2eq per kg N / P).
+    c_uptake:         carbon uptake of the regenerative agent (kg CO2eq per kg).
+    p2o5_to_p:        mass fraction of P in P2O5 (62 / 142).
+    regen_n, regen_p: N and P mass fractions of the regenerative agent.
+    months:           applications per year.
+    """
+    ef_n: float = 1.33
+    ef_p: float = 0.05
+    cf_n: float = 0.158
+    cf_p: float = 0.100
+    cef_n: float = 3.7
+    cef_p: float = 3.1
+    c_uptake: float = -1.83
+    p2o5_to_p: float = 62 / 142
+    regen_n: float = 0.05
+    regen_p: float = 0.005
+    months: float = 12
+
+    def with_overrides(self, **overrides):
+        return replace(self, **overrides)
+
+DEFAULT_COEFFICIENTS = Coefficients()
+
+class Impact(NamedTuple):
+    """
+    Eutrophication potential (N and P) and carbon footprint. Each field is a
+    float for a single scenario or an array with one value per scenario.
+    """
+    ep_n: np.ndarray
+    ep_p: np.ndarray
+    cfp: np.ndarray
+
+# --- 2. INPUT PREPARATION ---
+
+def parse_grades(grades):
+    """
+    Converts "N-P-K" grade strings to an array of percentages with a trailing
+    axis of length 3. Each distinct grade is parsed once, however many
+    scenarios use it. Numeric input is passed through unchanged, so large
+    batches are fastest as an index into a parsed table of their grades.
+    """
+    grades = np.asarray(grades)
+    if grades.dtype.kind in "iuf":
+        return grades.astype(float)
+
+    unique, inverse = np.unique(grades, return_inverse=True)
+    parsed = np.array([[float(part) for part in grade.split("-")] for grade in unique])
+    return parsed[inverse.reshape(grades.shape)]
+
+def chemicals_to_arrays(chemicals):
+    """
+    Converts the dashboard's list of chemical dicts into (units, unit_weight,
+    grades) arrays with one entry per product.
+    """
+    units = np.array([chem["units"] for chem in chemicals], dtype=float)
+    unit_weight = np.array([chem["unit_weight"] for chem in chemicals], dtype=float)
+    grades = parse_grades([chem["unit_class"] for chem in chemicals])
+    return units, unit_weight, grades
+
+# --- 3. IMPACT CALCULATIONS ---
+
+def _impact_from_nutrients(n_used, p_used, coefficients):
+    ep_n = n_used * coefficients.ef_n * coefficients.cf_n
+    ep_p = p_used * coefficients.ef_p * coefficients.cf_p
+    return ep_n, ep_p
+
+def conventional_impact(units, unit_weight, grades, coefficients=DEFAULT_COEFFICIENTS):
+    """
+    Impact of a conventional fertiliser programme.
+
+    units and unit_weight have shape (..., products); grades has shape
+    (..., products) of "N-P-K" strings or (..., products, 3) of percentages.
+    Leading axes are scenarios and broadcast against each other, so a batch
+    of 100k programmes is one call. Products are summed over the last axis.
+    """
+    units = np.asarray(units, dtype=float)
+    unit_weight = np.asarray(unit_weight, dtype=float)
+    grades = parse_grades(grades)
+
+    total_mass = units * unit_weight
+    n_applied = (grades[..., 0] / 100 * total_mass).sum(axis=-1)
+    p_applied = (grades[..., 1] / 100 * coefficients.p2o5_to_p * total_mass).sum(axis=-1)
+
+    n_used = n_applied * coefficients.months
+    p_used = p_applied * coefficients.months
+    ep_n, ep_p = _impact_from_nutrients(n_used, p_used, coefficients)
+    cfp = coefficients.cef_n * n_used + coefficients.cef_p * p_used
+    return Impact(ep_n, ep_p, cfp)
+
+def regenerative_impact(units, unit_weight, coefficients=DEFAULT_COEFFICIENTS):
+    """
+    Impact of the regenerative agent. units and unit_weight may be scalars or
+    arrays with one value per scenario.
+    """
+    total_mass = np.asarray(units, dtype=float) * np.asarray(unit_weight, dtype=float)
+
+    n_used = coefficients.regen_n * total_mass * coefficients.months
+    p_used = coefficients.regen_p * total_mass * coefficients.months
+    ep_n, ep_p = _impact_from_nutrients(n_used, p_used, coefficients)
+    cfp = total_mass * coefficients.c_uptake * coefficients.months
+    return Impact(ep_n, ep_p, cfp)
+
+# --- 4. DICT-BASED HELPERS ---
+
+def calc_ep_conv(chemical_data, coefficients=DEFAULT_COEFFICIENTS):
+    """
+    Returns (EP_N, EP_P, CFP) as floats for a list of chemical dicts.
+    """
+    impact = conventional_impact(*chemicals_to_arrays(chemical_data), coefficients=coefficients)
+    return tuple(float(value) for value in impact)
+
+def calc_ep_regen(chemical_data, coefficients=DEFAULT_COEFFICIENTS):
+    """
+    Returns (EP_N, EP_P, CFP) as floats for the regenerative agent, which is
+    the first entry of chemical_data.
+    """
+    agent = chemical_data[0]
+    impact = regenerative_impact(agent["units"], agent["unit_weight"], coefficients=coefficients)
+    return tuple(float(value) for value in impact)
+
+# --- 5. MONTE CARLO ---
+
+@dataclass(frozen=True)
+class Distribution:
+    """
+    Sampling distribution for an uncertain coefficient.
+
+    kind:      "uniform", "triangular", "normal" or "lognormal".
+    low, high: range ends. For "normal" and "lognormal" they are read as the
+               2.5th and 97.5th percentiles, i.e. a 95% interval.
+    mode:      peak of a "triangular" distribution.
+    """
+    kind: str
+    low: float
+    high: float
+    mode: Optional[float] = None
+
+    def sample(self, rng, size):
+        if self.kind == "uniform":
+            return rng.uniform(self.low, self.high, size)
+        if self.kind == "triangular":
+            return rng.triangular(self.low, self.mode, self.high, size)
+        if self.kind == "normal":
+            return rng.normal((self.low + self.high) / 2, (self.high - self.low) / 3.92, size)
+        if self.kind == "lognormal":
+            log_low, log_high = np.log(self.low), np.log(self.high)
+            return rng.lognormal((log_low + log_high) / 2, (log_high - log_low) / 3.92, size)
+        raise ValueError(f"Unknown distribution '{self.kind}'.")
+
+# Illustrative ranges around the point values: a factor-of-three 95% interval
+# for the N emission factor, as for the IPCC N2O defaults, and ±20-50% on the
+# rest. Pass a different mapping to monte_carlo() to use other ranges; any
+# coefficient not listed keeps its point value.
+DEFAULT_UNCERTAINTY = {
+    "ef_n": Distribution("lognormal", 1.33 / 3, 1.33 * 3),
+    "ef_p": Distribution("triangular", 0.025, 0.075, mode=0.05),
+    "cf_n": Distribution("uniform", 0.126, 0.190),
+    "cf_p": Distribution("uniform", 0.080, 0.120),
+    "cef_n": Distribution("triangular", 2.6, 4.8, mode=3.7),
+    "cef_p": Distribution("triangular", 2.2, 4.0, mode=3.1),
+    "c_uptake": Distribution("uniform", -2.29, -1.37),
+}
+
+MC_PERCENTILES = (5, 25, 50, 75, 95)
+
+def _reduction_pct(conventional, regenerative):
+    safe = np.where(conventional > 0, conventional, 1.0)
+    return np.where(conventional > 0, (conventional - regenerative) / safe * 100, 0.0)
+
+MC_SERIES = ("conventional", "regenerative", "reduction")
+
+class _StreamingQuantiles:
+    """
+    Fixed-memory quantile estimate over values arriving in chunks.
+
+    The bin range is set from the first chunk, padded by half its spread on
+    each side; later values outside it are counted in under/overflow bins.
+    Quantiles are interpolated within a bin, so their error is a fraction of
+    (range / bins), far below the Monte Carlo error at 10^5+ draws.
+    """
+
+    def __init__(self, first_values, bins=4096):
+        self.bins = bins
+        self.min = float(first_values.min())
+        self.max = float(first_values.max())
+        pad = (self.max - self.min) / 2 or abs(self.min) * 1e-6 or 1e-12
+        self.low = self.min - pad
+        self.width = (self.max - self.min + 2 * pad) / bins
+        self.counts = np.zeros(bins + 2, dtype=np.int64)
+        self.total = 0
+        self.sum = 0.0
+
+    def add(self, values):
+        index = np.floor((values - self.low) / self.width).astype(np.int64) + 1
+        np.clip(index, 0, self.bins + 1, out=index)
+        self.counts += np.bincount(index, minlength=self.bins + 2)
+        self.total += values.size
+        self.sum += float(values.sum(dtype=np.float64))
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def quantile(self, q):
+        cdf = np.cumsum(self.counts)
+        target = q / 100 * self.total
+        b = int(np.searchsorted(cdf, target))
+        if b == 0:
+            return self.min
+        if b > self.bins:
+            return self.max
+        below = cdf[b - 1]
+        value = self.low + (b - 1 + (target - below) / self.counts[b]) * self.width
+        return min(max(value, self.min), self.max)
+
+def monte_carlo(conventional, regenerative, uncertainty=DEFAULT_UNCERTAINTY, draws=100_000,
+                seed=0, chunk_size=50_000, percentiles=MC_PERCENTILES, coefficients=DEFAULT_COEFFICIENTS):
+    """
+    Propagates coefficient uncertainty to the EP-N, EP-P and carbon footprint
+    of one conventional vs regenerative comparison.
+
+    conventional is a (units, unit_weight, grades) tuple, as returned by
+    chemicals_to_arrays(); regenerative is a (units, unit_weight) pair.
+    Coefficients are drawn chunk_size at a time from a generator seeded with
+    seed, so results are reproducible. Each chunk is folded into streaming
+    histograms and discarded, so memory does not grow with draws.
+
+    Returns {metric: {series: {percentile: value, ..., "mean": value}}} for
+    metric in ep_n/ep_p/cfp and series in conventional/regenerative/reduction
+    (the reduction is a percentage). A factor that scales both methods
+    equally cancels out of the reduction, so its band can be zero-width.
+    """
+    rng = np.random.default_rng(seed)
+    units, unit_weight, grades = conventional
+    grades = parse_grades(grades)
+    quantiles = {}
+
+    for start in range(0, draws, chunk_size):
+        size = min(chunk_size, draws - start)
+        # Sample in a fixed order so a seed always gives the same draws
+        samples = {name: uncertainty[name].sample(rng, size) for name in sorted(uncertainty)}
+        sampled = coefficients.with_overrides(**samples)
+        conv = conventional_impact(units, unit_weight, grades, coefficients=sampled)
+        regen = regenerative_impact(*regenerative, coefficients=sampled)
+        for name in Impact._fields:
+            conv_values = np.broadcast_to(getattr(conv, name), size)
+            regen_values = np.broadcast_to(getattr(regen, name), size)
+            chunk = zip(MC_SERIES, (conv_values, regen_values, _reduction_pct(conv_values, regen_values)))
+            for series, values in chunk:
+                if (name, series) not in quantiles:
+                    quantiles[name, series] = _StreamingQuantiles(values)
+                quantiles[name, series].add(values)
+
+    return {
+        name: {
+            series: dict(
+                {q: quantiles[name, series].quantile(q) for q in percentiles},
+                mean=quantiles[name, series].sum / quantiles[name, series].total,
+            )
+            for series in MC_SERIES
+        }
+        for name in Impact._fields
+    }
@@ -0,0 +1,160 @@
+import json
+import os
+
+import analytics_store
+import data_loader
+import harvest_store
+
+# --- 1. CONFIGURATION ---
+
+# The summary is written next to the Parquet frames and named after the
+# harvest data's content hash, so a new harvest export gets a new file.
+SUMMARY_DIR = data_loader.CACHE_DIR
+SUMMARY_PREFIX = "kpi_summary-"
+
+# Bump when the summary's layout changes so old files are rebuilt
+SUMMARY_FORMAT = 2
+
+# Reference prices (RM/kg) per (crop, grade) and monthly costs (RM) behind
+# the headline KPIs
+PRICES = {
+    ('nipis', 'A'): 8.21,
+    ('nipis', 'B'): 7.14,
+    ('kasturi', 'A'): 7.57,
+    ('kasturi', 'B'): 6.85,
+}
+MONTHLY_COST = {'conventional': 888.3, 'regenerative': 710.0}
+COST_MONTHS = 6
+
+# --- 2. BUILD ---
+
+def _pct_change(old, new):
+    return ((new - old) / old) * 100 if old > 0 else 0
+
+def build_summary():
+    """
+    Computes the headline KPIs and per-month yield rollups from the analytics
+    store, summed over every farm and plot. Returns a JSON-serialisable dict.
+    """
+    yields = analytics_store.method_totals()
+    revenues = analytics_store.revenue(PRICES)
+
+    totals = {}
+    for method in harvest_store.METHODS:
+        revenue = float(revenues[method])
+        totals[method] = {
+            'yield': float(yields[method]),
+            'revenue': revenue,
+            'gross_profit': revenue - MONTHLY_COST[method] * COST_MONTHS,
+        }
+
+    conv, regen = totals['conventional'], totals['regenerative']
+    kpis = {
+        'cost_reduction_pct': -_pct_change(MONTHLY_COST['conventional'], MONTHLY_COST['regenerative']),
+        'yield_increase_pct': _pct_change(conv['yield'], regen['yield']),
+        'revenue_increase_pct': _pct_change(conv['revenue'], regen['revenue']),
+        'gp_increase_pct': _pct_change(conv['gross_profit'], regen['gross_profit']),
+    }
+
+    # Periods line up each method's first, second, ... recorded month; they
+    # are labelled with the conventional plots' calendar month
+    periods = analytics_store.monthly_totals()
+    monthly = [
+        {'month': month.strftime('%B %Y'), 'conventional': float(c), 'regenerative': float(r)}
+        for month, c, r in zip(periods['month'], periods['conventional'], periods['regenerative'])
+    ]
+
+    return {
+        'format': SUMMARY_FORMAT,
+        'farms': int(analytics_store.query('SELECT COUNT(DISTINCT farm) AS farms FROM harvest')['farms'][0]),
+        'kpis': kpis,
+        'totals': totals,
+        'monthly': monthly,
+        'average_monthly_yield': {
+            'conventional': float(periods['conventional'].mean()),
+            'regenerative': float(periods['regenerative'].mean()),
+        },
+    }
+
+# --- 3. ARTEFACT ---
+
+# In-process copy, kept across Streamlit reruns like data_loader's frames
+_summary = None
+
+def summary_version():
+    """
+    Returns the content hash the summary is keyed on. Only the harvest
+    store feeds the KPIs, so edits to PlotData.xlsx do not rebuild it.
+    """
+    return harvest_store.version()
+
+def summary_path(version):
+    return os.path.join(SUMMARY_DIR, f"{SUMMARY_PREFIX}{version}.json")
+
+def _read_summary(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            summary = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return summary if summary.get("format") == SUMMARY_FORMAT else None
+
+def write_summary(version, summary):
+    """
+    Writes the summary atomically and removes summaries of older versions.
+    """
+    os.makedirs(SUMMARY_DIR, exist_ok=True)
+    path = summary_path(version)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    os.replace(tmp_path, path)
+
+    for filename in os.listdir(SUMMARY_DIR):
+        if filename.startswith(SUMMARY_PREFIX) and filename.endswith(".json") and filename != os.path.basename(path):
+            try:
+                os.remove(os.path.join(SUMMARY_DIR, filename))
+            except OSError:
+                pass
+
+def build():
+    """
+    Builds the summary for the current harvest store and writes it.
+    The aggregation runs in the analytics database, not over in-memory frames.
+    """
+    version = summary_version()
+    summary = dict(build_summary(), version=version)
+    try:
+        write_summary(version, summary)
+    except OSError as e:
+        print(f"Warning: could not write KPI summary: {e}")
+    return summary
+
+def load_summary():
+    """
+    Returns the KPI summary for the current data, from memory, then from the
+    JSON artefact, and only builds it from the harvest frame when neither
+    matches the workbook's content hash.
+    """
+    global _summary
+    version = summary_version()
+    if _summary is not None and _summary.get("version") == version:
+        return _summary
+
+    summary = _read_summary(summary_path(version))
+    if summary is None or summary.get("version") != version:
+        summary = build()
+    _summary = summary
+    return summary
+
+@data_loader.on_reload
+def clear_cache():
+    global _summary
+    _summary = None
+
+if __name__ == "__main__":
+    summary = build()
+    print(f"Wrote {summary_path(summary['version'])}")
+    for name, value in summary["kpis"].items():
+        print(f"  {name:<22}{value:>8.1f}%")
+    print(f"  {len(summary['monthly'])} months of yield rollups")
@@ -0,0 +1,245 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+import numpy as np
+
+# --- 1. CONFIGURATION ---
+
+# Written inside the vector store's directory by process_documents.py, next
+# to the Chroma files it indexes
+LEXICAL_DIR = "lexical"
+META_FILE = "meta.json"
+
+# Bump when the on-disk layout changes so old indexes are rebuilt
+INDEX_FORMAT = 1
+
+# Standard BM25 parameters: term-frequency saturation and length normalisation
+K1 = 1.5
+B = 0.75
+
+# Queries of at most this many words, all of them indexed and at least one of
+# them specific (see LexicalIndex.is_keyword_query), are treated as keyword
+# lookups and answered without a query embedding
+KEYWORD_MAX_TERMS = 3
+
+# A term is specific if it contains a digit, hyphen or dot ("15-15-15"), or
+# appears in at most this fraction of the chunks ("GNDVI", "Trichormus")
+KEYWORD_RARE_FRACTION = 0.02
+
+# Words that make a short query a question or an instruction rather than a
+# lookup. Interrogatives and auxiliaries are already in STOPWORDS.
+QUERY_VERBS = frozenset("""
+apply compare control define describe explain find get give grow help identify improve increase list make mean need
+prevent recommend reduce show suggest summarise summarize tell treat use work works
+""".split())
+
+# Words too common to identify a passage; they are not indexed
+STOPWORDS = frozenset("""
+a about all also an and any are as at be been but by can could did do does for from had has have how i if in into
+is it its may me more most my no not of on or our should so such than that the their them then there these they
+this those to was we were what when where which who why will with would you your
+""".split())
+
+# Keeps hyphenated and dotted terms such as "15-15-15" or "4.5" whole
+TOKEN_PATTERN = re.compile(r"\w+(?:[-.]\w+)*")
+
+# --- 2. TOKENISATION ---
+
+def tokenize(text, parts=True):
+    """
+    Lower-cased terms of a text, without stopwords. With parts=True a
+    hyphenated term also yields its pieces, so "neem-based" matches "neem".
+    """
+    terms = []
+    for term in TOKEN_PATTERN.findall(text.lower()):
+        if term in STOPWORDS:
+            continue
+        terms.append(term)
+        if parts and "-" in term:
+            terms.extend(piece for piece in term.split("-") if piece and piece not in STOPWORDS)
+    return terms
+
+# --- 3. BUILDING ---
+
+def index_directory(persist_directory):
+    return os.path.join(persist_directory, LEXICAL_DIR)
+
+def build(ids, texts, persist_directory):
+    """
+    Builds a BM25 index over the chunks and writes it under persist_directory.
+
+    Postings are stored term by term (offsets into flat document and score
+    arrays), as .npy files that searches memory-map rather than read. Each
+    build gets its own file names and meta.json is switched over last, so a
+    process searching the old index keeps a consistent view of it.
+    """
+    directory = index_directory(persist_directory)
+    os.makedirs(directory, exist_ok=True)
+
+    vocabulary = {}
+    term_ids, doc_ids, frequencies = [], [], []
+    lengths = np.zeros(len(texts), dtype=np.float32)
+    for doc, text in enumerate(texts):
+        counts = Counter(tokenize(text))
+        lengths[doc] = sum(counts.values())
+        for term, count in counts.items():
+            term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+            doc_ids.append(doc)
+            frequencies.append(count)
+
+    term_ids = np.asarray(term_ids, dtype=np.int64)
+    order = np.argsort(term_ids, kind="stable")
+    postings_docs = np.asarray(doc_ids, dtype=np.int32)[order]
+    tf = np.asarray(frequencies, dtype=np.float32)[order]
+    offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_ids, minlength=len(vocabulary)), out=offsets[1:])
+
+    # The whole BM25 term weight depends only on the posting, so it is
+    # computed once here and a search just adds up stored weights
+    n_docs = len(texts)
+    average_length = float(lengths.mean()) if n_docs else 0.0
+    document_frequency = np.diff(offsets).astype(np.float64)
+    idf = np.log1p((n_docs - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+    norms = K1 * (1 - B + B * lengths / average_length) if average_length else np.full(n_docs, K1, dtype=np.float32)
+    term_of_posting = np.repeat(np.arange(len(vocabulary)), np.diff(offsets))
+    weights = (idf[term_of_posting] * tf * (K1 + 1) / (tf + norms[postings_docs])).astype(np.float32)
+
+    generation = f"{time.time_ns():x}"
+    arrays = {"offsets": offsets, "docs": postings_docs, "weights": weights}
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, f"{name}-{generation}.npy"), array)
+    terms = sorted(vocabulary, key=vocabulary.get)
+    with open(os.path.join(directory, f"terms-{generation}.json"), "w", encoding="utf-8") as f:
+        json.dump({"terms": terms, "ids": list(ids)}, f)
+
+    meta = {"format": INDEX_FORMAT, "generation": generation, "documents": n_docs, "terms": len(terms),
+            "postings": int(offsets[-1]), "k1": K1, "b": B}
+    meta_path = os.path.join(directory, META_FILE)
+    with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(meta_path + ".tmp", meta_path)
+
+    # Earlier builds; open memory maps of them stay valid after the unlink
+    for filename in os.listdir(directory):
+        if filename != META_FILE and generation not in filename:
+            os.remove(os.path.join(directory, filename))
+    return meta
+
+# --- 4. SEARCHING ---
+
+class LexicalIndex:
+    """
+    A loaded BM25 index. The posting arrays are memory-mapped, so loading is
+    cheap and the operating system shares their pages between processes.
+    """
+
+    def __init__(self, directory, meta):
+        self.meta = meta
+        generation = meta["generation"]
+        self.offsets, self.docs, self.weights = (
+            np.load(os.path.join(directory, f"{name}-{generation}.npy"), mmap_mode="r")
+            for name in ("offsets", "docs", "weights")
+        )
+        with open(os.path.join(directory, f"terms-{generation}.json"), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.vocabulary = {term: i for i, term in enumerate(data["terms"])}
+        self.ids = data["ids"]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def is_keyword_query(self, query, max_terms=KEYWORD_MAX_TERMS):
+        """
+        True for short lookups of specific terms, such as "15-15-15", "GNDVI"
+        or "Trichormus variabilis", which BM25 alone answers well. Anything
+        phrased as a question or instruction ("What is regenerative farming?",
+        "Explain soil health") goes through fused retrieval, as does a query
+        made only of common terms ("neem oil").
+        """
+        if "?" in query:
+            return False
+        words = TOKEN_PATTERN.findall(query.lower())
+        if not 0 < len(words) <= max_terms:
+            return False
+        if any(word in STOPWORDS or word in QUERY_VERBS or word not in self.vocabulary for word in words):
+            return False
+        rare = max(1, KEYWORD_RARE_FRACTION * len(self.ids))
+        return any(
+            re.search(r"[\d.-]", word) or self._document_frequency(word) <= rare
+            for word in words
+        )
+
+    def _document_frequency(self, term):
+        index = self.vocabulary[term]
+        return int(self.offsets[index + 1] - self.offsets[index])
+
+    def search(self, query, k):
+        """
+        Returns up to k (chunk id, score) pairs, best first. Chunks sharing no
+        term with the query are never returned.
+        """
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in set(tokenize(query)):
+            index = self.vocabulary.get(term)
+            if index is None:
+                continue
+            start, end = self.offsets[index], self.offsets[index + 1]
+            # Each chunk appears at most once per term, so plain fancy-index += is safe
+            scores[self.docs[start:end]] += self.weights[start:end]
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(self.ids[doc], float(scores[doc])) for doc in matched]
+
+def _read_meta(directory):
+    try:
+        with open(os.path.join(directory, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return meta if meta.get("format") == INDEX_FORMAT else None
+
+# One loaded index per directory, swapped when process_documents.py rebuilds it
+_loaded = {}
+_load_lock = threading.Lock()
+
+def load(persist_directory):
+    """
+    Returns the current LexicalIndex for a vector store, or None if none has
+    been built. Costs one stat per call once loaded.
+    """
+    directory = index_directory(persist_directory)
+    try:
+        stamp = os.stat(os.path.join(directory, META_FILE)).st_mtime_ns
+    except OSError:
+        return None
+    cached = _loaded.get(directory)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    with _load_lock:
+        cached = _loaded.get(directory)
+        if cached is None or cached[0] != stamp:
+            meta = _read_meta(directory)
+            if meta is None:
+                return None
+            try:
+                cached = (stamp, LexicalIndex(directory, meta))
+            except FileNotFoundError:
+                # Replaced by a newer build between reading meta.json and the arrays
+                return None
+            _loaded[directory] = cached
+    return cached[1]
+
+def is_keyword_query(query, persist_directory):
+    """
+    Whether a query will be answered by the lexical fast path, i.e. without
+    a query embedding. False when no lexical index has been built.
+    """
+    index = load(persist_directory)
+    return index is not None and index.is_keyword_query(query)
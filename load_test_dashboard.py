@@ -0,0 +1,188 @@
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+# --- 1. CONFIGURATION ---
+
+DASHBOARD = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dashboard.py")
+PAGE_RADIO_LABEL = "Choose a page"
+SERVER_START_TIMEOUT = 60
+
+# --- 2. SERVER ---
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(port):
+    """
+    Starts `streamlit run dashboard.py` headless and waits for its health check.
+    """
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "streamlit", "run", DASHBOARD,
+            "--server.headless", "true",
+            "--server.port", str(port),
+            "--server.address", "127.0.0.1",
+            "--server.enableXsrfProtection", "false",
+            "--browser.gatherUsageStats", "false",
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("The Streamlit server did not start.")
+
+def rss_mb(pid):
+    """
+    Resident memory of a process in MB, read from /proc (Linux only).
+    """
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+# --- 3. SESSIONS ---
+
+class Session:
+    """
+    One browser tab, speaking Streamlit's websocket protocol: each rerun
+    sends the widget states and waits for the server's script_finished.
+    """
+
+    def __init__(self, port):
+        self.url = f"ws://127.0.0.1:{port}/_stcore/stream"
+        self.websocket = None
+        self.page_radio_id = None
+        self.errors = []
+
+    async def connect(self):
+        self.websocket = await websockets.connect(self.url, subprotocols=["streamlit"], max_size=None)
+
+    async def rerun(self, page=None):
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.page_script_hash = ""
+        if page is not None and self.page_radio_id is not None:
+            state = message.rerun_script.widget_states.widgets.add()
+            state.id = self.page_radio_id
+            state.string_value = page
+
+        start = time.perf_counter()
+        await self.websocket.send(message.SerializeToString())
+        while True:
+            forward = ForwardMsg.FromString(await self.websocket.recv())
+            kind = forward.WhichOneof("type")
+            if kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                element = forward.delta.new_element
+                if element.WhichOneof("type") == "radio" and element.radio.label == PAGE_RADIO_LABEL:
+                    self.page_radio_id = element.radio.id
+                elif element.WhichOneof("type") == "exception":
+                    self.errors.append(f"{page or 'first run'}: {element.exception.message}")
+            elif kind == "script_finished":
+                if forward.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    continue
+                return (time.perf_counter() - start) * 1000
+
+    async def close(self):
+        await self.websocket.close()
+
+async def run_sessions(port, sessions, reruns, pages):
+    clients = [Session(port) for _ in range(sessions)]
+    await asyncio.gather(*(client.connect() for client in clients))
+    first_runs = await asyncio.gather(*(client.rerun() for client in clients))
+    for client in clients:
+        if client.page_radio_id is None:
+            client.errors.append(f"No '{PAGE_RADIO_LABEL}' radio found; page switches were not sent.")
+
+    async def interact(client):
+        latencies = []
+        for i in range(reruns):
+            latencies.append(await client.rerun(pages[i % len(pages)]))
+        return latencies
+
+    latencies = [ms for result in await asyncio.gather(*(interact(client) for client in clients)) for ms in result]
+    return clients, first_runs, latencies
+
+# --- 4. REPORT ---
+
+def main():
+    parser = argparse.ArgumentParser(description="Open N concurrent dashboard sessions and report memory and rerun latency.")
+    parser.add_argument("--sessions", type=int, default=10, help="Number of concurrent sessions.")
+    parser.add_argument("--reruns", type=int, default=20, help="Interactions per session after the first run.")
+    parser.add_argument("--pages", default="Dashboard Overview,Simulations", help="Comma-separated pages to cycle through.")
+    parser.add_argument("--port", type=int, default=None, help="Port for the test server (default: a free port).")
+    args = parser.parse_args()
+    pages = [page.strip() for page in args.pages.split(",") if page.strip()]
+
+    port = args.port or _free_port()
+    server = start_server(port)
+    try:
+        idle = rss_mb(server.pid)
+
+        # One session first, so the shared caches are warm as on a live server
+        asyncio.run(run_sessions(port, 1, len(pages), pages))
+        warm = rss_mb(server.pid)
+
+        start = time.perf_counter()
+        clients, first_runs, latencies = asyncio.run(run_sessions(port, args.sessions, args.reruns, pages))
+        elapsed = time.perf_counter() - start
+        loaded = rss_mb(server.pid)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    print(f"{args.sessions} sessions x {args.reruns} reruns over {', '.join(pages)} in {elapsed:.1f}s")
+    if idle is not None:
+        print(f"\n{'Server resident memory':<32}{'MB':>10}")
+        print(f"{'idle':<32}{idle:>10.1f}")
+        print(f"{'after one warm-up session':<32}{warm:>10.1f}")
+        print(f"{f'after {args.sessions} sessions':<32}{loaded:>10.1f}")
+        print(f"{'per additional session':<32}{(loaded - warm) / args.sessions:>10.1f}")
+
+    print(f"\n{'Latency':<32}{'ms':>10}")
+    print(f"{'first run (p95)':<32}{percentile(first_runs, 95):>10.1f}")
+    for label, value in [
+        ("rerun p50", percentile(latencies, 50)),
+        ("rerun p95", percentile(latencies, 95)),
+        ("rerun max", max(latencies)),
+        ("rerun mean", statistics.mean(latencies)),
+    ]:
+        print(f"{label:<32}{value:>10.1f}")
+
+    errors = [error for client in clients for error in client.errors]
+    if errors:
+        print(f"\n{len(errors)} errors:")
+        for error in errors[:10]:
+            print(f"  {error}")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
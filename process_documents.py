@@ -1,22 +1,31 @@
+import argparse
+import hashlib
+import json
 import os
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import numpy as np
 from dotenv import load_dotenv
 import langchain
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain.document_loaders import PyPDFLoader, Docx2txtLoader, UnstructuredExcelLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.vectorstores import Chroma
 from langchain_community.vectorstores.utils import filter_complex_metadata
 
+import lexical_index
+from embedding_backends import make_embeddings, model_name
+from rag_pipeline import write_index_version
+
 # --- 1. SET UP YOUR ENVIRONMENT ---
 
 # Load environment variables from a .env file (recommended)
 load_dotenv()
 
-# Ensure your GOOGLE_API_KEY is set in your environment or a .env file
+# The Google embedding backend needs GOOGLE_API_KEY in your environment or a .env file
 # You can get your key from Google AI Studio: https://aistudio.google.com/
-api_key = os.getenv("GOOGLE_API_KEY")
-if not api_key:
-    raise ValueError("GOOGLE_API_KEY not found. Please set it in your environment or a .env file.")
+# (checked in embedding_backends.make_embeddings)
 
 # --- 2. CONFIGURE DOCUMENT LOADING AND PROCESSING ---
 
@@ -29,10 +38,80 @@ PERSIST_DIRECTORY = "chroma_db"
 # Configure the text splitter for chunking documents
 # chunk_size: The maximum number of characters in a chunk.
 # chunk_overlap: The number of characters to overlap between chunks to maintain context.
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+# bench_retrieval.py measures how changing these affects retrieval.
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+# Number of worker processes used to parse files concurrently.
+# PDF and Excel parsing is CPU-bound, so this is capped by the core count.
+MAX_LOAD_WORKERS = int(os.getenv("MAX_LOAD_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Embedding stage: chunks per embedding request, concurrent requests in
+# flight, retry budget, and an optional client-side rate limit.
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+EMBED_REQUESTS_PER_MINUTE = float(os.getenv("EMBED_REQUESTS_PER_MINUTE", "0"))  # 0 = unlimited
+
+# Finished embedding batches are saved here so an interrupted run resumes
+# without paying for them again. Cleared after a successful run.
+CHECKPOINT_DIR = os.path.join(PERSIST_DIRECTORY, ".embedding_checkpoints")
 
 # --- 3. LOAD AND PROCESS THE DOCUMENTS ---
 
+def load_file(file_path):
+    """
+    Loads a single .pdf, .docx or .xlsx file.
+    Returns None for unsupported file types.
+    """
+    filename = os.path.basename(file_path)
+    if filename.endswith(".pdf"):
+        loader = PyPDFLoader(file_path)
+    elif filename.endswith(".docx"):
+        loader = Docx2txtLoader(file_path)
+    elif filename.endswith(".xlsx"):
+        # Using UnstructuredExcelLoader for its robustness with various Excel formats
+        loader = UnstructuredExcelLoader(file_path, mode="elements")
+    else:
+        return None
+    return loader.load()
+
+def _load_file_timed(file_path):
+    """
+    Worker-process entry point: loads one file and reports how long it took.
+    Errors are returned rather than raised so one bad file cannot take the
+    rest of the batch down with it.
+    """
+    start = time.perf_counter()
+    try:
+        docs = load_file(file_path)
+        error = None
+    except Exception as e:
+        docs = None
+        error = f"{type(e).__name__}: {e}"
+    return file_path, docs, time.perf_counter() - start, error
+
+def iter_loaded_files(file_paths, max_workers=MAX_LOAD_WORKERS):
+    """
+    Parses files in a bounded process pool and yields
+    (file_path, docs, seconds, error) as each file finishes, so callers can
+    start splitting and indexing before the slowest file is done.
+    """
+    if max_workers <= 1 or len(file_paths) <= 1:
+        for file_path in file_paths:
+            yield _load_file_timed(file_path)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(file_paths))) as executor:
+        futures = {executor.submit(_load_file_timed, file_path): file_path for file_path in file_paths}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                # The worker itself died (e.g. a parser crashed the process)
+                yield futures[future], None, 0.0, f"{type(e).__name__}: {e}"
+
 def load_documents(source_dir):
     """
     Loads all documents from the source directory, supporting .pdf, .docx, and .xlsx files.
@@ -44,71 +123,318 @@ def load_documents(source_dir):
         print(f"Error: Directory '{source_dir}' not found.")
         return []
 
-    for filename in os.listdir(source_dir):
-        file_path = os.path.join(source_dir, filename)
-        try:
-            if filename.endswith(".pdf"):
-                loader = PyPDFLoader(file_path)
-                docs = loader.load()
-            elif filename.endswith(".docx"):
-                loader = Docx2txtLoader(file_path)
-                docs = loader.load()
-            elif filename.endswith(".xlsx"):
-                # Using UnstructuredExcelLoader for its robustness with various Excel formats
-                loader = UnstructuredExcelLoader(file_path, mode="elements")
-                docs = loader.load()
-            else:
-                print(f"Skipping unsupported file type: {filename}")
-                continue
-
-            print(f"-> Loaded {len(docs)} document(s) from {filename}")
+    file_paths = [os.path.join(source_dir, filename) for filename in sorted(os.listdir(source_dir))]
+    for file_path, docs, seconds, error in iter_loaded_files(file_paths):
+        filename = os.path.basename(file_path)
+        if error is not None:
+            print(f"Error loading file {filename}: {error}")
+        elif docs is None:
+            print(f"Skipping unsupported file type: {filename}")
+        else:
+            print(f"-> Loaded {len(docs)} document(s) from {filename} in {seconds:.2f}s")
             all_docs.extend(docs)
-        except Exception as e:
-            print(f"Error loading file {filename}: {e}")
 
     return all_docs
 
-def main():
+# --- 4. EMBEDDING STAGE ---
+
+class RateLimiter:
     """
-    Main function to run the document processing and indexing pipeline.
+    Spaces out requests so no more than requests_per_minute are started.
     """
-    # Load the documents from the source directory
-    documents = load_documents(SOURCE_DOCUMENTS_DIR)
+    def __init__(self, requests_per_minute):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
 
-    if not documents:
-        print("No documents were loaded. Please check your source directory and file formats.")
-        return
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+def _checkpoint_path(model, batch_ids):
+    # Keyed by the model too: checkpoints outlive runs with failed files, and
+    # a batch embedded by another backend or model must not be reused
+    digest = hashlib.sha256("\n".join([model, *batch_ids]).encode("utf-8")).hexdigest()
+    return os.path.join(CHECKPOINT_DIR, f"{digest[:32]}.npy")
+
+def _embed_batch(embeddings, texts, rate_limiter, max_retries):
+    """
+    Embeds one batch, retrying transient failures (rate limits, timeouts)
+    with exponential backoff and jitter.
+    """
+    for attempt in range(max_retries + 1):
+        rate_limiter.wait()
+        try:
+            return embeddings.embed_documents(texts)
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = min(60.0, 2 ** attempt) * (0.5 + random.random())
+            print(f"   Embedding request failed ({type(e).__name__}: {e}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+def embed_chunks(embeddings, ids, texts, batch_size=EMBED_BATCH_SIZE, max_concurrency=EMBED_MAX_CONCURRENCY,
+                 max_retries=EMBED_MAX_RETRIES, requests_per_minute=EMBED_REQUESTS_PER_MINUTE):
+    """
+    Embeds texts in batches with bounded concurrency and returns one vector
+    per text. Each finished batch is checkpointed to disk, keyed by the model
+    and its chunk ids, so re-running after an interruption only embeds the
+    missing batches.
+    """
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    model = model_name(embeddings)
+    batches = [(ids[i:i + batch_size], texts[i:i + batch_size]) for i in range(0, len(ids), batch_size)]
+    vectors = [None] * len(batches)
+    pending = []
+    for index, (batch_ids, _) in enumerate(batches):
+        path = _checkpoint_path(model, batch_ids)
+        if os.path.exists(path):
+            vectors[index] = np.load(path)
+        else:
+            pending.append(index)
+
+    if len(pending) < len(batches):
+        print(f"   Resumed {len(batches) - len(pending)} checkpointed batch(es)")
+
+    rate_limiter = RateLimiter(requests_per_minute)
+
+    def run(index):
+        batch_ids, batch_texts = batches[index]
+        result = np.asarray(_embed_batch(embeddings, batch_texts, rate_limiter, max_retries), dtype=np.float32)
+        path = _checkpoint_path(model, batch_ids)
+        np.save(path + ".tmp.npy", result)
+        os.replace(path + ".tmp.npy", path)
+        return index, result
 
-    # Split the loaded documents into chunks
-    print("\nSplitting documents into chunks...")
-    texts = text_splitter.split_documents(documents)
-    print(f"Split into {len(texts)} chunks.")
-    
-    # --- IMPORTANT FIX: Filter out complex metadata before adding to ChromaDB ---
-    # This resolves the ValueError you encountered.
-    texts = filter_complex_metadata(texts)
-
-    # --- 4. CREATE EMBEDDINGS AND STORE IN VECTOR DATABASE ---
-
-    # Initialize the Google Generative AI embedding model
-    print("\nInitializing embedding model...")
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
-
-    # Create or load the Chroma vector store
-    # This will save the database to the PERSIST_DIRECTORY for reuse.
-    print(f"\nCreating/loading vector store at: {PERSIST_DIRECTORY}")
-    db = Chroma.from_documents(
-        texts,
-        embeddings,
-        persist_directory=PERSIST_DIRECTORY
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        for index, result in executor.map(run, pending):
+            vectors[index] = result
+
+    return [vector.tolist() for batch in vectors for vector in batch]
+
+def clear_checkpoints():
+    if os.path.isdir(CHECKPOINT_DIR):
+        for filename in os.listdir(CHECKPOINT_DIR):
+            os.remove(os.path.join(CHECKPOINT_DIR, filename))
+        os.rmdir(CHECKPOINT_DIR)
+
+def add_chunks(db, embeddings, ids, chunks, **embed_options):
+    """
+    Embeds chunks through the explicit embedding stage and writes the vectors
+    to the Chroma collection.
+    """
+    texts = [chunk.page_content for chunk in chunks]
+    vectors = embed_chunks(embeddings, ids, texts, **embed_options)
+    db._collection.upsert(
+        ids=ids,
+        embeddings=vectors,
+        documents=texts,
+        metadatas=[chunk.metadata for chunk in chunks],
     )
 
-    # Persist the database to disk
-    db.persist()
+# --- 5. INDEX MANIFEST ---
+
+# Records, per source file, the file's content hash and the ids of the chunks
+# it produced. Chunk ids are hashes of the chunk's source, page and text, so an
+# unchanged chunk keeps its id (and its vector) across runs.
+MANIFEST_FILE = os.path.join(PERSIST_DIRECTORY, "index_manifest.json")
+
+def load_manifest():
+    try:
+        with open(MANIFEST_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def save_manifest(manifest):
+    os.makedirs(PERSIST_DIRECTORY, exist_ok=True)
+    with open(MANIFEST_FILE + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(MANIFEST_FILE + ".tmp", MANIFEST_FILE)
+
+def hash_file(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chunk_ids(chunks):
+    """
+    Returns a content-derived id for each chunk. Identical chunks within the
+    same file get a numeric suffix so ids stay unique.
+    """
+    ids = []
+    seen = {}
+    for chunk in chunks:
+        key = "\x1f".join([
+            str(chunk.metadata.get("source", "")),
+            str(chunk.metadata.get("page", "")),
+            chunk.page_content,
+        ])
+        chunk_hash = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        seen[chunk_hash] = seen.get(chunk_hash, -1) + 1
+        ids.append(chunk_hash if seen[chunk_hash] == 0 else f"{chunk_hash}-{seen[chunk_hash]}")
+    return ids
+
+def build_lexical_index(db):
+    """
+    Rebuilds the BM25 index from every chunk in the vector store, so it also
+    covers files that were unchanged in this run.
+    """
+    start = time.perf_counter()
+    stored = db._collection.get(include=["documents"])
+    meta = lexical_index.build(stored["ids"], stored["documents"], PERSIST_DIRECTORY)
+    print(f"Lexical index: {meta['documents']} chunks, {meta['terms']} terms "
+          f"in {time.perf_counter() - start:.2f}s")
+
+def main(embedding_backend=None, **embed_options):
+    """
+    Main function to run the document processing and indexing pipeline.
+    Only new or changed chunks are embedded; vectors of unchanged chunks are
+    left in place and vectors of removed files are deleted.
+    """
+    if not os.path.exists(SOURCE_DOCUMENTS_DIR):
+        print(f"Error: Directory '{SOURCE_DOCUMENTS_DIR}' not found.")
+        return
+
+    # Initialize the embedding model (Google by default, see embedding_backends.py)
+    print("Initializing embedding model...")
+    embeddings = make_embeddings(embedding_backend)
+
+    # Load (or create) the persistent vector store
+    print(f"Loading vector store at: {PERSIST_DIRECTORY}")
+    db = Chroma(persist_directory=PERSIST_DIRECTORY, embedding_function=embeddings)
+
+    manifest = load_manifest()
+    if manifest is None:
+        # A store built before the manifest existed has random chunk ids that
+        # cannot be matched, so start it over.
+        if db._collection.count() > 0:
+            print("No index manifest found; rebuilding the vector store from scratch.")
+            db.delete_collection()
+            db = Chroma(persist_directory=PERSIST_DIRECTORY, embedding_function=embeddings)
+        manifest = {"files": {}}
+
+    summary = {"embedded": 0, "skipped": 0, "deleted": 0, "failed_files": 0}
+    current_files = set()
+
+    print(f"\nIndexing documents from: {SOURCE_DOCUMENTS_DIR}")
+    to_load = {}
+    for filename in sorted(os.listdir(SOURCE_DOCUMENTS_DIR)):
+        file_path = os.path.join(SOURCE_DOCUMENTS_DIR, filename)
+        if not os.path.isfile(file_path):
+            continue
+        file_hash = hash_file(file_path)
+        entry = manifest["files"].get(filename)
+
+        if entry is not None and entry["sha256"] == file_hash:
+            current_files.add(filename)
+            summary["skipped"] += len(entry["chunk_ids"])
+            print(f"-> Unchanged: {filename} ({len(entry['chunk_ids'])} chunks)")
+            continue
+        to_load[file_path] = (filename, file_hash, entry)
+
+    if to_load:
+        print(f"\nParsing {len(to_load)} file(s) with up to {MAX_LOAD_WORKERS} worker(s)...")
+
+    # Files are split and indexed as soon as each one finishes parsing
+    for file_path, docs, seconds, error in iter_loaded_files(list(to_load)):
+        filename, file_hash, entry = to_load[file_path]
+        if error is not None:
+            print(f"Error loading file {filename} after {seconds:.2f}s: {error}")
+            summary["failed_files"] += 1
+            # Keep the previous vectors rather than dropping the file
+            if entry is not None:
+                current_files.add(filename)
+            continue
+        if docs is None:
+            print(f"Skipping unsupported file type: {filename}")
+            continue
+        current_files.add(filename)
+
+        # Split the loaded documents into chunks
+        # --- IMPORTANT FIX: Filter out complex metadata before adding to ChromaDB ---
+        chunks = filter_complex_metadata(text_splitter.split_documents(docs))
+        ids = chunk_ids(chunks)
+
+        old_ids = set(entry["chunk_ids"]) if entry is not None else set()
+        new_chunks = [(chunk_id, chunk) for chunk_id, chunk in zip(ids, chunks) if chunk_id not in old_ids]
+        stale_ids = sorted(old_ids - set(ids))
+
+        if stale_ids:
+            db.delete(ids=stale_ids)
+        if new_chunks:
+            add_chunks(
+                db, embeddings,
+                [chunk_id for chunk_id, _ in new_chunks],
+                [chunk for _, chunk in new_chunks],
+                **embed_options
+            )
+
+        summary["embedded"] += len(new_chunks)
+        summary["skipped"] += len(ids) - len(new_chunks)
+        summary["deleted"] += len(stale_ids)
+        manifest["files"][filename] = {"sha256": file_hash, "chunk_ids": ids}
+        print(f"-> {filename}: parsed in {seconds:.2f}s, {len(new_chunks)} embedded, "
+              f"{len(ids) - len(new_chunks)} unchanged, {len(stale_ids)} deleted")
+
+        # Save progress after every file so an interrupted run can resume
+        save_manifest(manifest)
+
+    # Delete vectors of files that were removed from the source directory
+    for filename in sorted(set(manifest["files"]) - current_files):
+        removed_ids = manifest["files"].pop(filename)["chunk_ids"]
+        if removed_ids:
+            db.delete(ids=removed_ids)
+        summary["deleted"] += len(removed_ids)
+        print(f"-> Removed: {filename} ({len(removed_ids)} chunks deleted)")
+
+    # Persist the database to disk (newer Chroma versions persist automatically)
+    if hasattr(db, "persist"):
+        db.persist()
+    save_manifest(manifest)
+    if not summary["failed_files"]:
+        clear_checkpoints()
+
+    changed = summary["embedded"] or summary["deleted"]
+    if changed or lexical_index.load(PERSIST_DIRECTORY) is None:
+        build_lexical_index(db)
+
+    if changed:
+        # Mark the new index version so cached chatbot answers are invalidated
+        write_index_version(PERSIST_DIRECTORY)
+
     print("\n--- Processing Complete ---")
-    print(f"The knowledge base has been created and saved to '{PERSIST_DIRECTORY}'.")
-    print("You can now use this database in your chatbot application for retrieval.")
+    print(f"Embedded: {summary['embedded']} chunks")
+    print(f"Skipped (unchanged): {summary['skipped']} chunks")
+    print(f"Deleted: {summary['deleted']} chunks")
+    if hasattr(embeddings, "cache"):
+        cache = embeddings.cache.snapshot()
+        print(f"Embedding cache: {cache['hits']} hits, {cache['misses']} misses ({cache['entries']} stored)")
+    if summary["failed_files"]:
+        print(f"Files that failed to load: {summary['failed_files']}")
+    print(f"The knowledge base is saved in '{PERSIST_DIRECTORY}'.")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Build or update the chroma_db knowledge base.")
+    parser.add_argument("--embedding-backend", choices=["google", "fake"], default=None,
+                        help="Embedding backend (defaults to EMBEDDING_BACKEND or 'google').")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="Chunks per embedding request.")
+    parser.add_argument("--max-concurrency", type=int, default=EMBED_MAX_CONCURRENCY, help="Embedding requests in flight.")
+    parser.add_argument("--requests-per-minute", type=float, default=EMBED_REQUESTS_PER_MINUTE,
+                        help="Client-side cap on embedding requests (0 = unlimited).")
+    args = parser.parse_args()
+    main(
+        embedding_backend=args.embedding_backend,
+        batch_size=args.batch_size,
+        max_concurrency=args.max_concurrency,
+        requests_per_minute=args.requests_per_minute,
+    )
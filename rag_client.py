@@ -0,0 +1,223 @@
+import json
+import os
+import time
+import httpx
+import requests
+
+# --- 1. CONFIGURATION ---
+
+# Where rag_service.py listens. The CLI, the Flask API and the dashboard all
+# talk to this one worker instead of building their own RAG pipeline.
+RAG_SERVICE_HOST = os.getenv("RAG_SERVICE_HOST", "127.0.0.1")
+RAG_SERVICE_PORT = int(os.getenv("RAG_SERVICE_PORT", "5001"))
+RAG_SERVICE_URL = os.getenv("RAG_SERVICE_URL", f"http://{RAG_SERVICE_HOST}:{RAG_SERVICE_PORT}")
+
+# Generation can take a while; connecting should not
+CONNECT_TIMEOUT = 2
+QUERY_TIMEOUT = 120
+
+# One keep-alive session per process
+_session = requests.Session()
+
+class RAGServiceError(Exception):
+    """
+    Raised when the RAG service is unreachable or returns an error.
+    status_code is None when the service could not be reached at all.
+    """
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+# --- 2. CLIENT FUNCTIONS ---
+
+def health(timeout=CONNECT_TIMEOUT):
+    """
+    Returns the service's /health payload, or None if it is not running.
+    """
+    try:
+        response = _session.get(f"{RAG_SERVICE_URL}/health", timeout=timeout)
+        return response.json()
+    except (requests.exceptions.RequestException, ValueError):
+        return None
+
+def is_ready(timeout=CONNECT_TIMEOUT):
+    try:
+        return _session.get(f"{RAG_SERVICE_URL}/ready", timeout=timeout).status_code == 200
+    except requests.exceptions.RequestException:
+        return False
+
+def wait_until_ready(timeout=60, poll_interval=0.5):
+    """
+    Blocks until the service reports ready. Returns False on timeout.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if is_ready():
+            return True
+        time.sleep(poll_interval)
+    return False
+
+def _post(path, payload, timeout):
+    try:
+        response = _session.post(
+            f"{RAG_SERVICE_URL}{path}",
+            json=payload,
+            timeout=(CONNECT_TIMEOUT, timeout),
+        )
+    except requests.exceptions.ConnectionError:
+        raise RAGServiceError(
+            f"Could not connect to the RAG service at {RAG_SERVICE_URL}. "
+            "Please start it with 'python rag_service.py'."
+        )
+    except requests.exceptions.Timeout:
+        raise RAGServiceError("The RAG service timed out.", status_code=504)
+    return _json_body(response.status_code, response.text)
+
+def embed(text, timeout=30):
+    """
+    Returns the service's query embedding for a piece of text.
+    """
+    return _post("/embed", {"text": text}, timeout)["embedding"]
+
+def ask(question, embedding=None, timeout=QUERY_TIMEOUT):
+    """
+    Sends a question to the service and returns {"answer": ..., "sources": [...]}.
+    Pass a precomputed query embedding to skip re-embedding the question.
+    """
+    payload = {"question": question}
+    if embedding is not None:
+        payload["embedding"] = list(embedding)
+    return _post("/query", payload, timeout)
+
+# --- 3. ASYNC CLIENT ---
+
+class AsyncRAGClient:
+    """
+    Non-blocking client for the async chatbot API. Create it inside the
+    running event loop and close it with aclose() on shutdown.
+    """
+
+    def __init__(self, base_url=RAG_SERVICE_URL, max_connections=100):
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(QUERY_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=max_connections),
+        )
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def health(self, timeout=CONNECT_TIMEOUT):
+        try:
+            response = await self._client.get("/health", timeout=timeout)
+            return response.json()
+        except (httpx.HTTPError, ValueError):
+            return None
+
+    async def _post(self, path, payload, timeout):
+        try:
+            response = await self._client.post(path, json=payload, timeout=httpx.Timeout(timeout, connect=CONNECT_TIMEOUT))
+        except httpx.ConnectError:
+            raise RAGServiceError(
+                f"Could not connect to the RAG service at {RAG_SERVICE_URL}. "
+                "Please start it with 'python rag_service.py'."
+            )
+        except httpx.TimeoutException:
+            raise RAGServiceError("The RAG service timed out.", status_code=504)
+        return _json_body(response.status_code, response.text)
+
+    async def embed(self, text, timeout=30):
+        return (await self._post("/embed", {"text": text}, timeout))["embedding"]
+
+    async def ask(self, question, embedding=None, timeout=QUERY_TIMEOUT):
+        payload = {"question": question}
+        if embedding is not None:
+            payload["embedding"] = list(embedding)
+        return await self._post("/query", payload, timeout)
+
+    async def embed_batch(self, texts, timeout=30):
+        return (await self._post("/embed/batch", {"texts": list(texts)}, timeout))["embeddings"]
+
+    async def ask_batch(self, items, timeout=QUERY_TIMEOUT):
+        """
+        Answers (question, embedding) pairs in one request. Returns a result
+        dict per question, or a RAGServiceError for each question that failed.
+        Each result carries the service's stage timings for the whole batch.
+        """
+        payload = {"questions": [
+            {"question": question} if embedding is None else {"question": question, "embedding": list(embedding)}
+            for question, embedding in items
+        ]}
+        body = await self._post("/query/batch", payload, timeout)
+        timings = body.get("timings")
+        return [
+            RAGServiceError(result["error"], status_code=500) if "error" in result else dict(result, timings=timings)
+            for result in body["results"]
+        ]
+
+    async def retrieve_batch(self, items, timeout=QUERY_TIMEOUT):
+        """
+        Retrieves the context for (question, embedding) pairs in one request.
+        Returns a {"context", "sources"} dict per question, each carrying the
+        service's stage timings for the whole batch.
+        """
+        payload = {"questions": [
+            {"question": question} if embedding is None else {"question": question, "embedding": list(embedding)}
+            for question, embedding in items
+        ]}
+        body = await self._post("/retrieve/batch", payload, timeout)
+        return [dict(result, timings=body.get("timings")) for result in body["results"]]
+
+    async def stream(self, question, embedding=None, timings=False, context=None, sources=None):
+        """
+        Yields the events of /query/stream as dicts. Connection and HTTP
+        errors are raised as RAGServiceError before the first event; errors
+        reported mid-stream, and a stream that breaks off, arrive as
+        {"type": "error"} events. With timings=True the "done" event carries
+        the service's stage timings. A context from retrieve_batch() skips
+        retrieval on the service.
+        """
+        payload = {"question": question}
+        if embedding is not None:
+            payload["embedding"] = list(embedding)
+        if timings:
+            payload["timings"] = True
+        if context is not None:
+            payload["context"] = context
+            payload["sources"] = sources or []
+        request = self._client.build_request("POST", "/query/stream", json=payload)
+        try:
+            response = await self._client.send(request, stream=True)
+        except httpx.ConnectError:
+            raise RAGServiceError(
+                f"Could not connect to the RAG service at {RAG_SERVICE_URL}. "
+                "Please start it with 'python rag_service.py'."
+            )
+        except httpx.TimeoutException:
+            raise RAGServiceError("The RAG service timed out.", status_code=504)
+
+        try:
+            if response.status_code != 200:
+                await response.aread()
+                _json_body(response.status_code, response.text)
+            async for line in response.aiter_lines():
+                if line:
+                    yield json.loads(line)
+        except httpx.TimeoutException:
+            yield {"type": "error", "error": "The RAG service timed out."}
+        except httpx.HTTPError as e:
+            # Connection reset or protocol error mid-stream
+            yield {"type": "error", "error": f"The RAG service stream failed: {type(e).__name__}: {e}"}
+        except ValueError:
+            yield {"type": "error", "error": "The RAG service sent a malformed stream line."}
+        finally:
+            await response.aclose()
+
+def _json_body(status_code, text):
+    try:
+        body = json.loads(text)
+    except ValueError:
+        body = {"error": text}
+    if status_code != 200:
+        raise RAGServiceError(body.get("error", "Unknown error."), status_code=status_code)
+    return body
@@ -0,0 +1,351 @@
+import os
+import time
+from dotenv import load_dotenv
+
+import context_assembly
+import lexical_index
+import tracing
+from embedding_backends import embed_queries, make_embeddings
+
+# --- 1. CONFIGURATION ---
+
+# Specify the directory of the persistent ChromaDB database
+PERSIST_DIRECTORY = "chroma_db"
+
+LLM_MODEL = "gemini-2.5-flash"
+
+# "google" uses Gemini; "stub" returns a fixed answer without network calls,
+# for offline benchmarks and tests (pair it with EMBEDDING_BACKEND=fake).
+LLM_BACKEND = os.getenv("LLM_BACKEND", "google")
+STUB_ANSWER = "This is a stub answer generated without calling an LLM."
+
+# Number of chunks handed to the LLM for each question
+RETRIEVER_K = 3
+
+# "hybrid" fuses vector search with the BM25 index process_documents.py
+# builds next to chroma_db, and answers short keyword queries from BM25 alone
+# (no embedding call). "dense" is vector search only.
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+
+# Candidates taken from each retriever before fusion, and the reciprocal rank
+# fusion constant (a chunk's fused score is the sum of 1 / (RRF_K + rank))
+HYBRID_CANDIDATES = 10
+RRF_K = 60
+
+# Written by process_documents.py whenever chroma_db is rebuilt, so caches of
+# answers derived from the old index know to invalidate themselves.
+INDEX_VERSION_FILE = "index_version"
+
+# --- 2. DEFINE THE PROMPT TEMPLATE ---
+
+# This template is crucial for instructing the LLM on how to behave.
+# It tells the model to answer based *only* on the provided context.
+prompt_template = """
+You are an AI assistant for answering questions about a set of documents.
+You are given the following extracted parts of a long document and a question. Provide a conversational answer.
+Use the context below to answer the question.
+If you don't know the answer, just say "I'm sorry, I cannot find that information in the provided documents." Don't try to make up an answer.
+
+CONTEXT:
+{context}
+
+QUESTION:
+{question}
+
+ANSWER:
+"""
+
+# --- 3. LLM BACKENDS ---
+
+def make_llm(backend=None):
+    """
+    Returns the chat model for the configured backend.
+    """
+    backend = backend or LLM_BACKEND
+    if backend == "stub":
+        from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+        return FakeListChatModel(responses=[STUB_ANSWER])
+    if backend == "google":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        load_dotenv()
+        if not os.getenv("GOOGLE_API_KEY"):
+            raise ValueError("GOOGLE_API_KEY not found. Please set it in your environment or a .env file.")
+        return ChatGoogleGenerativeAI(model=LLM_MODEL, temperature=0.2)
+    raise ValueError(f"Unknown LLM backend '{backend}'. Use 'google' or 'stub'.")
+
+# --- 4. THE RAG PIPELINE ---
+
+class RAGPipeline:
+    """
+    Holds the embedding model, vector store, LLM and RetrievalQA chain.
+
+    Building these is slow (LangChain imports, Chroma load, client set-up), so
+    a pipeline is meant to be constructed once and kept alive by rag_service.py.
+    Everything else talks to that service instead of building its own copy.
+    """
+
+    def __init__(self, persist_directory=PERSIST_DIRECTORY, k=RETRIEVER_K, embedding_backend=None, llm_backend=None,
+                 retrieval_mode=None, embedding_cache=None, context_budget=None):
+        # Heavy imports are deferred so importing this module stays cheap
+        from langchain_community.vectorstores import Chroma
+        from langchain.chains import RetrievalQA
+        from langchain.prompts import PromptTemplate
+
+        if not os.path.exists(persist_directory):
+            raise FileNotFoundError(
+                f"The directory '{persist_directory}' does not exist. "
+                "Please run the 'process_documents.py' script first to create the database."
+            )
+
+        print("Initializing embedding model...")
+        # Must match the backend chroma_db was built with (EMBEDDING_BACKEND)
+        # Repeated questions reuse their query embedding from the persistent cache
+        self.embeddings = make_embeddings(embedding_backend, cache=embedding_cache)
+
+        print(f"Loading vector store from: {persist_directory}")
+        self.db = Chroma(
+            persist_directory=persist_directory,
+            embedding_function=self.embeddings
+        )
+        self.k = k
+        self.retriever = self.db.as_retriever(search_kwargs={"k": k})
+
+        self.persist_directory = persist_directory
+        self.retrieval_mode = retrieval_mode or RETRIEVAL_MODE
+        if self.retrieval_mode == "hybrid" and lexical_index.load(persist_directory) is None:
+            print("No lexical index found; using vector search only until process_documents.py builds one.")
+
+        # Token budget for the assembled context (see context_assembly.py)
+        self.context_budget = context_budget or context_assembly.CONTEXT_TOKEN_BUDGET
+
+        print("Initializing LLM...")
+        self.llm = make_llm(llm_backend)
+
+        self.prompt = PromptTemplate(
+            template=prompt_template, input_variables=["context", "question"]
+        )
+        self.qa_chain = RetrievalQA.from_chain_type(
+            llm=self.llm,
+            chain_type="stuff",
+            retriever=self.retriever,
+            chain_type_kwargs={"prompt": self.prompt},
+            return_source_documents=True # This allows us to see which chunks were used
+        )
+        print("RAG chain created successfully.")
+
+    def embed_query(self, question):
+        """
+        Returns the query embedding for a question.
+        """
+        with tracing.span("embed"):
+            return self.embeddings.embed_query(question)
+
+    def embed_queries(self, questions):
+        """
+        Returns the query embeddings for several questions, in one model call
+        where the backend supports it.
+        """
+        with tracing.span("embed"):
+            if len(questions) == 1:
+                return [self.embeddings.embed_query(questions[0])]
+            return embed_queries(self.embeddings, questions)
+
+    def ask(self, question, embedding=None):
+        """
+        Answers a question and returns {"answer": ..., "sources": [...]}.
+        If the query embedding is already known it is reused for retrieval
+        instead of embedding the question a second time.
+        """
+        docs = self.assemble_context(question, self.retrieve(question, embedding=embedding))
+        with tracing.span("generate"):
+            result = self.qa_chain.combine_documents_chain.invoke(
+                {"input_documents": docs, "question": question}
+            )
+        answer = result["output_text"]
+        return {
+            "answer": answer,
+            "sources": format_sources(docs),
+        }
+
+    def retrieve(self, question, embedding=None):
+        """
+        Returns the chunks handed to the LLM for a question.
+        """
+        return self.retrieve_many([question], [embedding])[0]
+
+    def retrieve_many(self, questions, embeddings=None):
+        """
+        Returns the chunks for each of several questions. The questions that
+        still need a query embedding are embedded in one batched call, and the
+        vector store is searched for all of them with a single query.
+        """
+        embeddings = list(embeddings) if embeddings is not None else [None] * len(questions)
+        lexical = lexical_index.load(self.persist_directory) if self.retrieval_mode == "hybrid" else None
+        results = [None] * len(questions)
+
+        # Keyword fast path: no embedding round-trip at all
+        if lexical is not None:
+            for i, question in enumerate(questions):
+                if embeddings[i] is None and lexical.is_keyword_query(question):
+                    with tracing.span("lexical_search"):
+                        hits = lexical.search(question, self.k)
+                    if hits:
+                        results[i] = self._documents([chunk_id for chunk_id, _ in hits])
+
+        pending = [i for i in range(len(questions)) if results[i] is None]
+        if not pending:
+            return results
+        unembedded = [i for i in pending if embeddings[i] is None]
+        if unembedded:
+            for i, vector in zip(unembedded, self.embed_queries([questions[i] for i in unembedded])):
+                embeddings[i] = vector
+        with tracing.span("vector_search"):
+            dense = self.db._collection.query(
+                query_embeddings=[embeddings[i] for i in pending],
+                n_results=HYBRID_CANDIDATES if lexical is not None else self.k,
+                include=["documents", "metadatas"],
+            )
+
+        for row, i in enumerate(pending):
+            dense_ids = dense["ids"][row]
+            dense_docs = _as_documents(dense["documents"][row], dense["metadatas"][row])
+            if lexical is None:
+                results[i] = dense_docs
+                continue
+            with tracing.span("lexical_search"):
+                lexical_ids = [chunk_id for chunk_id, _ in lexical.search(questions[i], HYBRID_CANDIDATES)]
+
+            fused = {}
+            for ranking in (dense_ids, lexical_ids):
+                for rank, chunk_id in enumerate(ranking, start=1):
+                    fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank)
+            # Ties keep the vector ranking's order (dict insertion order)
+            chunk_ids = sorted(fused, key=fused.get, reverse=True)[:self.k]
+
+            known = dict(zip(dense_ids, dense_docs))
+            missing = [chunk_id for chunk_id in chunk_ids if chunk_id not in known]
+            if missing:
+                known.update(zip(missing, self._documents(missing)))
+            results[i] = [known[chunk_id] for chunk_id in chunk_ids]
+        return results
+
+    def assemble_context(self, question, docs):
+        """
+        Merges overlapping chunks, drops near-duplicates and fits the rest
+        into the context token budget. Logs the estimated prompt size before
+        and after, and returns the documents to put in the prompt.
+        """
+        with tracing.span("assemble_context"):
+            assembled, stats = context_assembly.assemble(docs, self.context_budget)
+            before = context_assembly.estimate_tokens(
+                self.prompt.format(context=context_assembly.join_context(docs), question=question))
+            after = context_assembly.estimate_tokens(
+                self.prompt.format(context=context_assembly.join_context(assembled), question=question))
+        print(
+            f"Context: {stats['chunks_in']} chunks -> {stats['chunks_out']} "
+            f"({stats['merged']} merged, {stats['duplicates']} duplicates"
+            f"{', truncated' if stats['truncated'] else ''}); prompt ~{before} -> ~{after} tokens"
+        )
+        return assembled
+
+    def _documents(self, chunk_ids):
+        """
+        Fetches chunks by id from the vector store (a local lookup, no embedding).
+        """
+        with tracing.span("fetch_chunks"):
+            found = self.db._collection.get(ids=chunk_ids, include=["documents", "metadatas"])
+        by_id = dict(zip(found["ids"], _as_documents(found["documents"], found["metadatas"])))
+        # get() does not preserve the requested order; ids deleted since the
+        # lexical index was built are skipped
+        return [by_id[chunk_id] for chunk_id in chunk_ids if chunk_id in by_id]
+
+    def ask_many(self, questions, embeddings=None):
+        """
+        Answers several questions together: retrieval runs as one batch and
+        the answers are generated concurrently. Returns one {"answer",
+        "sources"} per question, or {"error": ...} for a question that failed.
+        """
+        retrieved = self.retrieve_many(questions, embeddings)
+        contexts = [self.assemble_context(question, docs) for question, docs in zip(questions, retrieved)]
+        prompts = [
+            self.prompt.format(context=context_assembly.join_context(docs), question=question)
+            for question, docs in zip(questions, contexts)
+        ]
+        with tracing.span("generate"):
+            answers = self.llm.batch(prompts, return_exceptions=True)
+        return [
+            {"error": str(answer)} if isinstance(answer, Exception)
+            else {"answer": answer.content, "sources": format_sources(docs)}
+            for answer, docs in zip(answers, contexts)
+        ]
+
+    def retrieve_contexts(self, questions, embeddings=None):
+        """
+        Retrieval and context assembly for several questions as one batch,
+        for answers that are then streamed one by one with stream(context=...).
+        Returns one {"context": ..., "sources": [...]} per question.
+        """
+        retrieved = self.retrieve_many(questions, embeddings)
+        contexts = [self.assemble_context(question, docs) for question, docs in zip(questions, retrieved)]
+        return [
+            {"context": context_assembly.join_context(docs), "sources": format_sources(docs)}
+            for docs in contexts
+        ]
+
+    def stream(self, question, embedding=None, context=None, sources=None):
+        """
+        Answers a question incrementally. Yields {"type": "sources", ...} as
+        soon as retrieval finishes, then one {"type": "token", "text": ...}
+        per generated chunk, then {"type": "done"}. A context (and its
+        sources) from retrieve_contexts() skips retrieval.
+        """
+        if context is None:
+            docs = self.assemble_context(question, self.retrieve(question, embedding=embedding))
+            # Same prompt the "stuff" chain builds in ask()
+            context = context_assembly.join_context(docs)
+            sources = format_sources(docs)
+        yield {"type": "sources", "sources": sources or []}
+
+        # Includes the time the consumer takes to read each token
+        with tracing.span("generate"):
+            for chunk in self.llm.stream(self.prompt.format(context=context, question=question)):
+                if chunk.content:
+                    yield {"type": "token", "text": chunk.content}
+        yield {"type": "done"}
+
+def _as_documents(texts, metadatas):
+    from langchain_core.documents import Document
+
+    return [Document(page_content=text, metadata=metadata or {}) for text, metadata in zip(texts, metadatas)]
+
+def format_sources(docs):
+    """
+    Reduces retrieved documents to the source/page pairs shown to users.
+    """
+    return [
+        {"source": doc.metadata.get('source', 'N/A'), "page": doc.metadata.get('page', 'N/A')}
+        for doc in docs
+    ]
+
+def write_index_version(persist_directory=PERSIST_DIRECTORY):
+    """
+    Stamps the vector store with a new version identifier.
+    """
+    version = f"{time.time_ns():x}"
+    path = os.path.join(persist_directory, INDEX_VERSION_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(path + ".tmp", path)
+    return version
+
+def read_index_version(persist_directory=PERSIST_DIRECTORY):
+    """
+    Returns the vector store's version identifier, or None if it has none.
+    """
+    try:
+        with open(os.path.join(persist_directory, INDEX_VERSION_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,241 @@
+# rag_service.py
+import json
+import sys
+import threading
+import time
+from flask import Flask, Response, request, jsonify
+
+import rag_client
+import tracing
+from rag_pipeline import RAGPipeline
+
+# --- 1. SERVICE STATE ---
+
+# The service owns the only RAGPipeline on this host. It is built once, on a
+# background thread, so /health answers immediately while the models warm up.
+_state = {
+    "pipeline": None,
+    "error": None,
+    "started_at": time.time(),
+    "ready_at": None,
+}
+
+def _warm_up():
+    try:
+        _state["pipeline"] = RAGPipeline()
+        _state["ready_at"] = time.time()
+        print(f"RAG service ready after {_state['ready_at'] - _state['started_at']:.1f}s.")
+    except Exception as e:
+        _state["error"] = str(e)
+        print(f"Error initializing RAG pipeline: {e}")
+
+# --- 2. CREATE THE FLASK APP ---
+
+app = Flask(__name__)
+
+@app.route('/health', methods=['GET'])
+def health():
+    """
+    Liveness probe: the process is up. Also reports readiness for convenience.
+    """
+    pipeline = _state["pipeline"]
+    cache = getattr(pipeline.embeddings, "cache", None) if pipeline is not None else None
+    return jsonify({
+        "status": "ok",
+        "ready": pipeline is not None,
+        "error": _state["error"],
+        "uptime_s": round(time.time() - _state["started_at"], 1),
+        "embedding_cache": cache.snapshot() if cache is not None else None,
+    })
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """
+    Readiness probe: 200 once the pipeline is built, 503 while warming up or
+    if initialisation failed.
+    """
+    if _state["pipeline"] is None:
+        return jsonify({"ready": False, "error": _state["error"]}), 503
+    return jsonify({"ready": True})
+
+@app.route('/embed', methods=['POST'])
+def embed():
+    """
+    Returns the query embedding for a question, so callers can reuse it.
+    """
+    pipeline = _state["pipeline"]
+    if pipeline is None:
+        return jsonify({"error": _state["error"] or "RAG service is still starting."}), 503
+
+    data = request.get_json(silent=True) or {}
+    text = data.get("text")
+    if not text:
+        return jsonify({"error": "No text provided."}), 400
+
+    with tracing.request("embed") as trace:
+        try:
+            return jsonify({"embedding": pipeline.embed_query(text)})
+        except Exception as e:
+            trace.error = str(e)
+            return jsonify({"error": str(e)}), 500
+
+@app.route('/embed/batch', methods=['POST'])
+def embed_batch():
+    """
+    Returns the query embeddings for a list of texts, computed in one batch.
+    """
+    pipeline = _state["pipeline"]
+    if pipeline is None:
+        return jsonify({"error": _state["error"] or "RAG service is still starting."}), 503
+
+    data = request.get_json(silent=True) or {}
+    texts = data.get("texts")
+    if not texts or not isinstance(texts, list) or not all(isinstance(text, str) and text for text in texts):
+        return jsonify({"error": "No texts provided."}), 400
+
+    with tracing.request("embed_batch") as trace:
+        try:
+            return jsonify({"embeddings": pipeline.embed_queries(texts)})
+        except Exception as e:
+            trace.error = str(e)
+            return jsonify({"error": str(e)}), 500
+
+@app.route('/query', methods=['POST'])
+def query():
+    """
+    Answers a question with the warm pipeline. An optional "embedding" field
+    skips the query embedding call, and "timings": true adds the time spent
+    in each stage (milliseconds) to the response.
+    """
+    pipeline = _state["pipeline"]
+    if pipeline is None:
+        return jsonify({"error": _state["error"] or "RAG service is still starting."}), 503
+
+    data = request.get_json(silent=True) or {}
+    question = data.get("question")
+    if not question:
+        return jsonify({"error": "No question provided."}), 400
+
+    with tracing.request("query") as trace:
+        try:
+            result = pipeline.ask(question, embedding=data.get("embedding"))
+            if data.get("timings"):
+                result["timings"] = trace.timings()
+            return jsonify(result)
+        except Exception as e:
+            trace.error = str(e)
+            return jsonify({"error": str(e)}), 500
+
+@app.route('/query/batch', methods=['POST'])
+def query_batch():
+    """
+    Answers a list of {"question", "embedding" (optional)} items together:
+    one retrieval pass for all of them, then concurrent generation. Returns
+    {"results": [...]} in the same order; a question that failed gets an
+    {"error": ...} item instead of failing the whole batch. "timings" gives
+    the time each stage took for the batch as a whole.
+    """
+    pipeline = _state["pipeline"]
+    if pipeline is None:
+        return jsonify({"error": _state["error"] or "RAG service is still starting."}), 503
+
+    data = request.get_json(silent=True) or {}
+    items = data.get("questions")
+    if not items or not isinstance(items, list) or not all(isinstance(item, dict) and item.get("question") for item in items):
+        return jsonify({"error": "No questions provided."}), 400
+
+    with tracing.request("query_batch") as trace:
+        try:
+            results = pipeline.ask_many(
+                [item["question"] for item in items],
+                [item.get("embedding") for item in items],
+            )
+            return jsonify({"results": results, "timings": trace.timings()})
+        except Exception as e:
+            trace.error = str(e)
+            return jsonify({"error": str(e)}), 500
+
+@app.route('/retrieve/batch', methods=['POST'])
+def retrieve_batch():
+    """
+    Retrieves and assembles the context for a list of {"question",
+    "embedding" (optional)} items in one pass, for answers that are then
+    streamed one by one through /query/stream. Returns {"results": [{"context",
+    "sources"}, ...], "timings": {...}}.
+    """
+    pipeline = _state["pipeline"]
+    if pipeline is None:
+        return jsonify({"error": _state["error"] or "RAG service is still starting."}), 503
+
+    data = request.get_json(silent=True) or {}
+    items = data.get("questions")
+    if not items or not isinstance(items, list) or not all(isinstance(item, dict) and item.get("question") for item in items):
+        return jsonify({"error": "No questions provided."}), 400
+
+    with tracing.request("retrieve_batch") as trace:
+        try:
+            results = pipeline.retrieve_contexts(
+                [item["question"] for item in items],
+                [item.get("embedding") for item in items],
+            )
+            return jsonify({"results": results, "timings": trace.timings()})
+        except Exception as e:
+            trace.error = str(e)
+            return jsonify({"error": str(e)}), 500
+
+@app.route('/query/stream', methods=['POST'])
+def query_stream():
+    """
+    Streams an answer as JSON lines: the sources first, then answer tokens as
+    the LLM produces them. Errors after the stream has started are sent as a
+    final {"type": "error"} line since the status code is already out. With
+    "timings": true the final {"type": "done"} line carries the stage timings.
+    A "context" (with its "sources") from /retrieve/batch skips retrieval.
+    """
+    pipeline = _state["pipeline"]
+    if pipeline is None:
+        return jsonify({"error": _state["error"] or "RAG service is still starting."}), 503
+
+    data = request.get_json(silent=True) or {}
+    question = data.get("question")
+    if not question:
+        return jsonify({"error": "No question provided."}), 400
+
+    def generate():
+        # Traced in here: the view returns before the answer is generated
+        with tracing.request("query_stream") as trace:
+            try:
+                events = pipeline.stream(question, embedding=data.get("embedding"),
+                                         context=data.get("context"), sources=data.get("sources"))
+                for event in events:
+                    if event["type"] == "done" and data.get("timings"):
+                        event = dict(event, timings=trace.timings())
+                    yield json.dumps(event) + "\n"
+            except Exception as e:
+                trace.error = str(e)
+                yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Per-stage latency histograms, request counters and the in-flight gauge,
+    in the Prometheus text format.
+    """
+    return Response(tracing.render(), content_type=tracing.METRICS_CONTENT_TYPE)
+
+def main():
+    """
+    Starts the RAG worker unless one is already serving on this host.
+    """
+    if rag_client.health(timeout=1) is not None:
+        print(f"A RAG service is already running at {rag_client.RAG_SERVICE_URL}.")
+        sys.exit(0)
+
+    threading.Thread(target=_warm_up, daemon=True).start()
+    # The reloader would fork a second process and build the pipeline twice
+    app.run(host=rag_client.RAG_SERVICE_HOST, port=rag_client.RAG_SERVICE_PORT, threaded=True, use_reloader=False)
+
+if __name__ == '__main__':
+    main()
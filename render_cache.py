@@ -0,0 +1,123 @@
+import functools
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+import data_loader
+import harvest_store
+
+# --- 1. CONFIGURATION ---
+
+# Streamlit re-executes dashboard.py on every interaction, but imported modules
+# survive reruns, so results memoised here are reused across reruns and
+# browser sessions. Figures are a few hundred KB at most, so a few hundred
+# entries stay well within memory.
+MAX_ENTRIES = int(os.getenv("RENDER_CACHE_MAX_ENTRIES", "256"))
+
+_MISSING = object()
+
+# --- 2. THE CACHE ---
+
+class RenderCache:
+    """
+    Bounded LRU of render results: figures, HTML snippets and derived numbers.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is _MISSING:
+                self.stats["misses"] += 1
+            else:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return dict(
+                self.stats,
+                size=len(self._entries),
+                max_entries=self.max_entries,
+                hit_rate=round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            )
+
+_cache = RenderCache()
+
+def _freeze(value):
+    """
+    Turns widget values and other arguments into a hashable key.
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(v) for v in value)
+    if isinstance(value, np.ndarray):
+        return (value.dtype.str, value.shape, value.tobytes())
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+# --- 3. MEMOISATION ---
+
+def sources_version():
+    """
+    Returns the versions of every source a panel can read: the workbooks and
+    the harvest store, which HARVEST_STORE_FILE can point outside them.
+    """
+    return data_loader.data_version(), harvest_store.version()
+
+def memoize(func):
+    """
+    Caches func's return value keyed on its arguments, the source versions
+    and its code, so a panel is only rebuilt when its inputs, the workbooks,
+    the harvest store or the function itself change. Since the versions are
+    in the key, a build that started before a reload stores its result under
+    the old versions, where no later lookup finds it.
+
+    func must be pure apart from reading data_loader frames and the harvest
+    store (directly or through kpi_summary): it may build figures and HTML,
+    but must not call st.* (those calls have to run on every rerun). Callers must treat returned objects as read-only, since
+    they are shared between reruns and sessions.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (func.__module__, func.__qualname__, func.__code__, sources_version(), _freeze(args), _freeze(kwargs))
+        value = _cache.get(key)
+        if value is _MISSING:
+            value = func(*args, **kwargs)
+            _cache.put(key, value)
+        return value
+    return wrapper
+
+@data_loader.on_reload
+def clear():
+    _cache.clear()
+
+def stats():
+    """
+    Returns hit/miss counters and size for diagnostics.
+    """
+    return _cache.snapshot()
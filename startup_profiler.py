@@ -0,0 +1,101 @@
+import builtins
+import functools
+import os
+import sys
+import time
+
+# --- 1. CONFIGURATION ---
+
+# Enable with `streamlit run dashboard.py -- --profile-startup`
+# or by setting DASHBOARD_PROFILE_STARTUP=1.
+PROFILE_FLAG = "--profile-startup"
+
+def enabled():
+    return PROFILE_FLAG in sys.argv or os.getenv("DASHBOARD_PROFILE_STARTUP") == "1"
+
+# --- 2. IMPORT TIMING ---
+
+# Streamlit keeps this module alive across reruns, so the import timings
+# recorded on the first (cold) run stay available for the report.
+import_times = []
+render_times = {}
+
+_original_import = builtins.__import__
+_depth = 0
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    global _depth
+    if level != 0 or name in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+
+    _depth += 1
+    start = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        _depth -= 1
+        # Times are inclusive of any modules imported along the way
+        import_times.append((name, _depth, (time.perf_counter() - start) * 1000))
+
+def install():
+    """
+    Starts recording the wall time of every new module import.
+    Does nothing unless profiling is enabled.
+    """
+    if enabled() and builtins.__import__ is not _timed_import:
+        builtins.__import__ = _timed_import
+
+def uninstall():
+    builtins.__import__ = _original_import
+
+# --- 3. RENDER TIMING ---
+
+def timed(func):
+    """
+    Decorator recording the wall time of a render_* function on each rerun.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not enabled():
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            render_times[func.__name__] = (time.perf_counter() - start) * 1000
+    return wrapper
+
+# --- 4. REPORTING ---
+
+def top_level_imports(limit=25):
+    """
+    Returns the slowest top-level imports as (module, ms) pairs.
+    """
+    rows = [(name, ms) for name, depth, ms in import_times if depth == 0]
+    return sorted(rows, key=lambda row: row[1], reverse=True)[:limit]
+
+def print_report():
+    print("\n--- Startup profile ---")
+    print(f"{'Import':<40}{'ms':>10}")
+    for name, ms in top_level_imports():
+        print(f"{name:<40}{ms:>10.1f}")
+    print(f"\n{'Render function':<40}{'ms':>10}")
+    for name, ms in sorted(render_times.items(), key=lambda row: row[1], reverse=True):
+        print(f"{name:<40}{ms:>10.1f}")
+
+def render_report(st):
+    """
+    Shows the import and render timings in a sidebar expander.
+    """
+    with st.sidebar.expander("Startup profile", expanded=False):
+        st.markdown("**Imports (first run, ms)**")
+        st.table({
+            "Module": [name for name, _ in top_level_imports()],
+            "ms": [round(ms, 1) for _, ms in top_level_imports()],
+        })
+        st.markdown("**Render functions (this run, ms)**")
+        rows = sorted(render_times.items(), key=lambda row: row[1], reverse=True)
+        st.table({
+            "Function": [name for name, _ in rows],
+            "ms": [round(ms, 1) for _, ms in rows],
+        })
@@ -0,0 +1,246 @@
+import bisect
+import contextlib
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+
+# --- 1. CONFIGURATION ---
+
+# Requests slower than this are written to TRACE_LOG_FILE with all their spans
+SLOW_REQUEST_MS = float(os.getenv("TRACE_SLOW_MS", "2000"))
+
+# Fraction of slow requests that are written, to bound the log under an outage
+SLOW_SAMPLE_RATE = float(os.getenv("TRACE_SLOW_SAMPLE_RATE", "1.0"))
+
+# One JSON object per line, appended by every process that traces requests
+TRACE_LOG_FILE = os.getenv("TRACE_LOG_FILE", "slow_requests.jsonl")
+
+# Histogram buckets in seconds: embedding and search are milliseconds,
+# Gemini generation takes seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# --- 2. METRICS ---
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+class _Metric:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self.label_names, labels, value) for labels, value in sorted(self._values.items())]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels):
+        self.inc(*labels, amount=-1)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        with self._lock:
+            counts, total = self._values.get(labels, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[labels] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            values = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._values.items())
+        samples = []
+        bucket_labels = self.label_names + ("le",)
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", bucket_labels, labels + (bound,), cumulative))
+            samples.append((f"{self.name}_sum", self.label_names, labels, total))
+            samples.append((f"{self.name}_count", self.label_names, labels, cumulative))
+        return samples
+
+stage_seconds = Histogram("rag_stage_duration_seconds", "Time spent in each stage of a request.", ["stage"])
+stage_errors = Counter("rag_stage_errors_total", "Stages that raised an exception.", ["stage"])
+request_seconds = Histogram("rag_request_duration_seconds", "End-to-end request latency.", ["endpoint"])
+requests_total = Counter("rag_requests_total", "Requests handled.", ["endpoint"])
+request_errors = Counter("rag_request_errors_total", "Requests that failed.", ["endpoint"])
+in_flight = Gauge("rag_requests_in_flight", "Requests currently being handled.", ["endpoint"])
+slow_requests = Counter("rag_slow_requests_total", "Requests slower than TRACE_SLOW_MS.", ["endpoint"])
+
+METRICS = [stage_seconds, stage_errors, request_seconds, requests_total, request_errors, in_flight, slow_requests]
+
+def render():
+    """
+    All metrics in the Prometheus text exposition format, for /metrics.
+    """
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, label_names, labels, value in metric.samples():
+            lines.append(f"{name}{_labels(label_names, labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# --- 3. TRACES ---
+
+class Trace:
+    """
+    The spans of one request. Stages that run more than once (a lexical
+    search per question, say) add up in timings().
+    """
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.error = None
+        self.spans = []  # (stage, start offset ms, duration ms)
+        self._start = time.perf_counter()
+        self._started_at = time.time()
+        self._finished = False
+        in_flight.inc(endpoint)
+
+    @contextlib.contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            stage_errors.inc(stage)
+            raise
+        finally:
+            end = time.perf_counter()
+            stage_seconds.observe(end - start, stage)
+            self.spans.append((stage, round((start - self._start) * 1000, 2), round((end - start) * 1000, 2)))
+
+    def add(self, timings, prefix=""):
+        """
+        Records stage timings measured elsewhere (e.g. by the RAG service) as
+        spans of this trace, without observing them in this process's metrics.
+        """
+        for stage, ms in (timings or {}).items():
+            if stage != "total":
+                self.spans.append((prefix + stage, None, ms))
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self._start) * 1000
+
+    def timings(self):
+        """
+        Milliseconds per stage, plus the total so far.
+        """
+        totals = {}
+        for stage, _, ms in self.spans:
+            totals[stage] = round(totals.get(stage, 0.0) + ms, 2)
+        totals["total"] = round(self.elapsed_ms(), 2)
+        return totals
+
+    def finish(self):
+        if self._finished:
+            return
+        self._finished = True
+        duration_ms = self.elapsed_ms()
+        in_flight.dec(self.endpoint)
+        requests_total.inc(self.endpoint)
+        request_seconds.observe(duration_ms / 1000, self.endpoint)
+        if self.error is not None:
+            request_errors.inc(self.endpoint)
+        if duration_ms >= SLOW_REQUEST_MS:
+            slow_requests.inc(self.endpoint)
+            if random.random() < SLOW_SAMPLE_RATE:
+                _log_slow(self, duration_ms)
+
+_log_lock = threading.Lock()
+
+def _log_slow(trace, duration_ms):
+    record = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(trace._started_at)),
+        "pid": os.getpid(),
+        "endpoint": trace.endpoint,
+        "duration_ms": round(duration_ms, 2),
+        "error": trace.error,
+        "spans": [{"stage": stage, "start_ms": start, "duration_ms": ms} for stage, start, ms in trace.spans],
+    }
+    try:
+        with _log_lock, open(TRACE_LOG_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError as e:
+        print(f"Could not write slow request trace to {TRACE_LOG_FILE}: {e}")
+
+# --- 4. CURRENT TRACE ---
+
+# Follows each request through threads (Flask) and tasks (Starlette) alike
+_current = contextvars.ContextVar("rag_trace", default=None)
+
+def current():
+    return _current.get()
+
+@contextlib.contextmanager
+def activate(trace):
+    """
+    Makes trace the one span() records into, for the duration of the block.
+    """
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+@contextlib.contextmanager
+def request(endpoint):
+    """
+    Traces a request from start to finish. Handlers that turn an exception
+    into an error response should set trace.error themselves.
+    """
+    trace = Trace(endpoint)
+    try:
+        with activate(trace):
+            yield trace
+    except Exception as e:
+        trace.error = trace.error or str(e)
+        raise
+    finally:
+        trace.finish()
+
+@contextlib.contextmanager
+def span(stage):
+    """
+    Times a stage of the current request. Outside a request the duration
+    still goes into the stage histogram.
+    """
+    trace = _current.get()
+    if trace is not None:
+        with trace.span(stage):
+            yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        stage_errors.inc(stage)
+        raise
+    finally:
+        stage_seconds.observe(time.perf_counter() - start, stage)
@@ -0,0 +1,214 @@
+import posixpath
+import zipfile
+from dataclasses import dataclass
+from typing import Optional, Sequence
+from xml.etree import ElementTree
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils.cell import column_index_from_string, coordinate_from_string
+
+# --- 1. REGION SCHEMA ---
+
+@dataclass(frozen=True)
+class Region:
+    """
+    A rectangular block of cells to carve out of a worksheet.
+
+    anchor:    top-left cell of the block, e.g. "A3".
+    nrows:     number of rows (after the header row, if any). None reads down
+               to the last non-empty row of the sheet.
+    usecols:   Excel-style column selection, e.g. "A,C:D". None keeps every
+               column from the anchor to the last non-empty column.
+    header:    True if the first row of the block holds the column names.
+    columns:   explicit column names, overriding the header row.
+    index_col: True to use the first selected column as the index.
+    """
+    name: str
+    sheet: str
+    anchor: str = "A1"
+    nrows: Optional[int] = None
+    usecols: Optional[str] = None
+    header: bool = True
+    columns: Optional[Sequence[str]] = None
+    index_col: bool = False
+
+    @property
+    def first_row(self):
+        return coordinate_from_string(self.anchor)[1]
+
+    @property
+    def first_col(self):
+        return column_index_from_string(coordinate_from_string(self.anchor)[0])
+
+    @property
+    def last_row(self):
+        """
+        Last sheet row (1-based) the region needs, or None if unbounded.
+        """
+        if self.nrows is None:
+            return None
+        return self.first_row + self.nrows - 1 + (1 if self.header else 0)
+
+def _parse_usecols(usecols):
+    """
+    Converts "A,C:D" into zero-based column positions [0, 2, 3].
+    """
+    positions = []
+    for part in usecols.split(","):
+        part = part.strip()
+        if ":" in part:
+            start, end = part.split(":")
+            positions.extend(range(column_index_from_string(start) - 1, column_index_from_string(end)))
+        else:
+            positions.append(column_index_from_string(part) - 1)
+    return positions
+
+# --- 2. READING ---
+
+def _read_grids(path, regions):
+    """
+    Streams every sheet referenced by the regions into an in-memory grid of
+    row tuples. The workbook is opened once, in read-only mode, and each sheet
+    is only read as far down as the deepest region needs.
+    """
+    needed = {}
+    for region in regions:
+        last = region.last_row
+        if region.sheet in needed:
+            prev = needed[region.sheet]
+            needed[region.sheet] = None if prev is None or last is None else max(prev, last)
+        else:
+            needed[region.sheet] = last
+
+    grids = {}
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for sheet, max_row in needed.items():
+            ws = wb[sheet]
+            grids[sheet] = list(ws.iter_rows(max_row=max_row, values_only=True))
+    finally:
+        wb.close()
+    return grids
+
+def _dedupe_columns(names):
+    """
+    Mirrors pandas' header handling: blank headers become "Unnamed: i" and
+    repeated names get ".1", ".2", ... suffixes.
+    """
+    seen = {}
+    result = []
+    for i, name in enumerate(names):
+        if name is None:
+            name = f"Unnamed: {i}"
+        if name in seen:
+            seen[name] += 1
+            new_name = f"{name}.{seen[name]}"
+            while new_name in seen:
+                seen[name] += 1
+                new_name = f"{name}.{seen[name]}"
+            seen[new_name] = 0
+            name = new_name
+        else:
+            seen[name] = 0
+        result.append(name)
+    return result
+
+def _carve(grid, region):
+    """
+    Cuts a region out of a sheet grid and builds its DataFrame.
+    """
+    rows = grid[region.first_row - 1:]
+    if region.nrows is not None:
+        rows = rows[:region.nrows + (1 if region.header else 0)]
+
+    width = max((len(row) for row in rows), default=0)
+    rows = [tuple(row) + (None,) * (width - len(row)) for row in rows]
+
+    if region.usecols is not None:
+        positions = _parse_usecols(region.usecols)
+    else:
+        start = region.first_col - 1
+        last = start
+        for row in rows:
+            for j in range(len(row) - 1, start - 1, -1):
+                if row[j] is not None:
+                    last = max(last, j)
+                    break
+        positions = list(range(start, last + 1))
+    rows = [[row[j] if j < len(row) else None for j in positions] for row in rows]
+
+    header_row = None
+    if region.header and rows:
+        header_row, rows = rows[0], rows[1:]
+
+    # Like pandas, drop trailing blank rows when reading to the end of the sheet
+    if region.nrows is None:
+        while rows and all(value is None for value in rows[-1]):
+            rows.pop()
+
+    if region.columns is not None:
+        names = list(region.columns)
+        if region.index_col:
+            names = [None] + names
+    elif header_row is not None:
+        names = _dedupe_columns(header_row)
+        if region.index_col:
+            names[0] = header_row[0]
+    else:
+        names = list(range(len(positions)))
+
+    df = pd.DataFrame(rows, columns=range(len(positions)))
+    for col in df.columns:
+        if df[col].isna().all():
+            df[col] = df[col].astype("float64")
+    df = df.infer_objects()
+
+    if region.index_col:
+        df = df.set_index(0)
+        df.index.name = names[0]
+        names = names[1:]
+    df.columns = names
+    return df
+
+def read_regions(path, regions):
+    """
+    Reads every region from a workbook in a single pass.
+    Returns a dict mapping region name to DataFrame.
+    """
+    grids = _read_grids(path, regions)
+    return {region.name: _carve(grids[region.sheet], region) for region in regions}
+
+# --- 3. CHANGE DETECTION ---
+
+# Workbook parts every sheet's values depend on: text cells index into the
+# shared strings and dates are recognised through the number formats
+_SHARED_PARTS = ("xl/sharedStrings.xml", "xl/styles.xml")
+
+_NS = {
+    "main": "http://schemas.openxmlformats.org/spreadsheetml/2006/main",
+    "rel": "http://schemas.openxmlformats.org/package/2006/relationships",
+}
+_REL_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+
+def sheet_fingerprints(path):
+    """
+    Returns {sheet name: fingerprint} for an .xlsx file, built from the CRCs
+    in the zip directory, so no cell data is read. A sheet's fingerprint
+    changes when its own XML or a shared part changes.
+    """
+    with zipfile.ZipFile(path) as archive:
+        crcs = {info.filename: info.CRC for info in archive.infolist()}
+        workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+        rels = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+
+    targets = {}
+    for rel in rels.findall("rel:Relationship", _NS):
+        target = rel.get("Target")
+        # Targets are relative to xl/ unless given as absolute package paths
+        targets[rel.get("Id")] = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+
+    shared = "-".join(str(crcs.get(part, "")) for part in _SHARED_PARTS)
+    return {
+        sheet.get("name"): f"{crcs.get(targets.get(sheet.get(_REL_ID)), '')}-{shared}"
+        for sheet in workbook.findall("main:sheets/main:sheet", _NS)
+    }